@@ -0,0 +1,350 @@
+import asyncio
+from typing import List, Dict, AsyncGenerator, Optional, Union
+from elasticsearch import AsyncElasticsearch
+from ElasticsearchHandler import ElasticsearchHandler
+from SyncMetrics import stageTimer
+
+
+class AsyncElasticsearchHandler(ElasticsearchHandler):
+    """
+    Asyncio variant of ElasticsearchHandler built on AsyncElasticsearch. The constructor is shared with
+    ElasticsearchHandler, the fetch methods are coroutines and the streams are async generators.
+    """
+
+    def createClient(self, **clientParams) -> AsyncElasticsearch:
+        """
+        Creates the AsyncElasticsearch client used by the handler.
+
+        Parameters
+        ----------
+        clientParams : dict
+            The keyword arguments passed to the client constructor.
+
+        Returns
+        -------
+        client : AsyncElasticsearch
+            The Elasticsearch client.
+        """
+        return AsyncElasticsearch(**clientParams)
+
+    async def refreshGeneration(self) -> Optional[int]:
+        """
+        Async counterpart of ElasticsearchHandler.refreshGeneration.
+        """
+        try:
+            stats = await self.client.indices.stats(index=self.index, metric='refresh')
+            return stats['_all']['total']['refresh']['total']
+        except Exception as e:
+            self.logger.warning(f"Failed to read the refresh count of {self.index}, bypassing the result cache: {e}")
+            return None
+
+    async def dataFetch(self, query: dict, source: Optional[Union[bool, List[str]]] = None, size: Optional[int] = None) -> dict:
+        """
+        This function takes the Elasticsearch query generated in queryBuilder and retrieves the data from the Elasticsearch index.
+        With a result cache, a search repeated within the cache's time to live is answered from the cache.
+
+        Parameters
+        ----------
+        query : dict
+            A dictionary containing the Elasticsearch query parameters.
+        source : bool, list or None
+            The _source filtering of the hits, e.g. a list of the fields to return. Defaults to the whole _source.
+        size : int or None
+            The number of hits to return. Defaults to the Elasticsearch default of 10.
+
+        Returns
+        -------
+        dataFetchResponse : dict
+            A dictionary containing the search results.
+        """
+        cacheKey, generation = None, None
+        if self.resultCache is not None:
+            generation = await self.refreshGeneration() if self.invalidateOnRefresh else None
+            if generation is not None or not self.invalidateOnRefresh:
+                cacheKey = self.resultCache.key(self.index, query, source=source, size=size)
+                cached = self.resultCache.get(cacheKey, generation)
+                if cached is not None:
+                    return cached
+        try:
+            with stageTimer(self.metrics, 'fetch'):
+                dataFetchResponse = await self.client.search(index=self.index, query=query, source=source, size=size)
+        except Exception as e:
+            error = f"Failed to retrieve data from Elasticsearch: {e}"
+            self.logger.error(error)
+            self.countError('fetch')
+            raise Exception(error)
+        self.countResponse(dataFetchResponse)
+        if cacheKey is not None:
+            self.resultCache.put(cacheKey, dataFetchResponse, generation)
+        return dataFetchResponse
+
+    async def multiFetch(self, queries: List[dict], source: Optional[Union[bool, List[str]]] = None, size: Optional[int] = None, maxConcurrentSearches: Optional[int] = None) -> List[dict]:
+        """
+        Async counterpart of ElasticsearchHandler.multiFetch.
+        """
+        generation = None
+        if self.resultCache is not None and self.invalidateOnRefresh:
+            generation = await self.refreshGeneration()
+        cacheKeys, responses = self.cachedResponses(queries, source, size, generation)
+        pending = self.pendingSearches(cacheKeys, responses)
+        if pending:
+            try:
+                with stageTimer(self.metrics, 'fetch'):
+                    fetched = (await self.client.msearch(index=self.index, searches=self.multiSearchBody(queries, pending, source, size), max_concurrent_searches=maxConcurrentSearches))['responses']
+            except Exception as e:
+                error = f"Failed to retrieve data from Elasticsearch: {e}"
+                self.logger.error(error)
+                self.countError('fetch')
+                raise Exception(error)
+            self.routeResponses(pending, fetched, cacheKeys, responses, generation)
+        return responses
+
+    async def dataStream(self, query: dict, pageSize: int = 1000, keepAlive: str = '1m', sort: Optional[List] = None, source: Optional[Union[bool, List[str]]] = None) -> AsyncGenerator[List[Dict], None]:
+        """
+        This function pages through every hit matching the query and yields the hits one page at a time, with a point
+        in time and search_after when the cluster supports it and with the scroll API otherwise.
+
+        Parameters
+        ----------
+        query : dict
+            A dictionary containing the Elasticsearch query parameters.
+        pageSize : int
+            The number of hits to request per page. Defaults to 1000.
+        keepAlive : str
+            How long Elasticsearch keeps the point in time or scroll context alive between pages. Defaults to '1m'.
+        sort : list or None
+            The sort used to page through the point in time or scroll. Defaults to index order ('_shard_doc').
+        source : bool, list or None
+            The _source filtering of the hits, e.g. a list of the fields to return. Defaults to the whole _source.
+
+        Yields
+        ------
+        hits : list
+            A list containing the hits of a single page.
+        """
+        query = self.streamQuery(query)
+        try:
+            pitId = (await self.client.open_point_in_time(index=self.index, keep_alive=keepAlive))['id']
+        except Exception as e:
+            self.logger.warning(f"Failed to open point in time, falling back to scroll: {e}")
+            async for hits in self.scrollStream(query=query, pageSize=pageSize, keepAlive=keepAlive, sort=sort, source=source):
+                yield hits
+            return
+
+        pitState = {'id': pitId}
+        try:
+            async for hits in self.pitStream(query=query, pitId=pitId, pageSize=pageSize, keepAlive=keepAlive, sort=sort, source=source, pitState=pitState):
+                yield hits
+        finally:
+            await self.closePointInTime(pitState['id'])
+
+    async def closePointInTime(self, pitId: str) -> None:
+        """
+        Closes a point in time, logging rather than raising on failure.
+
+        Parameters
+        ----------
+        pitId : str
+            The id of the point in time.
+        """
+        try:
+            await self.client.close_point_in_time(id=pitId)
+        except Exception as e:
+            self.logger.warning(f"Failed to close point in time: {e}")
+
+    async def pitStream(self, query: dict, pitId: str, pageSize: int, keepAlive: str, sort: Optional[List] = None, sliceSpec: Optional[Dict] = None, source: Optional[Union[bool, List[str]]] = None, pitState: Optional[Dict[str, str]] = None) -> AsyncGenerator[List[Dict], None]:
+        """
+        This function pages through a point in time with search_after.
+
+        Parameters
+        ----------
+        query : dict
+            A dictionary containing the Elasticsearch query parameters.
+        pitId : str
+            The id of an open point in time on self.index.
+        pageSize : int
+            The number of hits to request per page.
+        keepAlive : str
+            How long Elasticsearch keeps the point in time alive between pages.
+        sort : list or None
+            The sort used to page through the point in time. Defaults to index order ('_shard_doc').
+        sliceSpec : dict or None
+            An Elasticsearch slice ({'id': ..., 'max': ...}) restricting the stream to one slice of the point in time.
+        source : bool, list or None
+            The _source filtering of the hits, e.g. a list of the fields to return. Defaults to the whole _source.
+        pitState : dict or None
+            When given, its 'id' is kept set to the latest id of the point in time, which Elasticsearch may change
+            between searches, so the caller closes the current one.
+
+        Yields
+        ------
+        hits : list
+            A list containing the hits of a single page.
+        """
+        query = self.streamQuery(query)
+        searchAfter = None
+        while True:
+            try:
+                with stageTimer(self.metrics, 'fetch'):
+                    response = await self.client.search(
+                        query=query,
+                        pit={'id': pitId, 'keep_alive': keepAlive},
+                        size=pageSize,
+                        sort=sort or [{'_shard_doc': 'asc'}],
+                        search_after=searchAfter,
+                        slice=sliceSpec,
+                        source=source,
+                    )
+            except Exception as e:
+                error = f"Failed to retrieve data from Elasticsearch: {e}"
+                self.logger.error(error)
+                self.countError('fetch')
+                raise Exception(error)
+
+            pitId = response.get('pit_id', pitId)
+            if pitState is not None:
+                pitState['id'] = pitId
+            hits = response['hits']['hits']
+            self.countHits(hits)
+            if not hits:
+                return
+            yield hits
+            if len(hits) < pageSize:
+                return
+            searchAfter = hits[-1]['sort']
+
+    async def scrollStream(self, query: dict, pageSize: int, keepAlive: str, sliceSpec: Optional[Dict] = None, sort: Optional[List] = None, source: Optional[Union[bool, List[str]]] = None) -> AsyncGenerator[List[Dict], None]:
+        """
+        This function pages through the query results with the scroll API and clears the scroll context once done.
+
+        Parameters
+        ----------
+        query : dict
+            A dictionary containing the Elasticsearch query parameters.
+        pageSize : int
+            The number of hits to request per page.
+        keepAlive : str
+            How long Elasticsearch keeps the scroll context alive between pages.
+        sliceSpec : dict or None
+            An Elasticsearch slice ({'id': ..., 'max': ...}) restricting the scroll to one slice of the index.
+        sort : list or None
+            The sort of the scroll. '_shard_doc' entries, which only apply to points in time, are ignored. Defaults to '_doc'.
+        source : bool, list or None
+            The _source filtering of the hits, e.g. a list of the fields to return. Defaults to the whole _source.
+
+        Yields
+        ------
+        hits : list
+            A list containing the hits of a single page.
+        """
+        query = self.streamQuery(query)
+        scrollId = None
+        try:
+            with stageTimer(self.metrics, 'fetch'):
+                response = await self.client.search(index=self.index, query=query, size=pageSize, scroll=keepAlive, sort=[field for field in sort or [] if '_shard_doc' not in field] or ['_doc'], slice=sliceSpec, source=source)
+            while True:
+                scrollId = response.get('_scroll_id', scrollId)
+                hits = response['hits']['hits']
+                self.countHits(hits)
+                if not hits:
+                    return
+                yield hits
+                with stageTimer(self.metrics, 'fetch'):
+                    response = await self.client.scroll(scroll_id=scrollId, scroll=keepAlive)
+        except Exception as e:
+            error = f"Failed to retrieve data from Elasticsearch: {e}"
+            self.logger.error(error)
+            self.countError('fetch')
+            raise Exception(error)
+        finally:
+            if scrollId:
+                try:
+                    await self.client.clear_scroll(scroll_id=scrollId)
+                except Exception as e:
+                    self.logger.warning(f"Failed to clear scroll: {e}")
+
+    async def slicedStream(self, query: dict, slices: int, pageSize: int = 1000, keepAlive: str = '1m', queueSize: int = 0, source: Optional[Union[bool, List[str]]] = None) -> AsyncGenerator[List[Dict], None]:
+        """
+        This function splits self.index into slices, drains every slice concurrently on its own task and yields
+        the hit pages of all slices as a single merged stream. Pages arrive in completion order, not index order.
+
+        Parameters
+        ----------
+        query : dict
+            A dictionary containing the Elasticsearch query parameters.
+        slices : int
+            The number of slices (and reader tasks) to split the index into. A value of 1 behaves like dataStream.
+        pageSize : int
+            The number of hits to request per page and slice. Defaults to 1000.
+        keepAlive : str
+            How long Elasticsearch keeps the point in time or scroll contexts alive between pages. Defaults to '1m'.
+        queueSize : int
+            The number of pages buffered between the reader tasks and the consumer. Defaults to two per slice.
+        source : bool, list or None
+            The _source filtering of the hits, e.g. a list of the fields to return. Defaults to the whole _source.
+
+        Yields
+        ------
+        hits : list
+            A list containing the hits of a single page of one of the slices.
+        """
+        query = self.streamQuery(query)
+        if slices <= 1:
+            async for hits in self.dataStream(query=query, pageSize=pageSize, keepAlive=keepAlive, source=source):
+                yield hits
+            return
+
+        try:
+            pitId = (await self.client.open_point_in_time(index=self.index, keep_alive=keepAlive))['id']
+        except Exception as e:
+            self.logger.warning(f"Failed to open point in time, falling back to sliced scroll: {e}")
+            pitId = None
+        # the slices share the point in time, whose latest id is closed once they are done
+        pitState = {'id': pitId}
+
+        pages = asyncio.Queue(maxsize=queueSize or 2 * slices)
+        done = object()
+        # set once the consumer stops, so cancelled readers don't block on a full queue nobody reads
+        stop = asyncio.Event()
+
+        async def drain(sliceId):
+            sliceSpec = {'id': sliceId, 'max': slices}
+            if pitId:
+                stream = self.pitStream(query=query, pitId=pitId, pageSize=pageSize, keepAlive=keepAlive, sliceSpec=sliceSpec, source=source, pitState=pitState)
+            else:
+                stream = self.scrollStream(query=query, pageSize=pageSize, keepAlive=keepAlive, sliceSpec=sliceSpec, source=source)
+            try:
+                async for hits in stream:
+                    await pages.put(hits)
+            except Exception as e:
+                await pages.put(e)
+            finally:
+                await stream.aclose()
+                if not stop.is_set():
+                    await pages.put(done)
+
+        readers = [asyncio.create_task(drain(sliceId)) for sliceId in range(slices)]
+        try:
+            remaining = slices
+            while remaining:
+                item = await pages.get()
+                if item is done:
+                    remaining -= 1
+                elif isinstance(item, Exception):
+                    raise item
+                else:
+                    yield item
+        finally:
+            stop.set()
+            for reader in readers:
+                reader.cancel()
+            await asyncio.gather(*readers, return_exceptions=True)
+            if pitId:
+                await self.closePointInTime(pitState['id'])
+
+    async def close(self) -> None:
+        """
+        Closes the AsyncElasticsearch client unless it is shared through a client registry.
+        """
+        if self.client is not None and self.ownsClient:
+            await self.client.close()
@@ -0,0 +1,308 @@
+import time
+import asyncio
+import random
+from typing import List, Dict, Union, Iterable, AsyncIterable, AsyncGenerator, Tuple
+from neo4j import AsyncGraphDatabase, ResultSummary
+from Neo4jHandler import Neo4jHandler, RETRYABLE_ERRORS
+from SyncMetrics import stageTimer
+
+
+class AsyncNeo4jHandler(Neo4jHandler):
+    """
+    Asyncio variant of Neo4jHandler built on the async Neo4j driver. Statement building, batching and validation
+    are shared with Neo4jHandler; only the driver and the write path are asynchronous.
+    """
+
+    def createDriver(self, uri: str, user: str, password: str, **poolParams):
+        """
+        Creates the async Neo4j driver used by the handler.
+
+        Parameters
+        ----------
+        uri : str
+            The URI of the Neo4j database.
+        user : str
+            The username to use when connecting to the Neo4j database.
+        password : str
+            The password to use when connecting to the Neo4j database.
+        poolParams : dict
+            Connection pool settings such as max_connection_pool_size or keep_alive.
+
+        Returns
+        -------
+        driver : neo4j.AsyncDriver
+            The async Neo4j driver.
+        """
+        return AsyncGraphDatabase.driver(uri=uri, auth=(user, password), **poolParams)
+
+    @staticmethod
+    async def writeBatch(tx, statement: str, rows: List[Dict]) -> ResultSummary:
+        """
+        Runs a batch statement inside a transaction.
+
+        Parameters
+        ----------
+        tx : neo4j.AsyncTransaction
+            The transaction opened by executeBatch.
+        statement : str
+            The batch statement.
+        rows : list
+            The rows passed as the $rows parameter.
+
+        Returns
+        -------
+        summary : neo4j.ResultSummary
+            The summary of the statement.
+        """
+        result = await tx.run(statement, rows=rows)
+        return await result.consume()
+
+    async def executeBatch(self, statement: str, rows: List[Dict]) -> ResultSummary:
+        """
+        Commits a batch in its own explicit transaction, retrying transient errors such as deadlocks and lost
+        connections with exponential backoff and jitter. The driver's managed retries of session.execute_write are
+        not used, so maxRetries and retryBackoff are the only retry policy. With a batch sizer, a batch running out
+        of transaction memory is split and its parts committed one by one instead.
+
+        Parameters
+        ----------
+        statement : str
+            The batch statement.
+        rows : list
+            The rows passed as the $rows parameter.
+
+        Returns
+        -------
+        summary : neo4j.ResultSummary
+            The summary of the committed statement.
+        """
+        maxRetries = self.params.get('maxRetries', 5)
+        retryBackoff = self.params.get('retryBackoff', 0.1)
+        for attempt in range(maxRetries + 1):
+            try:
+                started = time.perf_counter()
+                with stageTimer(self.metrics, 'push'):
+                    async with self.driver.session() as session:
+                        tx = await session.begin_transaction()
+                        try:
+                            summary = await self.writeBatch(tx, statement, rows)
+                            await tx.commit()
+                        finally:
+                            await tx.close()
+                self.observeBatch(statement, rows, time.perf_counter() - started)
+                self.countBatch(rows)
+                return summary
+            except RETRYABLE_ERRORS as e:
+                parts = self.splitBatch(statement, rows, e)
+                if parts is not None:
+                    for part in parts:
+                        summary = await self.executeBatch(statement, part)
+                    return summary
+                if attempt == maxRetries:
+                    raise
+                if self.metrics is not None:
+                    self.metrics.increment('retries_total')
+                delay = retryBackoff * 2 ** attempt * (1 + random.random())
+                self.logger.warning(f"Retrying batch of {len(rows)} rows in {delay:.2f}s after {type(e).__name__}: {e}")
+                await asyncio.sleep(delay)
+
+    async def batchRows(self, queriesParams: Union[Iterable[Dict], AsyncIterable[Dict]], chunk: int, partitions: int = 1) -> AsyncGenerator[Tuple[int, str, List[Dict]], None]:
+        """
+        Async counterpart of Neo4jHandler.batchRows accepting either a plain or an async iterable of dyads.
+
+        Parameters
+        ----------
+        queriesParams : iterable or async iterable
+            The dyads produced by ElasticsearchToNeo4jSync.buildGraphData.
+        chunk : int
+            The maximum number of rows per batch, unless the handler has a batch sizer.
+        partitions : int
+            The number of partitions to spread the start node keys over. Defaults to 1.
+
+        Yields
+        ------
+        tuple
+            The partition, the cached statement of the group and a list of its rows.
+        """
+        if not hasattr(queriesParams, '__aiter__'):
+            for batch in super().batchRows(queriesParams, chunk=chunk, partitions=partitions):
+                yield batch
+            return
+
+        groups: Dict[Tuple[int, str], List[Dict]] = {}
+        async for queryParams in queriesParams:
+            group = self.batchGroup(queryParams, partitions)
+            if group is None:
+                continue
+            partition, statement, row = group
+            rows = groups.setdefault((partition, statement), [])
+            rows.append(row)
+            if len(rows) >= self.batchSize(statement, chunk):
+                yield partition, statement, rows
+                groups[(partition, statement)] = []
+        for (partition, statement), rows in groups.items():
+            if rows:
+                yield partition, statement, rows
+
+    async def writeBatches(self, queriesParams: Union[Iterable[Dict], AsyncIterable[Dict]], chunk: int, partitions: int = 1) -> AsyncGenerator[Tuple[int, Union[str, None], List[Dict]], None]:
+        """
+        Async counterpart of Neo4jHandler.writeBatches accepting either a plain or an async iterable of dyads. With
+        the twoPhase strategy, an async iterable is collected one window of dyads at a time.
+        """
+        if self.writeStrategy() == 'dyad':
+            async for batch in self.batchRows(queriesParams, chunk=chunk, partitions=partitions):
+                yield batch
+            return
+        if not hasattr(queriesParams, '__aiter__'):
+            for batch in self.twoPhaseRows(queriesParams, chunk=chunk, partitions=partitions):
+                yield batch
+            return
+
+        window = self.params.get('twoPhaseWindow', 100000)
+        dyads = []
+        async for queryParams in queriesParams:
+            dyads.append(queryParams)
+            if len(dyads) >= window:
+                for batch in self.twoPhaseRows(dyads, chunk=chunk, partitions=partitions):
+                    yield batch
+                dyads = []
+        for batch in self.twoPhaseRows(dyads, chunk=chunk, partitions=partitions):
+            yield batch
+
+    async def ensureSchema(self) -> None:
+        """
+        Async counterpart of Neo4jHandler.ensureSchema.
+        """
+        async with self.driver.session() as session:
+            for statement in self.schemaStatements():
+                await (await session.run(statement)).consume()
+            await (await session.run("CALL db.awaitIndexes($timeout)", timeout=self.params.get('schemaTimeout', 300))).consume()
+            indexes = await (await session.run("SHOW INDEXES YIELD labelsOrTypes, properties, state")).data()
+        missing = self.missingSchema(indexes)
+        if missing:
+            error = f"Failed to create indexes on {list(self.keyProps)} for labels {missing}"
+            self.logger.error(error)
+            raise Exception(error)
+        self.markSchemaReady()
+
+    async def prepareSchema(self) -> bool:
+        """
+        Async counterpart of Neo4jHandler.prepareSchema.
+        """
+        if self.schemaReady:
+            return True
+        try:
+            await self.ensureSchema()
+            return True
+        except Exception as e:
+            self.logger.warning(f"Couldn't prepare neo4j schema due to {e}")
+            return False
+
+    async def dataPush(self, queriesParams: Union[Iterable[Dict], AsyncIterable[Dict]]) -> bool:
+        """
+        Merges the dyads in batches of parameterized UNWIND statements. Every writer task owns one partition of the
+        start node keys, so with the writers parameter above 1 the batches are committed concurrently without two
+        writers merging the same start node.
+
+        Parameters
+        ----------
+        queriesParams : iterable or async iterable
+            The dictionaries containing data to be inserted into Neo4j.
+
+        Returns
+        -------
+        success : bool
+            A boolean indicating whether the data insertion was successful.
+        """
+        if not await self.prepareSchema():
+            return False
+        writers = self.params.get('writers', 1)
+        queues = [asyncio.Queue(maxsize=2) for _ in range(writers)]
+        errors = []
+
+        async def write(batches):
+            while True:
+                batch = await batches.get()
+                if batch is None:
+                    batches.task_done()
+                    return
+                if errors:
+                    self.spoolBatch(*batch)
+                    batches.task_done()
+                    continue
+                try:
+                    batchId = self.spoolBatch(*batch)
+                    await self.executeBatch(*batch)
+                    self.commitRows(batch[1])
+                    self.acknowledgeBatches([batchId])
+                except Exception as e:
+                    errors.append(e)
+                finally:
+                    batches.task_done()
+
+        tasks = [asyncio.create_task(write(batches)) for batches in queues]
+        pending = self.writeBatches(queriesParams, chunk=self.params.get('chunkSize', 1000), partitions=writers)
+        try:
+            async for partition, statement, rows in pending:
+                if statement is None:
+                    # a barrier of the write strategy: wait until every queued batch is committed
+                    await asyncio.gather(*(batches.join() for batches in queues))
+                    continue
+                if errors:
+                    self.spoolBatch(statement, rows)
+                    break
+                await queues[partition].put((statement, rows))
+        except Exception as e:
+            errors.append(e)
+        finally:
+            for batches in queues:
+                await batches.put(None)
+            await asyncio.gather(*tasks)
+
+        if errors:
+            self.logger.warning(f"Couldn't insert data due to {errors[0]}")
+            self.countError('push')
+            await self.spoolRemaining(pending)
+            self.releaseRows()
+            return False
+        self.logger.info('neo4j queries have been all written successfully')
+        return True
+
+    async def spoolRemaining(self, batches: AsyncIterable[Tuple[int, str, List[Dict]]]) -> None:
+        """
+        Async counterpart of Neo4jHandler.spoolRemaining.
+        """
+        if self.spool is None:
+            return
+        try:
+            async for _, statement, rows in batches:
+                if statement is not None:
+                    self.spoolBatch(statement, rows)
+        except Exception as e:
+            self.logger.warning(f"Couldn't spool the remaining batches due to {e}")
+
+    async def replaySpool(self) -> bool:
+        """
+        Async counterpart of Neo4jHandler.replaySpool.
+        """
+        if self.spool is None:
+            return True
+        if not await self.prepareSchema():
+            return False
+        replayed = 0
+        try:
+            for batchId, statement, rows in self.spool.pending():
+                await self.executeBatch(statement, rows)
+                self.commitRows(rows)
+                self.acknowledgeBatches([batchId])
+                replayed += 1
+        except Exception as e:
+            self.logger.warning(f"Couldn't replay spooled batches due to {e}")
+            self.countError('replay')
+            return False
+        self.logger.info(f"replayed {replayed} spooled neo4j batches")
+        return True
+
+    async def close(self):
+        if self.ownsDriver:
+            await self.driver.close()
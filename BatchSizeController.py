@@ -0,0 +1,147 @@
+from threading import Lock
+from typing import Any, Dict, Hashable, Optional
+
+
+class BatchSizeController():
+    def __init__(self, initialSize: int = 1000, targetLatency: float = 1.0, minSize: int = 50, maxSize: int = 50000,
+                 growth: float = 1.5, tolerance: float = 0.25, smoothing: float = 0.3) -> None:
+        """
+        Adapts the number of rows per Neo4j batch to what the database sustains, separately for every group of
+        batches, e.g. every (fromLabel, relationshipType, toLabel) shape. Batches are sized so a commit takes about
+        the target latency: the seconds per row of every committed batch are smoothed into an estimate, batches
+        shrink when they run over the target and grow by the growth factor while they run under it. Growth is
+        undone when the larger batches commit fewer rows per second than the smaller ones did, e.g. because they
+        hold their locks longer, and a transaction memory error caps the group at half of the failed batch.
+
+        Parameters
+        ----------
+        initialSize : int
+            The batch size of a group until its first batch is observed. Defaults to 1000.
+        targetLatency : float
+            The seconds a batch should take to commit. Defaults to 1.
+        minSize : int
+            The smallest batch size. Defaults to 50.
+        maxSize : int
+            The largest batch size. Defaults to 50000.
+        growth : float
+            The factor a batch size grows by while batches commit under the target latency. Defaults to 1.5.
+        tolerance : float
+            The relative deviation from the target latency, and the relative loss of throughput, that are accepted
+            without resizing. Defaults to 0.25.
+        smoothing : float
+            The weight of the latest batch in the smoothed seconds per row and rows per second. Defaults to 0.3.
+        """
+        if not 0 < minSize <= maxSize:
+            raise ValueError(f"Expected 0 < minSize <= maxSize, got {minSize} and {maxSize}")
+        self.initialSize = min(max(initialSize, minSize), maxSize)
+        self.targetLatency = targetLatency
+        self.minSize = minSize
+        self.maxSize = maxSize
+        self.growth = growth
+        self.tolerance = tolerance
+        self.smoothing = smoothing
+        self.lock = Lock()
+        self.groups: Dict[Hashable, Dict[str, Any]] = {}
+
+    def state(self, group: Hashable) -> Dict[str, Any]:
+        state = self.groups.get(group)
+        if state is None:
+            state = self.groups[group] = {
+                'size': self.initialSize,
+                'limit': self.maxSize,
+                'secondsPerRow': None,
+                'throughput': None,
+                # the size and throughput before the last growth, restored when growing did not pay off
+                'previous': None,
+                'batches': 0,
+                'overflows': 0,
+            }
+        return state
+
+    def size(self, group: Hashable) -> int:
+        """
+        Returns the number of rows of the next batch of a group.
+        """
+        with self.lock:
+            return self.state(group)['size']
+
+    def smooth(self, previous: Optional[float], value: float) -> float:
+        return value if previous is None else self.smoothing * value + (1 - self.smoothing) * previous
+
+    def observe(self, group: Hashable, rows: int, seconds: float) -> int:
+        """
+        Records the commit latency of a batch and resizes the batches of its group.
+
+        Parameters
+        ----------
+        group : hashable
+            The group of the batch.
+        rows : int
+            The number of rows of the batch.
+        seconds : float
+            The seconds the batch took to commit.
+
+        Returns
+        -------
+        size : int
+            The new batch size of the group.
+        """
+        if rows <= 0 or seconds <= 0:
+            return self.size(group)
+        with self.lock:
+            state = self.state(group)
+            state['batches'] += 1
+            state['secondsPerRow'] = self.smooth(state['secondsPerRow'], seconds / rows)
+            # remainders of a group are smaller than its batch size and say little about its throughput
+            if rows < state['size'] * (1 - self.tolerance):
+                return state['size']
+            throughput = self.smooth(state['throughput'], rows / seconds)
+            previous = state['previous']
+            if previous is not None and state['size'] > previous['size'] and throughput < previous['throughput'] * (1 - self.tolerance):
+                state.update(size=previous['size'], throughput=previous['throughput'], previous=None)
+                return state['size']
+            state['throughput'] = throughput
+
+            fitting = self.targetLatency / state['secondsPerRow']
+            if fitting < state['size'] * (1 - self.tolerance):
+                size = fitting
+            elif fitting > state['size'] * (1 + self.tolerance):
+                size = min(state['size'] * self.growth, fitting)
+                state['previous'] = {'size': state['size'], 'throughput': throughput}
+            else:
+                return state['size']
+            state['size'] = int(min(max(size, self.minSize), state['limit']))
+            return state['size']
+
+    def overflow(self, group: Hashable, rows: int) -> int:
+        """
+        Records a batch that ran out of transaction memory and caps the batches of its group at half of its rows.
+
+        Parameters
+        ----------
+        group : hashable
+            The group of the batch.
+        rows : int
+            The number of rows of the failed batch.
+
+        Returns
+        -------
+        size : int
+            The new batch size of the group.
+        """
+        with self.lock:
+            state = self.state(group)
+            state['overflows'] += 1
+            state['limit'] = max(min(state['limit'], rows // 2), self.minSize)
+            state['size'] = min(state['size'], state['limit'])
+            state['previous'] = None
+            return state['size']
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Returns the batch size, size limit, smoothed seconds per row and rows per second, observed batches and
+        memory errors of every group.
+        """
+        with self.lock:
+            return {str(group): {key: value for key, value in state.items() if key != 'previous'}
+                    for group, state in self.groups.items()}
@@ -0,0 +1,250 @@
+import os
+import json
+import time
+import uuid
+import zlib
+import fcntl
+import struct
+from threading import Lock
+from typing import Any, BinaryIO, Dict, Generator, List, Set, Tuple
+
+# every record is framed as its kind, the length and the CRC32 of its zlib-compressed JSON payload
+FRAME = struct.Struct('>cII')
+BATCH = b'B'
+ACK = b'A'
+SEGMENT_SUFFIX = '.segment'
+
+
+class BatchSpool():
+    def __init__(self, path: str, segmentBytes: int = 64 * 2 ** 20, fsync: bool = True, compressLevel: int = 1) -> None:
+        """
+        Write-ahead log of the Neo4j batches of a push. Every batch is appended before it is committed and
+        acknowledged once it is, so the batches a failed push left unacknowledged can be replayed without fetching
+        them from Elasticsearch again.
+
+        Records are appended to compressed segment files, and the acknowledgement of a batch is appended to the
+        segment holding the batch. Several spools can share a directory: every spool holds an exclusive lock on the
+        segments it writes, and only adopts the segments nobody holds, i.e. those left by spools that were closed
+        or died. A torn record at the end of an adopted segment is truncated before anything is appended to it. A
+        spool deletes the segments it owns once all of their batches are acknowledged.
+
+        Parameters
+        ----------
+        path : str
+            The directory of the segment files. It is created when missing.
+        segmentBytes : int
+            The size at which a new segment is started. Defaults to 64 MiB.
+        fsync : bool
+            Whether every batch is flushed to disk before it is committed. Defaults to True. Acknowledgements are
+            never fsynced since replaying a committed batch merges the same rows again.
+        compressLevel : int
+            The zlib compression level of the records. Defaults to 1.
+        """
+        self.path = path
+        self.segmentBytes = segmentBytes
+        self.fsync = fsync
+        self.compressLevel = compressLevel
+        self.lock = Lock()
+        # the locked append handle and the unacknowledged batches of every segment owned by the spool, and the
+        # segment of every unacknowledged batch
+        self.files: Dict[str, BinaryIO] = {}
+        self.segmentBatches: Dict[str, Set[str]] = {}
+        self.pendingBatches: Dict[str, str] = {}
+        os.makedirs(path, exist_ok=True)
+        for segment in self.segments():
+            self.adopt(segment)
+        self.segment = self.createSegment()
+
+    @staticmethod
+    def batchId(segment: str, offset: int) -> str:
+        return f"{segment}:{offset}"
+
+    @staticmethod
+    def parseBatchId(batchId: str) -> Tuple[str, int]:
+        segment, offset = batchId.rsplit(':', 1)
+        return segment, int(offset)
+
+    def segmentPath(self, segment: str) -> str:
+        return os.path.join(self.path, f"{segment}{SEGMENT_SUFFIX}")
+
+    def segments(self) -> List[str]:
+        """
+        Returns the names of the segment files in the spool directory, oldest first.
+        """
+        return sorted(name[:-len(SEGMENT_SUFFIX)] for name in os.listdir(self.path) if name.endswith(SEGMENT_SUFFIX))
+
+    def createSegment(self) -> str:
+        """
+        Creates a segment named after its creation time and locks it. The segment is locked under a temporary name
+        and then renamed, so no other spool can adopt it in between.
+        """
+        segment = f"{time.time_ns():020d}-{uuid.uuid4().hex[:8]}"
+        temporaryPath = f"{self.segmentPath(segment)}.tmp"
+        segmentFile = open(temporaryPath, 'xb')
+        fcntl.flock(segmentFile, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        os.rename(temporaryPath, self.segmentPath(segment))
+        self.files[segment] = segmentFile
+        self.segmentBatches[segment] = set()
+        return segment
+
+    def adopt(self, segment: str) -> None:
+        """
+        Takes over a segment no other spool holds, with its unacknowledged batches, and deletes it when it has none.
+        """
+        try:
+            segmentFile = open(self.segmentPath(segment), 'ab')
+        except FileNotFoundError:
+            return
+        try:
+            fcntl.flock(segmentFile, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            # another spool may have deleted the segment before releasing it
+            if os.fstat(segmentFile.fileno()).st_ino != os.stat(self.segmentPath(segment)).st_ino:
+                raise FileNotFoundError(segment)
+        except OSError:
+            segmentFile.close()
+            return
+
+        pending, end = set(), 0
+        for kind, offset, payload, end in self.readSegment(segment):
+            if kind == BATCH:
+                pending.add(self.batchId(segment, offset))
+            elif kind == ACK:
+                pending.discard(json.loads(payload))
+        if not pending:
+            os.remove(self.segmentPath(segment))
+            segmentFile.close()
+            return
+        segmentFile.truncate(end)
+        self.files[segment] = segmentFile
+        self.segmentBatches[segment] = pending
+        for batchId in pending:
+            self.pendingBatches[batchId] = segment
+
+    def readSegment(self, segment: str, offset: int = 0) -> Generator[Tuple[bytes, int, bytes, int], None, None]:
+        """
+        Reads the records of a segment from an offset, stopping at the first torn or corrupt record.
+
+        Yields
+        ------
+        tuple
+            The kind, offset, decompressed payload and end offset of every record.
+        """
+        with open(self.segmentPath(segment), 'rb') as segmentFile:
+            segmentFile.seek(offset)
+            while True:
+                header = segmentFile.read(FRAME.size)
+                if len(header) < FRAME.size:
+                    return
+                kind, length, checksum = FRAME.unpack(header)
+                compressed = segmentFile.read(length)
+                if len(compressed) < length or zlib.crc32(compressed) != checksum:
+                    return
+                end = offset + FRAME.size + length
+                yield kind, offset, zlib.decompress(compressed), end
+                offset = end
+
+    def write(self, segment: str, kind: bytes, payload: Any, sync: bool) -> int:
+        # must be called with the lock held
+        compressed = zlib.compress(json.dumps(payload, separators=(',', ':'), default=str).encode(), self.compressLevel)
+        segmentFile = self.files[segment]
+        offset = segmentFile.seek(0, os.SEEK_END)
+        segmentFile.write(FRAME.pack(kind, len(compressed), zlib.crc32(compressed)) + compressed)
+        segmentFile.flush()
+        if sync:
+            os.fsync(segmentFile.fileno())
+        return offset
+
+    def release(self, segment: str) -> None:
+        # must be called with the lock held; deletes a fully acknowledged segment of the spool
+        os.remove(self.segmentPath(segment))
+        self.files.pop(segment).close()
+        del self.segmentBatches[segment]
+
+    def append(self, statement: str, rows: List[Dict[str, Any]]) -> str:
+        """
+        Appends a batch before it is committed.
+
+        Parameters
+        ----------
+        statement : str
+            The batch statement.
+        rows : list
+            The rows passed as the $rows parameter.
+
+        Returns
+        -------
+        batchId : str
+            The id acknowledging the batch once it is committed.
+        """
+        with self.lock:
+            if self.files[self.segment].seek(0, os.SEEK_END) >= self.segmentBytes:
+                previous = self.segment
+                self.segment = self.createSegment()
+                if not self.segmentBatches[previous]:
+                    self.release(previous)
+            batchId = self.batchId(self.segment, self.write(self.segment, BATCH, {'statement': statement, 'rows': rows}, sync=self.fsync))
+            self.pendingBatches[batchId] = self.segment
+            self.segmentBatches[self.segment].add(batchId)
+            return batchId
+
+    def acknowledge(self, batchId: str) -> None:
+        """
+        Marks a batch as committed, deleting its segment once it holds no unacknowledged batch anymore and is not
+        the segment being written.
+
+        Parameters
+        ----------
+        batchId : str
+            The id returned by append or pending.
+        """
+        with self.lock:
+            segment = self.pendingBatches.pop(batchId, None)
+            if segment is None:
+                return
+            self.write(segment, ACK, batchId, sync=False)
+            self.segmentBatches[segment].discard(batchId)
+            if not self.segmentBatches[segment] and segment != self.segment:
+                self.release(segment)
+
+    def pending(self) -> Generator[Tuple[str, str, List[Dict[str, Any]]], None, None]:
+        """
+        Reads the unacknowledged batches of the spool, oldest first, including those of the segments it adopted
+        from earlier spools. The batches of segments held by other open spools are theirs and not returned.
+
+        Yields
+        ------
+        tuple
+            The batch id, the statement and the rows of every unacknowledged batch.
+        """
+        with self.lock:
+            batchIds = sorted(self.pendingBatches, key=self.parseBatchId)
+        for batchId in batchIds:
+            if batchId not in self.pendingBatches:
+                continue
+            segment, offset = self.parseBatchId(batchId)
+            for _, _, payload, _ in self.readSegment(segment, offset):
+                batch = json.loads(payload)
+                yield batchId, batch['statement'], batch['rows']
+                break
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Returns the number of unacknowledged batches, of segment files owned by the spool and their size in bytes.
+        """
+        with self.lock:
+            return {
+                'pending': len(self.pendingBatches),
+                'segments': len(self.files),
+                'bytes': sum(os.path.getsize(self.segmentPath(segment)) for segment in self.files),
+            }
+
+    def close(self) -> None:
+        """
+        Deletes the fully acknowledged segments of the spool and releases the others for a later spool to adopt.
+        """
+        with self.lock:
+            for segment in list(self.files):
+                if self.segmentBatches[segment]:
+                    self.files.pop(segment).close()
+                else:
+                    self.release(segment)
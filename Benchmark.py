@@ -0,0 +1,692 @@
+import re
+import sys
+import json
+import time
+import logging
+import platform
+import resource
+from collections import Counter
+from threading import Lock
+from elasticsearch.serializer import JsonSerializer
+import random
+import argparse
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from ElasticsearchToNeo4jSync import ElasticsearchToNeo4jSync
+from ElasticsearchHandler import ElasticsearchHandler
+from Neo4jHandler import Neo4jHandler
+from DocumentTransform import ThresholdFilter, np
+from FastJsonSerializer import FastJsonSerializer, orjson, simdjson
+from FakeNeo4jDriver import FakeNeo4jDriver
+from SyncMetrics import SyncMetrics
+from BatchSizeController import BatchSizeController
+
+logger = logging.getLogger(__name__)
+
+# the entity scores of synthetic documents; the default thresholds keep scores >= 0.9
+SCORE_DISTRIBUTIONS: Dict[str, Callable[[random.Random], float]] = {
+    'uniform': lambda rng: rng.random(),
+    'high': lambda rng: rng.betavariate(5, 1),
+    'low': lambda rng: rng.betavariate(1, 5),
+}
+
+
+def syntheticDocuments(count: int, seed: int = 0, fanOut: Tuple[int, int] = (1, 4), scores: str = 'uniform', names: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Builds parsed documents shaped like the output of ElasticsearchToNeo4jSync.generateDocuments.
+
+    Parameters
+    ----------
+    count : int
+        The number of documents.
+    seed : int
+        The seed of the random generator. Defaults to 0.
+    fanOut : tuple of int
+        The minimum and maximum number of related persons and of related organizations per document. Defaults to (1, 4).
+    scores : str
+        The distribution of the entity scores, a key of SCORE_DISTRIBUTIONS. Defaults to 'uniform'.
+    names : int or None
+        The number of distinct names per entity field. Defaults to the number of documents.
+
+    Returns
+    -------
+    list
+        The documents.
+    """
+    rng = random.Random(seed)
+    score = SCORE_DISTRIBUTIONS[scores]
+    names = names or count
+
+    def entities(prefix, size):
+        return [{'answer': f"{prefix}{rng.randrange(names)}", 'score': score(rng)} for _ in range(size)]
+
+    return [{
+        'vendor': entities('vendor', 1),
+        'relatedPersons': entities('person', rng.randint(*fanOut)),
+        'relatedOrganizations': entities('organization', rng.randint(*fanOut)),
+        'amount': entities('', 1),
+    } for _ in range(count)]
+
+
+def docsPerSecond(transform: Callable[[Dict[str, Any]], Any], docs: List[Dict[str, Any]], repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for doc in docs:
+            transform(doc)
+        best = min(best, time.perf_counter() - start)
+    return len(docs) / best
+
+
+def benchmarkMapping(sync: ElasticsearchToNeo4jSync, docs: List[Dict[str, Any]], repeat: int = 5) -> Dict[str, Any]:
+    """
+    Compares the per-document resolution of the neo4j parameters through buildGraphData with the compiled mapping
+    plan applied by neo4jQueryBuilder. Both map every document with the first configured mapping.
+
+    Parameters
+    ----------
+    sync : ElasticsearchToNeo4jSync
+        The synchronizer whose neo4j parameters and mapping plan are measured.
+    docs : list
+        The parsed documents.
+    repeat : int
+        The number of timed runs; the fastest one is reported. Defaults to 5.
+
+    Returns
+    -------
+    dict
+        The documents per second of both paths and the speedup of the mapping plan.
+    """
+    neo4jParams = sync.neo4jParams
+
+    def perDocument(doc):
+        return sync.buildGraphData(
+            from_type_key=neo4jParams.get('from', [])[0],
+            to_type_key=neo4jParams.get('to', [])[0],
+            relationship_type=neo4jParams.get('relationship', [])[0],
+            from_props_keys=neo4jParams.get('fromProps', [])[0],
+            to_props_keys=neo4jParams.get('toProps', [])[0],
+            relationship_props=neo4jParams.get('relationshipProps', [])[0],
+            doc=doc,
+            neo4jPropConvert=neo4jParams.get('propMap', {}),
+            types=neo4jParams.get('types', {}),
+        )
+
+    spec = sync.mappingPlan.specs[0]
+    before = docsPerSecond(perDocument, docs, repeat)
+    after = docsPerSecond(spec.apply, docs, repeat)
+    return {'documents': len(docs), 'perDocumentDocsPerSec': before, 'mappingPlanDocsPerSec': after, 'speedup': after / before}
+
+
+def benchmarkThresholds(sync: ElasticsearchToNeo4jSync, docs: List[Dict[str, Any]], pageSize: int = 1000, repeat: int = 5) -> Dict[str, Any]:
+    """
+    Compares filtering the thresholds one document at a time with the vectorized pass over pages of documents.
+
+    Parameters
+    ----------
+    sync : ElasticsearchToNeo4jSync
+        The synchronizer whose threshold parameters are measured.
+    docs : list
+        The parsed documents.
+    pageSize : int
+        The number of documents per vectorized pass. Defaults to 1000.
+    repeat : int
+        The number of timed runs; the fastest one is reported. Defaults to 5.
+
+    Returns
+    -------
+    dict
+        The documents per second of both paths and the speedup of the vectorized pass.
+    """
+    filters = ThresholdFilter.compile(sync.params['parse'])
+
+    def timed(run):
+        best = float('inf')
+        for _ in range(repeat):
+            copies = [{key: list(value) for key, value in doc.items()} for doc in docs]
+            start = time.perf_counter()
+            run(copies)
+            best = min(best, time.perf_counter() - start)
+        return len(docs) / best
+
+    def perDocument(copies):
+        for doc in copies:
+            for thresholdFilter in filters:
+                thresholdFilter.apply(doc)
+
+    def vectorized(copies):
+        for offset in range(0, len(copies), pageSize):
+            for thresholdFilter in filters:
+                thresholdFilter.applyBatch(copies[offset:offset + pageSize], vectorized=True)
+
+    before = timed(perDocument)
+    after = timed(vectorized)
+    return {'documents': len(docs), 'pageSize': pageSize, 'perDocumentDocsPerSec': before, 'vectorizedDocsPerSec': after, 'speedup': after / before}
+
+
+def syntheticResponse(hits: int, embeddingDims: int = 0, seed: int = 0, fanOut: Tuple[int, int] = (1, 4), scores: str = 'uniform', names: Optional[int] = None) -> bytes:
+    """
+    Builds the raw body of a search response whose hits carry the mapped entity fields next to large unmapped fields,
+    as stored by the upstream extraction.
+
+    Parameters
+    ----------
+    hits : int
+        The number of hits.
+    embeddingDims : int
+        The length of an unmapped embedding vector added to every hit, or 0 for none. Defaults to 0.
+    seed : int
+        The seed of the random generator. Defaults to 0.
+    fanOut, scores, names
+        The shape of the documents, see syntheticDocuments.
+
+    Returns
+    -------
+    bytes
+        The response body.
+    """
+    rng = random.Random(seed)
+    documents = syntheticDocuments(hits, seed, fanOut=fanOut, scores=scores, names=names)
+    for document in documents:
+        for entities in document.values():
+            for entity in entities:
+                entity['context'] = ' '.join(str(rng.random()) for _ in range(10))
+        document['body'] = ' '.join(str(rng.random()) for _ in range(200))
+        document['@timestamp'] = rng.randrange(10 ** 9)
+        if embeddingDims:
+            document['embedding'] = [rng.random() for _ in range(embeddingDims)]
+    return json.dumps({
+        'took': 12, 'timed_out': False,
+        'hits': {'total': {'value': hits, 'relation': 'eq'}, 'max_score': None, 'hits': [
+            {'_index': 'documents', '_id': str(idx), '_score': None, '_source': document, 'sort': [document['@timestamp'], idx]}
+            for idx, document in enumerate(documents)
+        ]},
+    }).encode()
+
+
+def benchmarkDecoding(sync: ElasticsearchToNeo4jSync, response: bytes, repeat: int = 5) -> Dict[str, Any]:
+    """
+    Compares decoding a search response with the client's json serializer, with orjson and with the lazy simdjson
+    decoder that only materializes the mapped fields. Decoders whose package is missing fall back as in production.
+
+    Parameters
+    ----------
+    sync : ElasticsearchToNeo4jSync
+        The synchronizer whose mapped fields are materialized by the lazy decoder.
+    response : bytes
+        The raw body of a search response, e.g. one recorded from the cluster.
+    repeat : int
+        The number of timed runs; the fastest one is reported. Defaults to 5.
+
+    Returns
+    -------
+    dict
+        The milliseconds per response of every decoder and the speedups over the json serializer.
+    """
+    serializers = {
+        'json': JsonSerializer(),
+        'orjson': FastJsonSerializer(),
+        'lazy': FastJsonSerializer(sourceFields=sync.mappedSourceFields() + [sync.params['incremental']['field']]),
+    }
+    milliseconds = {}
+    for name, serializer in serializers.items():
+        best = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            serializer.loads(response)
+            best = min(best, time.perf_counter() - start)
+        milliseconds[name] = best * 1000
+    return {
+        'bytes': len(response),
+        'milliseconds': milliseconds,
+        'orjsonSpeedup': milliseconds['json'] / milliseconds['orjson'],
+        'lazySpeedup': milliseconds['json'] / milliseconds['lazy'],
+    }
+
+
+class SyntheticSearch():
+    def __init__(self, hits: int, pageSize: int = 1000, fanOut: Tuple[int, int] = (1, 4), scores: str = 'uniform', distinctPages: int = 4, seed: int = 0, serializer=None) -> None:
+        """
+        In-process stand-in for the Elasticsearch client serving a synthetic index of hits through a point in time.
+        A few distinct page bodies are encoded up front and every search decodes one of them with the serializer of
+        the handler, so the fetch stage pays the decoding of real response bytes but not their generation, and 10M
+        hits do not need to fit in memory.
+
+        Parameters
+        ----------
+        hits : int
+            The number of hits in the index.
+        pageSize : int
+            The number of hits of the encoded pages. Defaults to 1000.
+        fanOut, scores
+            The shape of the documents, see syntheticDocuments.
+        distinctPages : int
+            The number of distinct page bodies cycled through. Defaults to 4.
+        seed : int
+            The seed of the first page; page n uses seed + n. Defaults to 0.
+        serializer : Serializer or None
+            Decodes the page bodies, e.g. ElasticsearchToNeo4jSync.responseSerializer(). Defaults to the client's json serializer.
+        """
+        self.hits = hits
+        self.pageSize = pageSize
+        self.serializer = serializer or JsonSerializer()
+        pages = min(distinctPages, max(1, -(-hits // pageSize)))
+        # names are drawn from the whole index, so the pages share vendors, persons and organizations like real data
+        self.pages = [syntheticResponse(pageSize, seed=seed + page, fanOut=fanOut, scores=scores, names=max(hits // 10, 1)) for page in range(pages)]
+        self.searches = 0
+
+    def open_point_in_time(self, **kwargs) -> Dict[str, str]:
+        return {'id': 'synthetic'}
+
+    def close_point_in_time(self, **kwargs) -> Dict[str, bool]:
+        return {'succeeded': True}
+
+    def search(self, size: int = 10, search_after: Optional[List] = None, slice: Optional[Dict] = None, **kwargs) -> Dict[str, Any]:
+        """
+        Returns the page of hits following search_after, restricted to the slice if any. The hits are sorted by
+        position, which is also their _id.
+        """
+        first, last = 0, self.hits
+        if slice is not None:
+            first, last = self.hits * slice['id'] // slice['max'], self.hits * (slice['id'] + 1) // slice['max']
+        start = search_after[0] + 1 if search_after else first
+        count = max(0, min(size, last - start))
+        page = start // self.pageSize
+        response = self.serializer.loads(self.pages[page % len(self.pages)])
+        hits = response['hits']['hits']
+        while len(hits) < count:
+            page += 1
+            hits = hits + self.serializer.loads(self.pages[page % len(self.pages)])['hits']['hits']
+        hits = hits[:count]
+        for position, hit in enumerate(hits, start):
+            hit['_id'], hit['sort'] = str(position), [position]
+        response['hits']['hits'] = hits
+        response['pit_id'] = 'synthetic'
+        self.searches += 1
+        return response
+
+    def close(self) -> None:
+        pass
+
+
+class RecordingDriver():
+    def __init__(self) -> None:
+        """
+        Stand-in for the Neo4j driver recording the batches written by Neo4jHandler instead of sending them. Schema
+        statements are answered as if the constraints came online at once.
+        """
+        self.lock = Lock()
+        self.statements: Counter = Counter()
+        self.batches = 0
+        self.rows = 0
+        self.commits = 0
+        self.indexes: List[Dict[str, Any]] = []
+
+    def session(self, **kwargs) -> 'RecordingSession':
+        return RecordingSession(self)
+
+    def record(self, statement: str, parameters: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        Records a statement and returns its records.
+        """
+        if statement.startswith('SHOW INDEXES'):
+            return list(self.indexes)
+        if statement.startswith('CREATE'):
+            label, properties = re.search(r"FOR \(n:`([^`]+)`\) (?:REQUIRE|ON) \((.+?)\)", statement).groups()
+            with self.lock:
+                self.indexes.append({'labelsOrTypes': [label], 'properties': re.findall(r"n\.`([^`]+)`", properties), 'state': 'ONLINE'})
+            return []
+        rows = parameters.get('rows')
+        if rows is not None:
+            with self.lock:
+                self.batches += 1
+                self.rows += len(rows)
+                self.statements[statement] += len(rows)
+        return []
+
+    def close(self) -> None:
+        pass
+
+
+class RecordingResult():
+    def __init__(self, records: List[Dict[str, Any]]) -> None:
+        self.records = records
+
+    def consume(self) -> None:
+        return None
+
+    def data(self) -> List[Dict[str, Any]]:
+        return self.records
+
+
+class RecordingTransaction():
+    def __init__(self, driver: RecordingDriver) -> None:
+        self.driver = driver
+
+    def run(self, statement: str, parameters: Optional[Dict[str, Any]] = None, **kwargs) -> RecordingResult:
+        return RecordingResult(self.driver.record(statement, {**(parameters or {}), **kwargs}))
+
+    def commit(self) -> None:
+        with self.driver.lock:
+            self.driver.commits += 1
+
+    def rollback(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class RecordingSession(RecordingTransaction):
+    def __enter__(self) -> 'RecordingSession':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        pass
+
+    def begin_transaction(self) -> RecordingTransaction:
+        return RecordingTransaction(self.driver)
+
+    def execute_write(self, work: Callable, *args, **kwargs) -> Any:
+        tx = RecordingTransaction(self.driver)
+        result = work(tx, *args, **kwargs)
+        tx.commit()
+        return result
+
+
+class RecordingNeo4jHandler(Neo4jHandler):
+    """
+    Neo4jHandler writing to a given stand-in driver instead of connecting to a database.
+    """
+
+    def __init__(self, driver, **handlerParams) -> None:
+        self.benchmarkDriver = driver
+        super().__init__(**handlerParams)
+
+    def createDriver(self, uri: str, user: str, password: str, **poolParams):
+        return self.benchmarkDriver
+
+
+class SyntheticElasticsearchHandler(ElasticsearchHandler):
+    """
+    ElasticsearchHandler searching a given stand-in client instead of connecting to a cluster.
+    """
+
+    def __init__(self, client, **handlerParams) -> None:
+        self.benchmarkClient = client
+        super().__init__(**handlerParams)
+
+    def createClient(self, **clientParams):
+        return self.benchmarkClient
+
+
+class BenchmarkSync(ElasticsearchToNeo4jSync):
+    """
+    ElasticsearchToNeo4jSync reading from a SyntheticSearch and writing to a RecordingDriver, with its own fresh
+    metrics. The dyad cache is disabled since the synthetic pages repeat.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.dyadCache = None
+        self.search: Optional[SyntheticSearch] = None
+        self.driver: Optional[RecordingDriver] = None
+
+    def elasticsearchHandler(self, handlerClass: type = ElasticsearchHandler) -> ElasticsearchHandler:
+        # built without the client registry, which would hand out a client connected to ES_HOSTS
+        return SyntheticElasticsearchHandler(
+            client=self.search,
+            hosts=None,
+            username=None,
+            password=None,
+            caCerts=None,
+            caFingerprint=None,
+            index='documents',
+            logger=logger,
+            serializer=self.responseSerializer(),
+            resultCache=self.queryResultCache,
+            invalidateOnRefresh=self.params['cache']['invalidateOnRefresh'],
+            metrics=self.metrics,
+        )
+
+    def neo4jHandler(self, handlerClass: type = Neo4jHandler) -> Neo4jHandler:
+        return RecordingNeo4jHandler(
+            driver=self.driver,
+            neo4jParameters=self.neo4jHandlerParams(),
+            uri=None,
+            user=None,
+            password=None,
+            logger=logger,
+            dyadCache=self.dyadCache,
+            metrics=self.metrics,
+            batchSizer=self.batchSizer,
+            spool=self.spool,
+        )
+
+
+def peakRssMegabytes() -> float:
+    """
+    Returns the peak resident set size of the process so far. It never decreases, so compare separate processes.
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 / 1024 if sys.platform == 'darwin' else peak / 1024
+
+
+def environment() -> Dict[str, Any]:
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'orjson': orjson is not None,
+        'simdjson': simdjson is not None,
+        'numpy': np is not None,
+    }
+
+
+def benchmarkEndToEnd(hits: int, pageSize: int = 1000, fanOut: Tuple[int, int] = (1, 4), scores: str = 'uniform', runner: str = 'startProcess', workers: int = 1, seed: int = 0, decoder: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Runs a whole sync of a synthetic index through ElasticsearchToNeo4jSync, from the paged searches to the Neo4j
+    batches, against in-process stand-ins of Elasticsearch and Neo4j.
+
+    Parameters
+    ----------
+    hits : int
+        The number of hits in the synthetic index.
+    pageSize : int
+        The number of hits per search. Defaults to 1000.
+    fanOut, scores
+        The shape of the documents, see syntheticDocuments.
+    runner : str
+        The runner of the sync, 'startProcess' or 'startPipelinedProcess'. Defaults to 'startProcess'.
+    workers : int
+        The number of transform processes. Defaults to 1.
+    seed : int
+        The seed of the synthetic pages. Defaults to 0.
+    decoder : str or None
+        Overrides params['fetch']['decoder'].
+
+    Returns
+    -------
+    dict
+        The scenario, the docs/sec, rows/sec, batches, peak RSS and the time spent in every stage.
+    """
+    sync = BenchmarkSync()
+    sync.params['fetch']['pageSize'] = pageSize
+    sync.params['transform']['workers'] = workers
+    if decoder is not None:
+        sync.params['fetch']['decoder'] = decoder
+    sync.search = SyntheticSearch(hits, pageSize=pageSize, fanOut=fanOut, scores=scores, seed=seed, serializer=sync.responseSerializer())
+    sync.driver = RecordingDriver()
+    # the synthetic index is synced whole, as an event without search queries does
+    queryCloudEvent = {'searchQueries': []}
+
+    start = time.perf_counter()
+    success = getattr(sync, runner)(queryCloudEvent)
+    seconds = time.perf_counter() - start
+    summary = sync.metrics.summary()
+    return {
+        'scenario': {'hits': hits, 'pageSize': pageSize, 'fanOut': list(fanOut), 'scores': scores, 'runner': runner,
+                     'workers': workers, 'seed': seed, 'decoder': sync.params['fetch']['decoder']},
+        'success': success,
+        'seconds': seconds,
+        'docsPerSecond': hits / seconds,
+        'rowsPerSecond': sync.driver.rows / seconds,
+        'rows': sync.driver.rows,
+        'batches': sync.driver.batches,
+        'searches': sync.search.searches,
+        'peakRssMegabytes': peakRssMegabytes(),
+        'stages': summary['stages'],
+        'boundBy': summary['boundBy'],
+    }
+
+
+def benchmarkWrites(documents: int = 10000, names: Optional[int] = None, fanOut: Tuple[int, int] = (1, 4), writers: int = 1, chunkSize: int = 1000,
+                    maxRetries: int = 5, latency: float = 0.001, rowLatency: float = 0.0, conflictRate: float = 0.0, memoryLimitRows: Optional[int] = None,
+                    targetLatency: Optional[float] = None, writeStrategy: str = 'dyad', seed: int = 0) -> Dict[str, Any]:
+    """
+    Pushes the dyads of synthetic documents through Neo4jHandler.dataPush into a FakeNeo4jDriver and checks that
+    the graph holds exactly the distinct nodes and relationships of the dyads, to tune the batch size, the writers
+    and the retry policy offline.
+
+    Parameters
+    ----------
+    documents : int
+        The number of synthetic documents. Defaults to 10000.
+    names : int or None
+        The number of distinct names per entity field; fewer names mean more hub nodes shared by the writers.
+        Defaults to a tenth of the documents.
+    fanOut : tuple of int
+        The related persons and organizations per document, see syntheticDocuments. Defaults to (1, 4).
+    writers : int
+        The writers parameter of the handler. Defaults to 1.
+    chunkSize : int
+        The rows per batch, or the initial rows per batch with a target latency. Defaults to 1000.
+    maxRetries : int
+        The retries of a failed batch. Defaults to 5.
+    latency, rowLatency, conflictRate
+        The simulated round trip latency, server seconds per row and probability of lock conflicts with other
+        clients, see FakeNeo4jDriver.
+    memoryLimitRows : int or None
+        The rows a transaction can write before running out of memory, see FakeNeo4jDriver. Defaults to None.
+    targetLatency : float or None
+        When given, the batches are sized by a BatchSizeController targeting this commit latency. Defaults to None.
+    writeStrategy : str
+        The writeStrategy parameter of the handler, 'dyad' or 'twoPhase'. Defaults to 'dyad'.
+    seed : int
+        The seed of the documents and conflicts. Defaults to 0.
+
+    Returns
+    -------
+    dict
+        The scenario, the rows per second, the retries, the driver statistics, the final batch sizes and whether the
+        graph is correct.
+    """
+    sync = ElasticsearchToNeo4jSync()
+    docs = syntheticDocuments(documents, seed, fanOut=fanOut, scores='high', names=names or max(documents // 10, 1))
+    dyads = [queryParams for doc in docs for queryParams in sync.mappingPlan.expand(doc)]
+    driver = FakeNeo4jDriver(latency=latency, rowLatency=rowLatency, conflictRate=conflictRate, memoryLimitRows=memoryLimitRows, seed=seed)
+    metrics = SyncMetrics()
+    batchSizer = BatchSizeController(initialSize=chunkSize, targetLatency=targetLatency, minSize=10) if targetLatency else None
+    handler = RecordingNeo4jHandler(
+        driver=driver,
+        neo4jParameters=dict(sync.neo4jHandlerParams(), chunkSize=chunkSize, writers=writers, maxRetries=maxRetries, retryBackoff=0.01,
+                             writeStrategy=writeStrategy),
+        uri=None,
+        user=None,
+        password=None,
+        logger=logger,
+        metrics=metrics,
+        batchSizer=batchSizer,
+    )
+
+    start = time.perf_counter()
+    success = handler.dataPush(iter(dyads))
+    seconds = time.perf_counter() - start
+    nodes = {(handler.resolveLabel(dyad[f'{end}Type']), dyad[f'{end}Props']['name']) for dyad in dyads for end in ('from', 'to')}
+    relationships = {(dyad['fromType'], dyad['fromProps']['name'], dyad['edgeType'], dyad['toType'], dyad['toProps']['name']) for dyad in dyads}
+    summary = metrics.summary()
+    return {
+        'scenario': {'documents': documents, 'dyads': len(dyads), 'writers': writers, 'chunkSize': chunkSize, 'maxRetries': maxRetries,
+                     'latency': latency, 'rowLatency': rowLatency, 'conflictRate': conflictRate, 'memoryLimitRows': memoryLimitRows,
+                     'targetLatency': targetLatency, 'writeStrategy': writeStrategy, 'seed': seed},
+        'success': success,
+        'seconds': seconds,
+        'rowsPerSecond': len(dyads) / seconds,
+        'retries': summary['counters'].get('retries_total', 0),
+        'push': summary['stages'].get('push'),
+        'driver': dict(driver.stats),
+        'batchSizes': {shape: state['size'] for shape, state in batchSizer.stats().items()} if batchSizer is not None else None,
+        'correct': driver.nodeCount() == len(nodes) and driver.relationshipCount() == len(relationships),
+    }
+
+
+def compareResults(baseline: Dict[str, Any], current: Dict[str, Any]) -> Dict[str, float]:
+    """
+    Returns the ratios of the current end-to-end results over a baseline, e.g. a docsPerSecond below 1 is a
+    regression and a peakRssMegabytes above 1 is one too.
+    """
+    return {key: current[key] / baseline[key] for key in ('docsPerSecond', 'rowsPerSecond', 'peakRssMegabytes') if baseline.get(key)}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Micro-benchmarks of the Elasticsearch to Neo4j synchronizer.')
+    parser.add_argument('--documents', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--response', help='A recorded search response body to decode instead of a synthetic one')
+    parser.add_argument('--hits', type=int, default=5000, help='The number of hits of the synthetic response')
+    parser.add_argument('--embeddingDims', type=int, default=0, help='The length of an unmapped embedding vector per synthetic hit')
+    parser.add_argument('--endToEnd', action='store_true', help='Sync --hits synthetic hits end to end instead of running the micro-benchmarks')
+    parser.add_argument('--writes', action='store_true', help='Push the dyads of --documents synthetic documents into a fake Neo4j driver')
+    parser.add_argument('--names', type=int, default=None, help='The distinct names per entity field of --writes, a tenth of --documents by default')
+    parser.add_argument('--writers', type=int, default=1, help='The concurrent Neo4j writers of --writes')
+    parser.add_argument('--chunkSize', type=int, default=1000, help='The rows per Neo4j batch of --writes')
+    parser.add_argument('--maxRetries', type=int, default=5)
+    parser.add_argument('--latency', type=float, default=0.001, help='The simulated Neo4j round trip seconds of --writes')
+    parser.add_argument('--rowLatency', type=float, default=0.0, help='The simulated Neo4j seconds per row of --writes')
+    parser.add_argument('--memoryLimitRows', type=int, default=None, help='The rows a simulated Neo4j transaction can write before running out of memory')
+    parser.add_argument('--targetLatency', type=float, default=None, help='Adapt the batch size of --writes to this commit latency')
+    parser.add_argument('--writeStrategy', choices=['dyad', 'twoPhase'], default='dyad', help='The Neo4j write strategy of --writes')
+    parser.add_argument('--conflictRate', type=float, default=0.0, help='The probability of a simulated lock conflict per statement')
+    parser.add_argument('--pageSize', type=int, default=1000)
+    parser.add_argument('--fanOut', type=int, nargs=2, default=(1, 4), metavar=('MIN', 'MAX'), help='The related persons and organizations per document')
+    parser.add_argument('--scores', choices=sorted(SCORE_DISTRIBUTIONS), default='uniform')
+    parser.add_argument('--runner', choices=['startProcess', 'startPipelinedProcess'], default='startProcess')
+    parser.add_argument('--workers', type=int, default=1, help='The number of transform processes')
+    parser.add_argument('--decoder', choices=['fast', 'lazy', 'default'])
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='Saves the results as JSON')
+    parser.add_argument('--baseline', help='Compares the end-to-end results with a saved JSON result')
+    args = parser.parse_args()
+
+    if args.writes:
+        results = benchmarkWrites(args.documents, names=args.names, fanOut=tuple(args.fanOut), writers=args.writers, chunkSize=args.chunkSize, maxRetries=args.maxRetries,
+                                  latency=args.latency, rowLatency=args.rowLatency, conflictRate=args.conflictRate,
+                                  memoryLimitRows=args.memoryLimitRows, targetLatency=args.targetLatency,
+                                  writeStrategy=args.writeStrategy, seed=args.seed)
+        print(json.dumps(results, indent=2))
+        sys.exit(0 if results['success'] and results['correct'] else 1)
+
+    if args.endToEnd:
+        results = benchmarkEndToEnd(args.hits, pageSize=args.pageSize, fanOut=tuple(args.fanOut), scores=args.scores,
+                                    runner=args.runner, workers=args.workers, seed=args.seed, decoder=args.decoder)
+        results['environment'] = environment()
+        if args.baseline:
+            with open(args.baseline) as baselineFile:
+                results['comparison'] = compareResults(json.load(baselineFile), results)
+        if args.output:
+            with open(args.output, 'w') as outputFile:
+                json.dump(results, outputFile, indent=2)
+        print(json.dumps(results, indent=2))
+        sys.exit(0 if results['success'] else 1)
+
+    sync = ElasticsearchToNeo4jSync()
+    docs = syntheticDocuments(args.documents)
+    results = {
+        'mapping': benchmarkMapping(sync, docs, repeat=args.repeat),
+        'thresholds': benchmarkThresholds(sync, docs, repeat=args.repeat),
+    }
+    if args.response:
+        with open(args.response, 'rb') as responseFile:
+            response = responseFile.read()
+    else:
+        response = syntheticResponse(args.hits, embeddingDims=args.embeddingDims)
+    results['decoding'] = benchmarkDecoding(sync, response, repeat=args.repeat)
+    print(json.dumps(results, indent=2))
@@ -0,0 +1,97 @@
+from queue import Queue, Full, Empty
+from threading import Thread, Event
+from typing import Any, Callable, Iterable, Iterator, Optional
+
+
+class BoundedStage():
+    def __init__(self, source: Iterable[Any], transform: Optional[Callable[[Any], Any]] = None, maxsize: int = 4, name: str = 'stage') -> None:
+        """
+        Runs one stage of a pipeline on its own thread. The thread consumes the source, applies the transform to
+        every item and hands the results to the consumer through a bounded queue, so a slow consumer blocks the
+        stage (and, transitively, every stage upstream of it) instead of letting items pile up in memory.
+
+        Parameters
+        ----------
+        source : iterable
+            The items consumed by the stage, typically the output of the previous stage.
+        transform : callable or None
+            The function applied to every item. Items are passed through unchanged when None.
+        maxsize : int
+            The maximum number of results buffered between the stage and its consumer. Defaults to 4.
+        name : str
+            The name of the stage thread.
+        """
+        self.source = source
+        self.transform = transform
+        self.queue = Queue(maxsize=maxsize)
+        self.stopped = Event()
+        self.done = object()
+        self.thread = Thread(target=self.run, name=name, daemon=True)
+        self.thread.start()
+
+    def put(self, item: Any) -> bool:
+        """
+        Blocks until the item fits in the queue or the stage is closed.
+
+        Parameters
+        ----------
+        item : any
+            The result, exception or end marker to hand to the consumer.
+
+        Returns
+        -------
+        bool
+            False when the stage was closed before the item could be queued.
+        """
+        while not self.stopped.is_set():
+            try:
+                self.queue.put(item, timeout=0.1)
+                return True
+            except Full:
+                continue
+        return False
+
+    def run(self) -> None:
+        """
+        The stage thread: drains the source into the queue, forwarding the first exception to the consumer.
+        """
+        try:
+            for item in self.source:
+                if not self.put(self.transform(item) if self.transform else item):
+                    return
+        except Exception as e:
+            self.put(e)
+        finally:
+            self.put(self.done)
+
+    def depth(self) -> int:
+        """
+        Returns the number of results currently buffered by the stage.
+        """
+        return self.queue.qsize()
+
+    def close(self) -> None:
+        """
+        Stops the stage thread and, if the source is a stage or generator, closes it too.
+        """
+        self.stopped.set()
+        try:
+            while True:
+                self.queue.get_nowait()
+        except Empty:
+            pass
+        self.thread.join()
+        if hasattr(self.source, 'close'):
+            self.source.close()
+
+    def __iter__(self) -> Iterator[Any]:
+        try:
+            while True:
+                item = self.queue.get()
+                if item is self.done:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            self.close()
@@ -0,0 +1,106 @@
+import json
+import time
+import sqlite3
+import hashlib
+from threading import Lock
+from typing import Any, Dict, Optional
+
+
+class CheckpointStore():
+    def __init__(self, path: str) -> None:
+        """
+        Persists the high-water mark of every incremental sync in a local SQLite database, keyed by index and query,
+        so a sync can resume from the last batch it committed to Neo4j.
+
+        Parameters
+        ----------
+        path : str
+            The path of the SQLite database file. ':memory:' keeps the checkpoints for the lifetime of the store only.
+        """
+        self.path = path
+        self.lock = Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        with self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS checkpoints ("
+                "key TEXT PRIMARY KEY, idx TEXT NOT NULL, query TEXT NOT NULL, watermark TEXT NOT NULL, updated REAL NOT NULL)"
+            )
+
+    @staticmethod
+    def key(index: str, query: Dict[str, Any]) -> str:
+        """
+        Returns the checkpoint key of a query on an index. Queries are normalized so key order does not matter.
+
+        Parameters
+        ----------
+        index : str
+            The name of the Elasticsearch index.
+        query : dict
+            The Elasticsearch query, without the watermark range.
+
+        Returns
+        -------
+        key : str
+            The checkpoint key.
+        """
+        normalized = json.dumps(query, sort_keys=True, separators=(',', ':'), default=str)
+        return f"{index}:{hashlib.sha256(normalized.encode()).hexdigest()}"
+
+    def load(self, index: str, query: Dict[str, Any]) -> Optional[Any]:
+        """
+        Returns the last committed watermark of a query, or None when the query never committed a batch.
+
+        Parameters
+        ----------
+        index : str
+            The name of the Elasticsearch index.
+        query : dict
+            The Elasticsearch query, without the watermark range.
+
+        Returns
+        -------
+        watermark : any or None
+            The watermark value.
+        """
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT watermark FROM checkpoints WHERE key = ?", (self.key(index, query),)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save(self, index: str, query: Dict[str, Any], watermark: Any) -> None:
+        """
+        Records the watermark of the last batch committed for a query.
+
+        Parameters
+        ----------
+        index : str
+            The name of the Elasticsearch index.
+        query : dict
+            The Elasticsearch query, without the watermark range.
+        watermark : any
+            A JSON serializable watermark value.
+        """
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT INTO checkpoints (key, idx, query, watermark, updated) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET watermark = excluded.watermark, updated = excluded.updated",
+                (self.key(index, query), index, json.dumps(query, sort_keys=True, default=str), json.dumps(watermark), time.time()),
+            )
+
+    def clear(self, index: str, query: Dict[str, Any]) -> None:
+        """
+        Removes the checkpoint of a query so its next incremental sync starts from scratch.
+
+        Parameters
+        ----------
+        index : str
+            The name of the Elasticsearch index.
+        query : dict
+            The Elasticsearch query, without the watermark range.
+        """
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM checkpoints WHERE key = ?", (self.key(index, query),))
+
+    def close(self) -> None:
+        self.connection.close()
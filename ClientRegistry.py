@@ -0,0 +1,112 @@
+import atexit
+import logging
+from threading import Lock
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class ClientRegistry():
+    def __init__(self, elasticsearchParams: Optional[Dict[str, Any]] = None, neo4jParams: Optional[Dict[str, Any]] = None) -> None:
+        """
+        Keeps one Elasticsearch client and one Neo4j driver per connection configuration for the lifetime of the
+        process, so consecutive cloud events reuse the same connection pools instead of opening new ones.
+
+        The registry only holds synchronous clients. Async clients are bound to the event loop that first uses them
+        and are created and closed by their handlers instead.
+
+        Parameters
+        ----------
+        elasticsearchParams : dict or None
+            Pool settings passed to every Elasticsearch client, e.g. connections_per_node or http_compress.
+        neo4jParams : dict or None
+            Pool settings passed to every Neo4j driver, e.g. max_connection_pool_size, max_connection_lifetime,
+            connection_acquisition_timeout or keep_alive.
+        """
+        self.elasticsearchParams = elasticsearchParams or {}
+        self.neo4jParams = neo4jParams or {}
+        self.clients: Dict[str, Any] = {}
+        self.lock = Lock()
+
+    def get(self, key: str, factory: Callable[[], Any]) -> Any:
+        """
+        Returns the client registered under the key, creating it with the factory on first use.
+
+        Parameters
+        ----------
+        key : str
+            The connection configuration the client was created with.
+        factory : callable
+            Creates the client when none is registered under the key.
+
+        Returns
+        -------
+        client : any
+            The shared client.
+        """
+        with self.lock:
+            if key not in self.clients:
+                self.clients[key] = factory()
+            return self.clients[key]
+
+    def elasticsearchClient(self, factory: Callable[..., Any], **clientParams) -> Any:
+        """
+        Returns the shared Elasticsearch client for the given connection parameters.
+
+        Parameters
+        ----------
+        factory : callable
+            The handler's createClient method.
+        clientParams : dict
+            The connection parameters of the client.
+
+        Returns
+        -------
+        client : Elasticsearch
+            The shared Elasticsearch client.
+        """
+        clientParams = {**self.elasticsearchParams, **clientParams}
+        key = f"elasticsearch:{sorted(clientParams.items(), key=str)}"
+        return self.get(key, lambda: factory(**clientParams))
+
+    def neo4jDriver(self, factory: Callable[..., Any], uri: str, user: str, password: str) -> Any:
+        """
+        Returns the shared Neo4j driver for the given connection parameters.
+
+        Parameters
+        ----------
+        factory : callable
+            The handler's createDriver method.
+        uri : str
+            The URI of the Neo4j database.
+        user : str
+            The username to use when connecting to the Neo4j database.
+        password : str
+            The password to use when connecting to the Neo4j database.
+
+        Returns
+        -------
+        driver : neo4j.Driver
+            The shared Neo4j driver.
+        """
+        key = f"neo4j:{uri}:{user}:{password}:{sorted(self.neo4jParams.items(), key=str)}"
+        return self.get(key, lambda: factory(uri=uri, user=user, password=password, **self.neo4jParams))
+
+    def close(self) -> None:
+        """
+        Closes every registered client. The registry can be reused afterwards and will create new clients.
+        """
+        with self.lock:
+            clients, self.clients = self.clients, {}
+        for key, client in clients.items():
+            try:
+                client.close()
+            except Exception as e:
+                logger.warning(f"Failed to close {key.split(':')[0]} client: {e}")
+
+
+clientRegistry = ClientRegistry(
+    elasticsearchParams={'connections_per_node': 10},
+    neo4jParams={'max_connection_pool_size': 50, 'keep_alive': True},
+)
+atexit.register(clientRegistry.close)
@@ -0,0 +1,262 @@
+import logging
+import operator
+from itertools import compress
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
+from MappingPlan import MappingPlan
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+logger = logging.getLogger(__name__)
+
+CONDITIONS = {
+    '>=': operator.ge,
+    '>': operator.gt,
+    '<=': operator.le,
+    '<': operator.lt,
+    '==': operator.eq,
+}
+
+# the Elasticsearch range operators of the conditions that can be evaluated server-side
+RANGE_OPERATORS = {
+    '>=': 'gte',
+    '>': 'gt',
+    '<=': 'lte',
+    '<': 'lt',
+}
+
+
+class ThresholdFilter():
+    """
+    One compiled entry of params['parse']. The condition is either an operator name of CONDITIONS, comparing the
+    score of an entity with its threshold, or a callable taking (threshold, entity) as before. Operator names pickle,
+    so filters built from them can be shipped to worker processes.
+    """
+    __slots__ = ('args', 'condition', 'scoreKey')
+
+    def __init__(self, args: Tuple[Tuple[str, Any], ...], condition: Union[str, Callable[[Any, Dict], bool]], scoreKey: str = 'score') -> None:
+        if isinstance(condition, str) and condition not in CONDITIONS:
+            raise ValueError(f"Unknown threshold condition {condition!r}, expected a callable or one of {list(CONDITIONS)}")
+        self.args = args
+        self.condition = condition
+        self.scoreKey = scoreKey
+
+    def __getstate__(self):
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+    def __setstate__(self, state):
+        for slot, value in state.items():
+            setattr(self, slot, value)
+
+    @classmethod
+    def compile(cls, parseParams: Dict[str, Dict[str, Any]]) -> Tuple['ThresholdFilter', ...]:
+        """
+        Compiles params['parse'] into one filter per entry.
+
+        Parameters
+        ----------
+        parseParams : dict
+            The parse parameters, e.g. {'thresholds': {'args': {'vendor': 0.9}, 'condition': '>='}}.
+
+        Returns
+        -------
+        tuple
+            The compiled filters.
+        """
+        return tuple(
+            cls(tuple(parseVal['args'].items()), parseVal.get('condition', '>='), parseVal.get('scoreKey', 'score'))
+            for parseVal in parseParams.values()
+        )
+
+    def rangeQuery(self, argKey: str) -> Optional[Dict[str, Any]]:
+        """
+        Returns the Elasticsearch range query selecting the entities of a field that meet their threshold, or None
+        when the field is not thresholded or the condition is a callable that can only be evaluated client-side.
+
+        Parameters
+        ----------
+        argKey : str
+            The entity field, e.g. 'vendor'.
+
+        Returns
+        -------
+        dict or None
+            The range query on the score of the nested entities.
+        """
+        if not isinstance(self.condition, str) or self.condition not in RANGE_OPERATORS:
+            return None
+        for key, argValue in self.args:
+            if key == argKey:
+                return {'range': {f"{argKey}.{self.scoreKey}": {RANGE_OPERATORS[self.condition]: argValue}}}
+        return None
+
+    def apply(self, doc: Dict[str, List[Dict[str, Any]]]) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Drops the entities of a document that do not meet their threshold, in place.
+
+        Parameters
+        ----------
+        doc : dict
+            A dictionary containing a document to be parsed.
+
+        Returns
+        -------
+        dict
+            The parsed document.
+        """
+        if isinstance(self.condition, str):
+            compare = CONDITIONS[self.condition]
+            scoreKey = self.scoreKey
+            for argKey, argValue in self.args:
+                if argKey in doc:
+                    doc[argKey] = [entity for entity in doc[argKey] if compare(entity.get(scoreKey, 0), argValue)]
+        else:
+            for argKey, argValue in self.args:
+                if argKey in doc:
+                    doc[argKey] = [entity for entity in doc[argKey] if self.condition(argValue, entity)]
+        return doc
+
+    def applyBatch(self, docs: List[Dict[str, List[Dict[str, Any]]]], vectorized: bool = True) -> List[Dict[str, List[Dict[str, Any]]]]:
+        """
+        Drops the entities of a batch of documents that do not meet their threshold, in place. With an operator
+        condition and NumPy installed, the scores of every thresholded field of the batch are flattened into one
+        array and compared with their thresholds in a single vectorized pass; otherwise every document is filtered
+        on its own.
+
+        Parameters
+        ----------
+        docs : list
+            The documents to be parsed, e.g. the documents of a page of hits.
+        vectorized : bool
+            Whether to use the vectorized pass when possible. Defaults to True.
+
+        Returns
+        -------
+        list
+            The parsed documents.
+        """
+        if not vectorized or np is None or not isinstance(self.condition, str):
+            for doc in docs:
+                self.apply(doc)
+            return docs
+
+        scoreKey = self.scoreKey
+        columns = [(argKey, [doc.get(argKey) or () for doc in docs]) for argKey, _ in self.args]
+        entityLists = [entities for _, fieldLists in columns for entities in fieldLists]
+        entities = [entity for entityList in entityLists for entity in entityList]
+        if not entities:
+            return docs
+
+        counts = np.fromiter(map(len, entityLists), dtype=np.intp, count=len(entityLists))
+        thresholds = np.repeat(np.repeat(np.asarray([argValue for _, argValue in self.args], dtype=float), len(docs)), counts)
+        scores = np.asarray([entity.get(scoreKey, 0) for entity in entities], dtype=float)
+        keep = CONDITIONS[self.condition](scores, thresholds)
+
+        # the kept entities stay in field then document order, so every entity list is a slice of them
+        kept = list(compress(entities, keep.tolist()))
+        bounds = np.concatenate(([0], np.cumsum(keep)))[np.concatenate(([0], np.cumsum(counts)))].tolist()
+        for idx, (argKey, fieldLists) in enumerate(columns):
+            offset = idx * len(docs)
+            for doc, entityList, start, end in zip(docs, fieldLists, bounds[offset:], bounds[offset + 1:]):
+                if entityList:
+                    doc[argKey] = kept[start:end]
+        return docs
+
+
+class DocumentTransform():
+    """
+    Everything needed to turn hits into dyads: the extracted fields, the threshold filters and the mapping plan. It is
+    built once per synchronizer and sent once to every worker process of the parallel transform.
+    """
+    __slots__ = ('entityKeys', 'filters', 'plan', 'vectorized')
+
+    def __init__(self, entityKeys: Iterable[str], filters: Tuple[ThresholdFilter, ...], plan: MappingPlan, vectorized: bool = False) -> None:
+        self.entityKeys = tuple(entityKeys)
+        self.filters = filters
+        self.plan = plan
+        self.vectorized = vectorized
+
+    def __getstate__(self):
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+    def __setstate__(self, state):
+        for slot, value in state.items():
+            setattr(self, slot, value)
+
+    def extract(self, hit: Dict[str, Any]) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Extracts the entity fields of a hit. Fields thresholded server-side are read from the inner hits of the same
+        name, which only hold the entities that met their threshold.
+        """
+        source = hit.get('_source', {})
+        doc = {entityKey: list(source[entityKey]) for entityKey in self.entityKeys if entityKey in source}
+        innerHits = hit.get('inner_hits')
+        if innerHits:
+            for entityKey in self.entityKeys:
+                if entityKey in innerHits:
+                    doc[entityKey] = [innerHit['_source'] for innerHit in innerHits[entityKey]['hits']['hits']]
+        return doc
+
+    def parse(self, doc: Dict[str, List[Dict[str, Any]]]) -> Dict[str, List[Dict[str, Any]]]:
+        for thresholdFilter in self.filters:
+            thresholdFilter.apply(doc)
+        return doc
+
+    def filterDocuments(self, hits: List[Dict[str, Any]]) -> List[Dict[str, List[Dict[str, Any]]]]:
+        docs = [self.extract(hit) for hit in hits]
+        for thresholdFilter in self.filters:
+            thresholdFilter.applyBatch(docs, vectorized=self.vectorized)
+        return docs
+
+    def documents(self, hits: List[Dict[str, Any]]) -> List[Dict[str, List[Dict[str, Any]]]]:
+        """
+        Extracts and parses a chunk of hits, filtering the whole chunk at once. When the chunk fails, its hits are
+        transformed one by one and the malformed ones are logged and skipped, so they do not drop the whole chunk.
+        """
+        try:
+            return self.filterDocuments(hits)
+        except Exception:
+            docs = []
+            for hit in hits:
+                try:
+                    docs.extend(self.filterDocuments([hit]))
+                except Exception as e:
+                    logger.error(f"Skipping hit {hit.get('_id') if isinstance(hit, dict) else hit} that failed to transform: {e}")
+            return docs
+
+    def expand(self, docs: List[Dict[str, List[Dict[str, Any]]]]) -> List[Dict[str, Any]]:
+        """
+        Fans parsed documents out into dyads, logging and skipping the documents that fail to map.
+        """
+        queriesParams = []
+        for doc in docs:
+            try:
+                queriesParams.extend(self.plan.expand(doc))
+            except Exception as e:
+                logger.error(f"Skipping document that failed to map to dyads: {e}")
+        return queriesParams
+
+    def dyads(self, hits: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Extracts, parses and fans out a chunk of hits into dyads.
+        """
+        return self.expand(self.documents(hits))
+
+
+# the transform of the current worker process, set once by initWorker
+workerTransform = None
+
+
+def initWorker(transform: DocumentTransform) -> None:
+    global workerTransform
+    workerTransform = transform
+
+
+def documentsChunk(hits: List[Dict[str, Any]]) -> List[Dict[str, List[Dict[str, Any]]]]:
+    return workerTransform.documents(hits)
+
+
+def dyadsChunk(hits: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return workerTransform.dyads(hits)
@@ -0,0 +1,147 @@
+import json
+import sqlite3
+import hashlib
+from threading import Lock
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional, Set
+
+
+class DyadCache():
+    def __init__(self, maxsize: int = 100000, path: Optional[str] = None) -> None:
+        """
+        Remembers the content hash of every dyad committed to Neo4j, so unchanged dyads can be skipped instead of
+        being merged again. Hashes live in a bounded in-memory LRU and, when a path is given, in a SQLite database
+        that outlives the process and backs the LRU on misses.
+
+        Parameters
+        ----------
+        maxsize : int
+            The maximum number of hashes kept in memory. Defaults to 100000.
+        path : str or None
+            The path of the SQLite database file, or None to keep the hashes in memory only.
+        """
+        self.maxsize = maxsize
+        self.committed: OrderedDict = OrderedDict()
+        self.pending: Set[str] = set()
+        self.lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.connection = None
+        if path:
+            self.connection = sqlite3.connect(path, check_same_thread=False)
+            with self.connection:
+                self.connection.execute("CREATE TABLE IF NOT EXISTS dyads (hash TEXT PRIMARY KEY)")
+
+    @staticmethod
+    def hash(queryParams: Dict[str, Any]) -> str:
+        """
+        Returns the content hash of a dyad. Node types are case-insensitive and property order does not matter.
+
+        Parameters
+        ----------
+        queryParams : dict
+            A dyad produced by ElasticsearchToNeo4jSync.buildGraphData.
+
+        Returns
+        -------
+        hash : str
+            The hex digest of the normalized dyad.
+        """
+        normalized = json.dumps([
+            str(queryParams.get('fromType', '')).lower(), queryParams.get('fromProps') or {},
+            queryParams.get('edgeType', ''), queryParams.get('edgeProps') or {},
+            str(queryParams.get('toType', '')).lower(), queryParams.get('toProps') or {},
+        ], sort_keys=True, separators=(',', ':'), default=str)
+        return hashlib.blake2b(normalized.encode(), digest_size=16).hexdigest()
+
+    def remember(self, dyadHash: str) -> None:
+        # must be called with the lock held
+        self.committed[dyadHash] = None
+        self.committed.move_to_end(dyadHash)
+        if len(self.committed) > self.maxsize:
+            self.committed.popitem(last=False)
+
+    def isCommitted(self, dyadHash: str) -> bool:
+        # must be called with the lock held
+        if dyadHash in self.committed:
+            self.committed.move_to_end(dyadHash)
+            return True
+        if self.connection is not None:
+            if self.connection.execute("SELECT 1 FROM dyads WHERE hash = ?", (dyadHash,)).fetchone():
+                self.remember(dyadHash)
+                return True
+        return False
+
+    def claim(self, dyadHash: str) -> bool:
+        """
+        Claims a dyad for writing. A dyad that was already committed, or that is already being written in this run,
+        is a hit and must be skipped.
+
+        Parameters
+        ----------
+        dyadHash : str
+            The hash returned by DyadCache.hash.
+
+        Returns
+        -------
+        bool
+            True when the dyad is new and must be written.
+        """
+        with self.lock:
+            if dyadHash in self.pending or self.isCommitted(dyadHash):
+                self.hits += 1
+                return False
+            self.misses += 1
+            self.pending.add(dyadHash)
+            return True
+
+    def commit(self, dyadHashes: Iterable[str]) -> None:
+        """
+        Records claimed dyads as committed once their batch was committed to Neo4j.
+
+        Parameters
+        ----------
+        dyadHashes : iterable of str
+            The hashes of the committed dyads.
+        """
+        dyadHashes = list(dyadHashes)
+        with self.lock:
+            for dyadHash in dyadHashes:
+                self.pending.discard(dyadHash)
+                self.remember(dyadHash)
+            if self.connection is not None:
+                with self.connection:
+                    self.connection.executemany("INSERT OR IGNORE INTO dyads (hash) VALUES (?)", ((dyadHash,) for dyadHash in dyadHashes))
+
+    def release(self, dyadHashes: Iterable[str]) -> None:
+        """
+        Releases claimed dyads whose batch failed, so a later run writes them again.
+
+        Parameters
+        ----------
+        dyadHashes : iterable of str
+            The hashes of the failed dyads.
+        """
+        with self.lock:
+            self.pending.difference_update(dyadHashes)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Returns the hit and miss counters of the cache.
+
+        Returns
+        -------
+        dict
+            The hits, misses, hit rate and number of hashes held in memory.
+        """
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hitRate': self.hits / lookups if lookups else 0.0,
+            'size': len(self.committed),
+        }
+
+    def close(self) -> None:
+        if self.connection is not None:
+            self.connection.close()
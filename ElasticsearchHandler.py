@@ -1,8 +1,10 @@
 from logging import Logger
-from typing import Union, List, Dict
+from typing import Union, List, Dict, Generator, Optional
+from queue import Queue, Full
+from threading import Thread, Event
 from elasticsearch import Elasticsearch
+from SyncMetrics import stageTimer
 
-#TODO: ADD SCROLLING IN ESREQ
 class ElasticsearchHandler:
     def __init__(self, 
                 hosts: Union[str, List[str]], 
@@ -11,7 +13,12 @@ class ElasticsearchHandler:
                 caCerts: str, 
                 caFingerprint:str, 
                 index: str, 
-                logger: Logger):
+                logger: Logger,
+                clientRegistry=None,
+                serializer=None,
+                resultCache=None,
+                invalidateOnRefresh: bool = False,
+                metrics=None):
             """
             Constructor method creates an Elasticsearch client instance.
 
@@ -31,32 +38,136 @@ class ElasticsearchHandler:
                 The name of the Elasticsearch index to search.
             logger: Logger
                 The logging object to use for error reporting.
+            clientRegistry: ClientRegistry or None
+                When given, the client is shared through the registry instead of being created for this handler.
+            serializer: Serializer or None
+                The JSON serializer of the transport, e.g. a FastJsonSerializer. Defaults to the client's serializer.
+            resultCache: QueryResultCache or None
+                When given, dataFetch answers repeated searches from the cache.
+            invalidateOnRefresh: bool
+                Whether cached responses are dropped once the index was refreshed. Costs an index stats request per
+                dataFetch, which is much cheaper than a fuzzy search. Defaults to False.
+            metrics: SyncMetrics or None
+                When given, the latency of every search, the fetched hits and the failed searches are recorded.
             """
             self.index = index
             self.logger = logger
             self.client = None  # initialize the Elasticsearch client instance to None
+            self.ownsClient = clientRegistry is None
+            self.resultCache = resultCache
+            self.invalidateOnRefresh = invalidateOnRefresh
+            self.metrics = metrics
             
             try:
                 # ElasticSearch Connection
-                self.client = Elasticsearch(
+                clientParams = dict(
                     hosts=hosts or ['localhost:9200'],
                     http_auth=(username, password),
                     ca_certs=caCerts,
                     ssl_assert_fingerprint=caFingerprint,
                     verify_certs=bool(caCerts or caFingerprint)
                 )
+                if serializer is not None:
+                    clientParams['serializer'] = serializer
+                if clientRegistry is not None:
+                    self.client = clientRegistry.elasticsearchClient(self.createClient, **clientParams)
+                else:
+                    self.client = self.createClient(**clientParams)
                 self.es = self.client
             except Exception as e:
                 self.logger.error(f"Failed to connect to Elasticsearch: {e}")
 
-    def dataFetch(self, query: dict) -> dict:
+    def createClient(self, **clientParams) -> Elasticsearch:
+        """
+        Creates the Elasticsearch client used by the handler.
+
+        Parameters
+        ----------
+        clientParams : dict
+            The keyword arguments passed to the client constructor.
+
+        Returns
+        -------
+        client : Elasticsearch
+            The Elasticsearch client.
+        """
+        return Elasticsearch(**clientParams)
+
+    def refreshGeneration(self) -> Optional[int]:
+        """
+        Returns the number of refreshes of self.index, which changes whenever new writes become searchable.
+
+        Returns
+        -------
+        generation : int or None
+            The refresh count, or None when it could not be read.
+        """
+        try:
+            return self.client.indices.stats(index=self.index, metric='refresh')['_all']['total']['refresh']['total']
+        except Exception as e:
+            self.logger.warning(f"Failed to read the refresh count of {self.index}, bypassing the result cache: {e}")
+            return None
+
+    def countHits(self, hits: List[Dict]) -> None:
+        """
+        Adds the hits of a page to the hits_total counter of the metrics.
+
+        Parameters
+        ----------
+        hits : list
+            The hits of a single page.
+        """
+        if self.metrics is not None:
+            self.metrics.increment('hits_total', len(hits))
+
+    def countResponse(self, response: dict) -> None:
+        """
+        Adds the hits of a search response to the hits_total counter of the metrics.
+
+        Parameters
+        ----------
+        response : dict
+            A search response of Elasticsearch.
+        """
+        if self.metrics is not None:
+            self.countHits(response['hits']['hits'])
+
+    def countError(self, stage: str) -> None:
+        """
+        Increments the errors_total counter of the metrics for a failed request.
+
+        Parameters
+        ----------
+        stage : str
+            The stage the request belongs to, e.g. 'fetch'.
+        """
+        if self.metrics is not None:
+            self.metrics.increment('errors_total', stage=stage)
+
+    def streamQuery(self, query: Optional[dict]) -> dict:
+        """
+        Returns the query a stream searches with. An empty query matches every document, whereas a missing query,
+        e.g. one the query builder failed to build, is an error rather than a request for the whole index.
+        """
+        if query is None:
+            error = f"No query was given to stream {self.index}"
+            self.logger.error(error)
+            raise Exception(error)
+        return query or {'match_all': {}}
+
+    def dataFetch(self, query: dict, source: Optional[Union[bool, List[str]]] = None, size: Optional[int] = None) -> dict:
         """
         This function takes the Elasticsearch query generated in queryBuilder and retrieves the data from the Elasticsearch index.
+        With a result cache, a search repeated within the cache's time to live is answered from the cache.
 
         Parameters
         ----------
         query : dict
             A dictionary containing the Elasticsearch query parameters.
+        source : bool, list or None
+            The _source filtering of the hits, e.g. a list of the fields to return. Defaults to the whole _source.
+        size : int or None
+            The number of hits to return. Defaults to the Elasticsearch default of 10.
 
         Returns
         -------
@@ -65,10 +176,375 @@ class ElasticsearchHandler:
         error : str or None
             A string containing the error message, if any. Otherwise, returns None.
         """
+        cacheKey, generation = None, None
+        if self.resultCache is not None:
+            generation = self.refreshGeneration() if self.invalidateOnRefresh else None
+            if generation is not None or not self.invalidateOnRefresh:
+                cacheKey = self.resultCache.key(self.index, query, source=source, size=size)
+                cached = self.resultCache.get(cacheKey, generation)
+                if cached is not None:
+                    return cached
+        try:
+            with stageTimer(self.metrics, 'fetch'):
+                dataFetchResponse = self.client.search(index=self.index, query=query, source=source, size=size)
+        except Exception as e:
+            error = f"Failed to retrieve data from Elasticsearch: {e}"
+            self.logger.error(error)
+            self.countError('fetch')
+            raise Exception(error)
+        self.countResponse(dataFetchResponse)
+        if cacheKey is not None:
+            self.resultCache.put(cacheKey, dataFetchResponse, generation)
+        return dataFetchResponse
+
+    def multiFetch(self, queries: List[dict], source: Optional[Union[bool, List[str]]] = None, size: Optional[int] = None, maxConcurrentSearches: Optional[int] = None) -> List[dict]:
+        """
+        This function runs many searches in a single _msearch round trip. With a result cache, cached searches are
+        answered from the cache and repeated searches of the batch are sent once.
+
+        Parameters
+        ----------
+        queries : list of dict
+            The Elasticsearch queries.
+        source : bool, list or None
+            The _source filtering of the hits, e.g. a list of the fields to return. Defaults to the whole _source.
+        size : int or None
+            The number of hits to return per search. Defaults to the Elasticsearch default of 10.
+        maxConcurrentSearches : int or None
+            The number of searches Elasticsearch runs concurrently. Defaults to the cluster default.
+
+        Returns
+        -------
+        responses : list of dict
+            The search response of every query, in query order. A failed search yields its error response, a
+            dictionary with an 'error' key, without failing the other searches. A missing query, e.g. one the query
+            builder failed to build, is not sent and yields an error response too.
+        """
+        generation = None
+        if self.resultCache is not None and self.invalidateOnRefresh:
+            generation = self.refreshGeneration()
+        cacheKeys, responses = self.cachedResponses(queries, source, size, generation)
+        pending = self.pendingSearches(cacheKeys, responses)
+        if pending:
+            try:
+                with stageTimer(self.metrics, 'fetch'):
+                    fetched = self.client.msearch(index=self.index, searches=self.multiSearchBody(queries, pending, source, size), max_concurrent_searches=maxConcurrentSearches)['responses']
+            except Exception as e:
+                error = f"Failed to retrieve data from Elasticsearch: {e}"
+                self.logger.error(error)
+                self.countError('fetch')
+                raise Exception(error)
+            self.routeResponses(pending, fetched, cacheKeys, responses, generation)
+        return responses
+
+    def cachedResponses(self, queries: List[dict], source, size, generation) -> tuple:
+        """
+        Looks the queries up in the result cache. Returns the cache key and cached response of every query, both
+        None when the query is not cacheable or not cached. Missing queries are answered with an error response
+        instead, so they are never sent as a search of the whole index.
+        """
+        cacheKeys, responses = [None] * len(queries), [None] * len(queries)
+        for idx, query in enumerate(queries):
+            if query is None:
+                self.logger.error(f"No query was given for search {idx} of the batch, skipping it")
+                responses[idx] = {'error': {'type': 'missing_query', 'reason': 'No query was given'}, 'status': 400}
+        if self.resultCache is None or (self.invalidateOnRefresh and generation is None):
+            return cacheKeys, responses
+        for idx, query in enumerate(queries):
+            if responses[idx] is not None:
+                continue
+            cacheKeys[idx] = self.resultCache.key(self.index, query, source=source, size=size)
+            responses[idx] = self.resultCache.get(cacheKeys[idx], generation)
+        return cacheKeys, responses
+
+    @staticmethod
+    def pendingSearches(cacheKeys: List[Optional[str]], responses: List[Optional[dict]]) -> Dict[int, List[int]]:
+        """
+        Maps the index of every query to send to the indexes of the queries answered by its response. Queries sharing
+        a cache key are sent once.
+        """
+        pending, sent = {}, {}
+        for idx, response in enumerate(responses):
+            if response is not None:
+                continue
+            first = sent.setdefault(cacheKeys[idx], idx) if cacheKeys[idx] is not None else idx
+            pending.setdefault(first, []).append(idx)
+        return pending
+
+    @staticmethod
+    def multiSearchBody(queries: List[dict], pending: Dict[int, List[int]], source, size) -> List[dict]:
+        searches = []
+        for idx in pending:
+            body = {'query': queries[idx]}
+            if source is not None:
+                body['_source'] = source
+            if size is not None:
+                body['size'] = size
+            searches.extend(({}, body))
+        return searches
+
+    def routeResponses(self, pending: Dict[int, List[int]], fetched: List[dict], cacheKeys: List[Optional[str]], responses: List[Optional[dict]], generation) -> None:
+        """
+        Hands every _msearch response to the queries it answers and caches the successful ones.
+        """
+        for (idx, targets), response in zip(pending.items(), fetched):
+            if 'error' in response:
+                self.logger.error(f"Failed to retrieve data from Elasticsearch: {response['error']}")
+                self.countError('fetch')
+            else:
+                self.countResponse(response)
+                if cacheKeys[idx] is not None:
+                    self.resultCache.put(cacheKeys[idx], response, generation)
+            for target in targets:
+                responses[target] = response
+
+    def close(self):
+        """
+        Closes the Elasticsearch client unless it is shared through a client registry.
+        """
+        if self.client is not None and self.ownsClient:
+            self.client.close()
+
+    def dataStream(self, query: dict, pageSize: int = 1000, keepAlive: str = '1m', sort: Optional[List] = None, source: Optional[Union[bool, List[str]]] = None) -> Generator[List[Dict], None, None]:
+        """
+        This function pages through every hit matching the query and yields the hits one page at a time. A point in time
+        with search_after is used when the cluster supports it, otherwise the function falls back to the scroll API.
+
+        Parameters
+        ----------
+        query : dict
+            A dictionary containing the Elasticsearch query parameters.
+        pageSize : int
+            The number of hits to request per page. Defaults to 1000.
+        keepAlive : str
+            How long Elasticsearch keeps the point in time or scroll context alive between pages. Defaults to '1m'.
+        sort : list or None
+            The sort used to page through the point in time or scroll. Defaults to index order ('_shard_doc').
+        source : bool, list or None
+            The _source filtering of the hits, e.g. a list of the fields to return. Defaults to the whole _source.
+
+        Yields
+        ------
+        hits : list
+            A list containing the hits of a single page.
+        """
+        query = self.streamQuery(query)
         try:
-            dataFetchResponse = self.client.search(index=self.index, query=query)
+            pitId = self.client.open_point_in_time(index=self.index, keep_alive=keepAlive)['id']
+        except Exception as e:
+            self.logger.warning(f"Failed to open point in time, falling back to scroll: {e}")
+            yield from self.scrollStream(query=query, pageSize=pageSize, keepAlive=keepAlive, sort=sort, source=source)
+            return
+
+        pitState = {'id': pitId}
+        try:
+            yield from self.pitStream(query=query, pitId=pitId, pageSize=pageSize, keepAlive=keepAlive, sort=sort, source=source, pitState=pitState)
+        finally:
+            try:
+                self.client.close_point_in_time(id=pitState['id'])
+            except Exception as e:
+                self.logger.warning(f"Failed to close point in time: {e}")
+
+    def pitStream(self, query: dict, pitId: str, pageSize: int, keepAlive: str, sort: Optional[List] = None, sliceSpec: Optional[Dict] = None, source: Optional[Union[bool, List[str]]] = None, pitState: Optional[Dict[str, str]] = None) -> Generator[List[Dict], None, None]:
+        """
+        This function pages through a point in time with search_after.
+
+        Parameters
+        ----------
+        query : dict
+            A dictionary containing the Elasticsearch query parameters.
+        pitId : str
+            The id of an open point in time on self.index.
+        pageSize : int
+            The number of hits to request per page.
+        keepAlive : str
+            How long Elasticsearch keeps the point in time alive between pages.
+        sort : list or None
+            The sort used to page through the point in time. Defaults to index order ('_shard_doc').
+        sliceSpec : dict or None
+            An Elasticsearch slice ({'id': ..., 'max': ...}) restricting the stream to one slice of the point in time.
+        source : bool, list or None
+            The _source filtering of the hits, e.g. a list of the fields to return. Defaults to the whole _source.
+        pitState : dict or None
+            When given, its 'id' is kept set to the latest id of the point in time, which Elasticsearch may change
+            between searches, so the caller closes the current one.
+
+        Yields
+        ------
+        hits : list
+            A list containing the hits of a single page.
+        """
+        query = self.streamQuery(query)
+        searchAfter = None
+        while True:
+            try:
+                with stageTimer(self.metrics, 'fetch'):
+                    response = self.client.search(
+                        query=query,
+                        pit={'id': pitId, 'keep_alive': keepAlive},
+                        size=pageSize,
+                        sort=sort or [{'_shard_doc': 'asc'}],
+                        search_after=searchAfter,
+                        slice=sliceSpec,
+                        source=source,
+                    )
+            except Exception as e:
+                error = f"Failed to retrieve data from Elasticsearch: {e}"
+                self.logger.error(error)
+                self.countError('fetch')
+                raise Exception(error)
+
+            pitId = response.get('pit_id', pitId)
+            if pitState is not None:
+                pitState['id'] = pitId
+            hits = response['hits']['hits']
+            self.countHits(hits)
+            if not hits:
+                return
+            yield hits
+            if len(hits) < pageSize:
+                return
+            searchAfter = hits[-1]['sort']
+
+    def scrollStream(self, query: dict, pageSize: int, keepAlive: str, sliceSpec: Optional[Dict] = None, sort: Optional[List] = None, source: Optional[Union[bool, List[str]]] = None) -> Generator[List[Dict], None, None]:
+        """
+        This function pages through the query results with the scroll API and clears the scroll context once done.
+
+        Parameters
+        ----------
+        query : dict
+            A dictionary containing the Elasticsearch query parameters.
+        pageSize : int
+            The number of hits to request per page.
+        keepAlive : str
+            How long Elasticsearch keeps the scroll context alive between pages.
+        sliceSpec : dict or None
+            An Elasticsearch slice ({'id': ..., 'max': ...}) restricting the scroll to one slice of the index.
+        sort : list or None
+            The sort of the scroll. '_shard_doc' entries, which only apply to points in time, are ignored. Defaults to '_doc'.
+        source : bool, list or None
+            The _source filtering of the hits, e.g. a list of the fields to return. Defaults to the whole _source.
+
+        Yields
+        ------
+        hits : list
+            A list containing the hits of a single page.
+        """
+        query = self.streamQuery(query)
+        scrollId = None
+        try:
+            with stageTimer(self.metrics, 'fetch'):
+                response = self.client.search(index=self.index, query=query, size=pageSize, scroll=keepAlive, sort=[field for field in sort or [] if '_shard_doc' not in field] or ['_doc'], slice=sliceSpec, source=source)
+            while True:
+                scrollId = response.get('_scroll_id', scrollId)
+                hits = response['hits']['hits']
+                self.countHits(hits)
+                if not hits:
+                    return
+                yield hits
+                with stageTimer(self.metrics, 'fetch'):
+                    response = self.client.scroll(scroll_id=scrollId, scroll=keepAlive)
         except Exception as e:
             error = f"Failed to retrieve data from Elasticsearch: {e}"
             self.logger.error(error)
+            self.countError('fetch')
             raise Exception(error)
-        return dataFetchResponse
\ No newline at end of file
+        finally:
+            if scrollId:
+                try:
+                    self.client.clear_scroll(scroll_id=scrollId)
+                except Exception as e:
+                    self.logger.warning(f"Failed to clear scroll: {e}")
+
+    def slicedStream(self, query: dict, slices: int, pageSize: int = 1000, keepAlive: str = '1m', queueSize: int = 0, source: Optional[Union[bool, List[str]]] = None) -> Generator[List[Dict], None, None]:
+        """
+        This function splits self.index into slices, drains every slice concurrently on its own thread and yields
+        the hit pages of all slices as a single merged stream. Pages arrive in completion order, not index order.
+
+        Parameters
+        ----------
+        query : dict
+            A dictionary containing the Elasticsearch query parameters.
+        slices : int
+            The number of slices (and reader threads) to split the index into. A value of 1 behaves like dataStream.
+        pageSize : int
+            The number of hits to request per page and slice. Defaults to 1000.
+        keepAlive : str
+            How long Elasticsearch keeps the point in time or scroll contexts alive between pages. Defaults to '1m'.
+        queueSize : int
+            The number of pages buffered between the reader threads and the consumer. Defaults to two per slice.
+        source : bool, list or None
+            The _source filtering of the hits, e.g. a list of the fields to return. Defaults to the whole _source.
+
+        Yields
+        ------
+        hits : list
+            A list containing the hits of a single page of one of the slices.
+        """
+        query = self.streamQuery(query)
+        if slices <= 1:
+            yield from self.dataStream(query=query, pageSize=pageSize, keepAlive=keepAlive, source=source)
+            return
+
+        try:
+            pitId = self.client.open_point_in_time(index=self.index, keep_alive=keepAlive)['id']
+        except Exception as e:
+            self.logger.warning(f"Failed to open point in time, falling back to sliced scroll: {e}")
+            pitId = None
+        # the slices share the point in time, whose latest id is closed once they are done
+        pitState = {'id': pitId}
+
+        def sliceStream(sliceId):
+            sliceSpec = {'id': sliceId, 'max': slices}
+            if pitId:
+                return self.pitStream(query=query, pitId=pitId, pageSize=pageSize, keepAlive=keepAlive, sliceSpec=sliceSpec, source=source, pitState=pitState)
+            return self.scrollStream(query=query, pageSize=pageSize, keepAlive=keepAlive, sliceSpec=sliceSpec, source=source)
+
+        pages = Queue(maxsize=queueSize or 2 * slices)
+        stop = Event()
+        done = object()
+
+        def put(item):
+            while not stop.is_set():
+                try:
+                    pages.put(item, timeout=0.1)
+                    return True
+                except Full:
+                    continue
+            return False
+
+        def drain(sliceId):
+            stream = sliceStream(sliceId)
+            try:
+                for hits in stream:
+                    if not put(hits):
+                        return
+            except Exception as e:
+                put(e)
+            finally:
+                stream.close()
+                put(done)
+
+        readers = [Thread(target=drain, args=(sliceId,), daemon=True) for sliceId in range(slices)]
+        for reader in readers:
+            reader.start()
+
+        try:
+            remaining = slices
+            while remaining:
+                item = pages.get()
+                if item is done:
+                    remaining -= 1
+                elif isinstance(item, Exception):
+                    raise item
+                else:
+                    yield item
+        finally:
+            stop.set()
+            for reader in readers:
+                reader.join()
+            if pitId:
+                try:
+                    self.client.close_point_in_time(id=pitState['id'])
+                except Exception as e:
+                    self.logger.warning(f"Failed to close point in time: {e}")
@@ -1,9 +1,27 @@
 import os
-from nodeTypes import NodeType
+import json
+from nodeType import NodeType
 from Neo4jHandler import Neo4jHandler
 from ElasticsearchHandler import ElasticsearchHandler
-from typing import List, Dict, Generator
+from AsyncNeo4jHandler import AsyncNeo4jHandler
+from AsyncElasticsearchHandler import AsyncElasticsearchHandler
+from BoundedStage import BoundedStage
+from ClientRegistry import clientRegistry
+from CheckpointStore import CheckpointStore
+from DyadCache import DyadCache
+from Neo4jBulkExporter import Neo4jBulkExporter
+from FastJsonSerializer import FastJsonSerializer
+from QueryResultCache import QueryResultCache
+from BatchSizeController import BatchSizeController
+from BatchSpool import BatchSpool
+from SyncMetrics import SyncMetrics, DEPTH_BUCKETS, stageTimer
+from MappingPlan import MappingPlan, ENTITY_VALUE
+from DocumentTransform import DocumentTransform, ThresholdFilter, initWorker, documentsChunk, dyadsChunk
+from typing import List, Dict, Generator, AsyncGenerator, Iterable, Any, Optional, Union
 from multiprocessing import Pool
+from threading import Event, Semaphore
+from contextlib import contextmanager, nullcontext
+from itertools import islice
 import logging
 
 logger = logging.getLogger(__name__)
@@ -24,6 +42,87 @@ class ElasticsearchToNeo4jSync():
         """
         self.params: Dict[str, any] = {
             "properties": ['name'],
+            "fetch": {
+                "pageSize": 1000,
+                "keepAlive": '1m',
+                "slices": 1,
+                # 'fast' decodes responses with orjson, 'lazy' walks search responses with pysimdjson and only
+                # materializes the mapped fields, which pays off when whole documents carrying large numeric arrays
+                # are fetched (see Benchmark.py), and 'default' keeps the client's json module; missing packages
+                # fall back from 'lazy' to orjson and from orjson to json
+                "decoder": 'fast',
+                # the number of hits of the single search of startSearchProcess
+                "searchSize": 1000,
+                # the number of searches of one _msearch that Elasticsearch runs concurrently, None for the cluster default
+                "maxConcurrentSearches": None,
+            },
+            "cache": {
+                "enabled": True,
+                "maxsize": 256,
+                "ttl": 300,
+                # drop cached responses once the index was refreshed
+                "invalidateOnRefresh": True,
+            },
+            "metrics": {
+                "enabled": True,
+                # a Prometheus textfile collector file rewritten at the end of every run
+                "textfilePath": os.getenv('METRICS_TEXTFILE'),
+            },
+            "push": {
+                # the rows per Neo4j batch, the initial size of every shape when the batch size adapts
+                "chunkSize": 10000,
+                # the sessions committing batches concurrently, one per partition of the start node keys
+                "writers": int(os.getenv('NEO4J_WRITERS', 1)),
+                # resize the batches of every (fromLabel, relationship, toLabel) shape so a commit takes about
+                # targetLatency seconds, shrinking them on transaction memory errors
+                "adaptive": True,
+                "targetLatency": 1.0,
+                "minSize": 100,
+                "maxSize": 50000,
+                # 'dyad' merges both nodes and the relationship of every dyad in one statement, 'twoPhase' merges the
+                # distinct nodes of a window of dyads first and then matches them to merge the relationships, grouped
+                # by hub node when groupByHub is set, so hubs are neither merged nor locked once per relationship
+                "writeStrategy": 'dyad',
+                "groupByHub": True,
+            },
+            "spool": {
+                # a directory where every Neo4j batch is written ahead before it is committed, so the batches of a
+                # failed push can be replayed with startReplayProcess; no spool when unset
+                "path": os.getenv('SPOOL_PATH'),
+                "segmentBytes": 64 * 2 ** 20,
+                "fsync": True,
+            },
+            "pipeline": {
+                "queueSize": 4,
+            },
+            "transform": {
+                "workers": int(os.getenv('TRANSFORM_WORKERS', 1)),
+                "chunkSize": 500,
+                "ordered": True,
+                # the chunks handed to the pool but not consumed yet; 0 means two per worker
+                "maxInFlight": 0,
+                # filters the thresholds of a whole page in one NumPy pass when it is installed; off by default since
+                # flattening and reassembling the entity dicts costs more than the comparisons it saves (see Benchmark.py)
+                "vectorized": False,
+            },
+            "pushdown": {
+                # only request the mapped entity fields (_source includes)
+                "source": True,
+                # evaluate the thresholds in Elasticsearch with nested queries and inner_hits; requires the entity
+                # fields to be mapped as nested
+                "thresholds": False,
+                # the maximum number of entities returned per field and hit, at most index.max_inner_result_window
+                "innerHitsSize": 100,
+            },
+            "incremental": {
+                "field": '@timestamp',
+                "checkpointPath": os.getenv('CHECKPOINT_PATH', 'checkpoints.sqlite'),
+            },
+            "dedup": {
+                "enabled": True,
+                "maxsize": 100000,
+                "path": os.getenv('DYAD_CACHE_PATH'),
+            },
             "parse": {
                 "thresholds": {
                     'args': {
@@ -32,7 +131,10 @@ class ElasticsearchToNeo4jSync():
                         'relatedOrganizations': 0.9,
                         'amount': 0.9           
                     },
-                    'condition': lambda threshold, entity: entity.get('score', 0) >= threshold
+                    # an operator of DocumentTransform.CONDITIONS applied as score >= threshold, or a callable
+                    # taking (threshold, entity)
+                    'condition': '>=',
+                    'scoreKey': 'score',
                 },
             },
         }
@@ -53,16 +155,43 @@ class ElasticsearchToNeo4jSync():
         }
         logging.basicConfig(level=logging.INFO)
         self.neo4jParams = self.processNeo4jParams(neo4jParams=self.neo4jParams)
+        self.mappingPlan = MappingPlan.compile(self.neo4jParams)
+        self.documentTransform = DocumentTransform(
+            entityKeys=set(self.neo4jParams['types'].keys()) | set(self.neo4jParams.get('relationshipProps', [])),
+            filters=ThresholdFilter.compile(self.params.get('parse', {})),
+            plan=self.mappingPlan,
+            vectorized=self.params['transform']['vectorized'],
+        )
+        self.checkpoints = None
+        dedupParams = self.params['dedup']
+        self.dyadCache = DyadCache(maxsize=dedupParams['maxsize'], path=dedupParams['path']) if dedupParams['enabled'] else None
+        cacheParams = self.params['cache']
+        self.queryResultCache = QueryResultCache(maxsize=cacheParams['maxsize'], ttl=cacheParams['ttl']) if cacheParams['enabled'] else None
+        self.metrics = SyncMetrics() if self.params['metrics']['enabled'] else None
+        pushParams = self.params['push']
+        self.batchSizer = BatchSizeController(
+            initialSize=pushParams['chunkSize'],
+            targetLatency=pushParams['targetLatency'],
+            minSize=pushParams['minSize'],
+            maxSize=pushParams['maxSize'],
+        ) if pushParams['adaptive'] else None
+        spoolParams = self.params['spool']
+        self.spool = BatchSpool(
+            path=spoolParams['path'],
+            segmentBytes=spoolParams['segmentBytes'],
+            fsync=spoolParams['fsync'],
+        ) if spoolParams['path'] else None
     
     def processNeo4jParams(self, neo4jParams):
         parsedNeo4jParams = self.equalizeListValues(data=neo4jParams)
         return parsedNeo4jParams
     
     def equalizeListValues(self, data):
-        longest_key = max(data, key=lambda k: len(data[k]))
-        longest_length = len(data[longest_key])
+        longest_length = max((len(value) for value in data.values() if isinstance(value, list)), default=0)
 
         for key in data:
+            if isinstance(data[key], dict):
+                continue
             if not isinstance(data[key], list):
                 logger.error(f"{key} value is not a list")
                 continue
@@ -100,50 +229,131 @@ class ElasticsearchToNeo4jSync():
             if searchProperty.get('subject', '') in properties]
             # Combine the must queries with a bool query
             searchQuery = {"bool": {"must": queries}} if queries else {}
+            searchQuery = self.thresholdQuery(searchQuery)
         except Exception as e:
             logger.error(f"An error occurred in elasticQueryBuilder function: {str(e)}", exc_info=True)
             return None
         else:
             return searchQuery
 
-    def neo4jQueryBuilder(self, dataFetchResponse: Dict[str, any]) -> Generator[Dict[str, any]]:
+    def pushedThresholds(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Returns the range query of every entity field whose threshold is evaluated by Elasticsearch.
+
+        Returns
+        -------
+        dict
+            The range queries keyed by entity field. Empty unless params['pushdown']['thresholds'] is set.
+        """
+        if not self.params['pushdown']['thresholds']:
+            return {}
+        rangeQueries = {}
+        for thresholdFilter in self.documentTransform.filters:
+            for entityKey in self.documentTransform.entityKeys:
+                rangeQuery = thresholdFilter.rangeQuery(entityKey)
+                if rangeQuery is not None:
+                    rangeQueries[entityKey] = rangeQuery
+        return rangeQueries
+
+    def thresholdQuery(self, query: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Adds the server-side thresholds to a query. Every thresholded field gets an optional nested query whose
+        inner hits carry the entities meeting the threshold, and hits without a single start node entity meeting
+        its threshold are filtered out since they cannot produce any dyad.
+
+        Parameters
+        ----------
+        query : dict
+            A dictionary containing the Elasticsearch query parameters.
+
+        Returns
+        -------
+        dict
+            A dictionary containing the Elasticsearch query parameters.
+        """
+        rangeQueries = self.pushedThresholds()
+        if not rangeQueries:
+            return query
+        innerHitsSize = self.params['pushdown']['innerHitsSize']
+        should = [{
+            "nested": {
+                "path": entityKey,
+                "query": rangeQuery,
+                "inner_hits": {"name": entityKey, "size": innerHitsSize},
+                "ignore_unmapped": True,
+            }
+        } for entityKey, rangeQuery in sorted(rangeQueries.items())]
+        fromKeys = sorted({spec.fromKey for spec in self.mappingPlan.specs})
+        filters = []
+        if all(fromKey in rangeQueries for fromKey in fromKeys):
+            filters.append({"bool": {
+                "should": [{"nested": {"path": fromKey, "query": rangeQueries[fromKey], "ignore_unmapped": True}} for fromKey in fromKeys],
+                "minimum_should_match": 1,
+            }})
+        return {"bool": {"must": [query] if query else [], "should": should, "filter": filters, "minimum_should_match": 0}}
+
+    def mappedSourceFields(self) -> List[str]:
+        """
+        Returns the _source fields the mapping reads: the mapped properties of the start and end node entities, the
+        value of the relationship property entities and the scores of the thresholded fields.
+
+        Returns
+        -------
+        list
+            The mapped fields as 'field.key' paths.
+        """
+        fields = set()
+        for spec in self.mappingPlan.specs:
+            fields.update(f"{spec.fromKey}.{source}" for source, _ in spec.fromProps)
+            fields.update(f"{spec.toKey}.{source}" for source, _ in spec.toProps)
+            fields.update(f"{source}.{ENTITY_VALUE}" for source, _ in spec.relationshipProps)
+        for thresholdFilter in self.documentTransform.filters:
+            fields.update(f"{argKey}.{thresholdFilter.scoreKey}" for argKey, _ in thresholdFilter.args if argKey in self.documentTransform.entityKeys)
+        return sorted(fields)
+
+    def sourceFields(self) -> Optional[List[str]]:
         """
-        This function generates nodes and edges for Neo4j graph database using the Elasticsearch response data.
+        Returns the _source includes of the searches: the mapped fields, except the fields thresholded server-side
+        since their entities come from the inner hits.
+
+        Returns
+        -------
+        list or None
+            The _source includes, or None to fetch whole documents when params['pushdown']['source'] is not set.
+        """
+        if not self.params['pushdown']['source']:
+            return None
+        pushed = self.pushedThresholds()
+        return [field for field in self.mappedSourceFields() if field.split('.', 1)[0] not in pushed]
+
+    def neo4jQueryBuilder(self, dataFetchResponse: Union[Dict[str, Any], Iterable[List[Dict[str, Any]]]]) -> Generator[Dict[str, Any], None, None]:
+        """
+        This function generates nodes and edges for Neo4j graph database using the Elasticsearch response data. Every
+        hit is expanded into all configured from → to mappings and all entity pairs of those fields in a single pass.
+        Malformed hits are logged and skipped, but a failure to fetch the pages is raised, so the push consuming the
+        dyads fails instead of committing a truncated graph.
 
         Parameters
         ----------
-        dataFetchResponse : dict
-            A dictionary containing the search results from Elasticsearch.
+        dataFetchResponse : dict or iterable of list
+            A dictionary containing the search results from Elasticsearch, or an iterable of hit pages.
 
         Yields
         ------
         dict
             A dictionary containing the data required to create nodes and edges in Neo4j database.
         """
-        docs = self.generateDocuments(dataFetchResponse)
-        fromTypeKeys = self.neo4jParams.get('from', [])
-        toTypeKeys = self.neo4jParams.get('to', [])
-
-        graphDataGen = ({
-            "fromTypeKeys": self.neo4jParams.get('fromType', [])[idx],
-            "fromPropsKeys": self.neo4jParams.get('fromProps', [])[idx],
-            "toTypeKeys": self.neo4jParams.get('toType', [])[idx],
-            "toPropsKeys": self.neo4jParams.get('toProps', [])[idx],
-            "relationshipType": self.neo4jParams.get('relationship', [])[idx],
-            "relationshipProps": self.neo4jParams.get('relationshipProps', [])[idx],
-            "neo4jPropConvert" : self.neo4jParams.get("propMap", {}),
-            "types": self.neo4jParams.get('types', {})
-        } for idx in range(0, len(fromTypeKeys)))
-
-        try:
-            for doc in docs:
-                yield self.buildGraphData(doc=doc, **next(graphDataGen))
-        except Exception as e:
-            logger.error(f"'An error occurred in neo4jQueryBuilder function: {str(e)}'", exc_info=True)
+        for hits in self.iteratePages(dataFetchResponse):
+            with stageTimer(self.metrics, 'transform'):
+                docs = self.documentTransform.documents(hits)
+                queriesParams = self.documentTransform.expand(docs)
+            self.countDocuments(len(docs))
+            yield from queriesParams
 
     def buildGraphData(self, from_type_key, to_type_key, relationship_type, from_props_keys, to_props_keys, relationship_props, doc, neo4jPropConvert, types):
         """
-        This function builds the data required to create nodes and edges in Neo4j database.
+        This function builds the data required to create nodes and edges in Neo4j database, resolving the neo4j
+        parameters on every call. neo4jQueryBuilder applies the equivalent DyadSpec of the compiled mapping plan instead.
 
         Parameters
         ----------
@@ -152,7 +362,7 @@ class ElasticsearchToNeo4jSync():
         to_type_key : str
             The key to the "to" node type in the neo4j parameters.
         relationship_type : str
-            The type of the relationship in the neo4j parameters.
+            The relationship type, e.g. HAS_PROVIDED_BUSINESS_TO.
         from_props_keys : list
             A list of the keys for the "from" node properties in the neo4j parameters.
         to_props_keys : list
@@ -168,19 +378,27 @@ class ElasticsearchToNeo4jSync():
 
         Returns
         -------
-        dict
-            A dictionary containing the data required to create nodes and edges in Neo4j database.
+        dict or None
+            A dictionary containing the data required to create nodes and edges in Neo4j database, or None when the
+            document has no entity for the start or end node.
         """
+        fromEntities = doc.get(from_type_key) or []
+        toEntities = doc.get(to_type_key) or []
+        if not fromEntities or not toEntities:
+            return None
+        edgeValues = {prop_key: [entity.get(ENTITY_VALUE) for entity in doc.get(prop_key) or []]
+                      for prop_key in ([relationship_props] if isinstance(relationship_props, str) else relationship_props)}
 
         return {
             # Node Types
             'fromType': self.getType(types, from_type_key),
             'toType': self.getType(types, to_type_key),
-            'edgeType': self.getType(types, relationship_type),
+            'edgeType': relationship_type,
             # Node Properties
-            'fromProps': self.getProps(from_props_keys, doc, neo4jPropConvert),
-            'toProps': self.getProps(to_props_keys, doc, neo4jPropConvert),
-            'edgeProps': self.getProps(relationship_props, doc, neo4jPropConvert)
+            'fromProps': self.getProps(from_props_keys, fromEntities[0], neo4jPropConvert),
+            'toProps': self.getProps(to_props_keys, toEntities[0], neo4jPropConvert),
+            'edgeProps': {neo4jPropConvert.get(prop_key, prop_key): values[0] if len(values) == 1 else values
+                          for prop_key, values in edgeValues.items() if values}
         }
 
     def getProps(self, props: List[str], doc: Dict[str, Any], neo4jPropConvert: Dict[str, str]) -> Dict[str, Any]:
@@ -189,10 +407,10 @@ class ElasticsearchToNeo4jSync():
 
         Parameters
         ----------
-        props : list
-            A list of property keys to extract from the document.
+        props : str or list
+            A property key or a list of property keys to extract from the document.
         doc : dict
-            A dictionary containing document data.
+            The entity holding the properties, e.g. {'answer': 'Acme', 'score': 0.95}.
         neo4jPropConvert : dict
             A dictionary containing mapping of Elasticsearch property names to Neo4j property names.
 
@@ -201,7 +419,9 @@ class ElasticsearchToNeo4jSync():
         dict
             A dictionary containing property keys and values for a given document.
         """
-        return {neo4jPropConvert[prop_key]: doc[prop_key] for prop_key in props}
+        if isinstance(props, str):
+            props = [props]
+        return {neo4jPropConvert.get(prop_key, prop_key): doc[prop_key] for prop_key in props if prop_key in doc}
 
     def getType(self, types: Dict[str, str], node: str) -> str:
         """
@@ -223,32 +443,62 @@ class ElasticsearchToNeo4jSync():
             types = self.neo4jParams
         return types.get(node, '')
 
-    def extractDocument(self, dataFetchResponse: Dict[str, Any]) -> Generator[Dict[str, Any]]:
+    def iteratePages(self, dataFetchResponse: Union[Dict[str, Any], Iterable[List[Dict[str, Any]]]]) -> Iterable[List[Dict[str, Any]]]:
+        """
+        This function returns the hit pages of either a single Elasticsearch response or a stream of hit pages.
+
+        Parameters
+        ----------
+        dataFetchResponse : dict or iterable of list
+            A dictionary containing the search results from Elasticsearch, or an iterable of hit pages
+            such as the one returned by ElasticsearchHandler.dataStream.
+
+        Returns
+        -------
+        iterable of list
+            The hit pages.
+        """
+        try:
+            return [dataFetchResponse['hits']['hits']]
+        except TypeError:
+            return dataFetchResponse
+
+    def iterateHits(self, dataFetchResponse: Union[Dict[str, Any], Iterable[List[Dict[str, Any]]]]) -> Generator[Dict[str, Any], None, None]:
+        """
+        This function flattens either a single Elasticsearch response or a stream of hit pages into a stream of hits.
+
+        Parameters
+        ----------
+        dataFetchResponse : dict or iterable of list
+            A dictionary containing the search results from Elasticsearch, or an iterable of hit pages
+            such as the one returned by ElasticsearchHandler.dataStream.
+
+        Yields
+        ------
+        dict
+            A single Elasticsearch hit.
+        """
+        for hits in self.iteratePages(dataFetchResponse):
+            yield from hits
+
+    def extractDocument(self, dataFetchResponse: Union[Dict[str, Any], Iterable[List[Dict[str, Any]]]]) -> Generator[Dict[str, Any], None, None]:
         """
         This function extracts the relevant documents from the Elasticsearch response data.
 
         Parameters
         ----------
-        dataFetchResponse : dict
-            A dictionary containing the search results from Elasticsearch.
+        dataFetchResponse : dict or iterable of list
+            A dictionary containing the search results from Elasticsearch, or an iterable of hit pages
+            such as the one returned by ElasticsearchHandler.dataStream.
 
         Yields
         ------
         dict
             A dictionary containing the extracted documents.
         """
-        entityKeys = self.parameters['types'].keys()
-        hits = dataFetchResponse['hits']['hits']
-        for hit in hits:
-            data = (
-                {
-                    entityKey: dict(doc[entityKey])
-                    for entityKey in entityKeys
-                    for doc in hit.get('_source', [])
-                }
-            )
-            yield data
-            
+        for hit in self.iterateHits(dataFetchResponse):
+            yield self.documentTransform.extract(hit)
+
     def processDocument(self, doc):
         """
         This function deletes elements from a document whose score falls below a threshold defined by the user.
@@ -258,17 +508,93 @@ class ElasticsearchToNeo4jSync():
         doc : dict
             A dictionary containing a document to be parsed.
 
-        Yields
-        ------
+        Returns
+        -------
         dict
             A dictionary containing the parsed document.
         """
-        for parseKey, parseVal in self.parameters.get('parse', {}).items():
-            parseArgsDict = parseVal[parseKey]['args']
-            parseCondition = parseVal[parseKey]['condition']
-            for argKey, argValue in parseArgsDict.items():
-                doc[argKey] = [d for d in doc[argKey] if parseCondition(argValue, d)]
-        yield doc 
+        with stageTimer(self.metrics, 'transform'):
+            doc = self.documentTransform.parse(doc)
+        self.countDocuments(1)
+        return doc
+
+    def countDocuments(self, count: int) -> None:
+        if self.metrics is not None:
+            self.metrics.increment('documents_total', count)
+
+    def chunkHits(self, dataFetchResponse, chunkSize: int) -> Generator[List[Dict[str, Any]], None, None]:
+        """
+        This function regroups the hits of a response or of a stream of hit pages into chunks of a fixed size.
+
+        Parameters
+        ----------
+        dataFetchResponse : dict or iterable of list
+            A dictionary containing the search results from Elasticsearch, or an iterable of hit pages.
+        chunkSize : int
+            The number of hits per chunk; the last chunk may be shorter.
+
+        Yields
+        ------
+        list
+            A chunk of hits.
+        """
+        hits = self.iterateHits(dataFetchResponse)
+        while True:
+            chunk = list(islice(hits, chunkSize))
+            if not chunk:
+                return
+            yield chunk
+
+    def transformParallel(self, worker, dataFetchResponse) -> Generator[Any, None, None]:
+        """
+        This function runs a DocumentTransform worker function over chunks of hits on a process pool. Every worker
+        process receives the compiled document transform once, when it starts, and then only chunks of hits. The
+        pool pulls chunks from the stream as fast as it can, so at most params['transform']['maxInFlight'] chunks
+        are handed to it before the consumer takes their results, which also holds back the Elasticsearch reads.
+
+        Parameters
+        ----------
+        worker : callable
+            DocumentTransform.documentsChunk or DocumentTransform.dyadsChunk.
+        dataFetchResponse : dict or iterable of list
+            A dictionary containing the search results from Elasticsearch, or an iterable of hit pages.
+
+        Yields
+        ------
+        any
+            The results of the worker, chunk after chunk. Chunks keep the order of the hits unless
+            params['transform']['ordered'] is False.
+        """
+        transformParams = self.params['transform']
+        maxInFlight = transformParams['maxInFlight'] or 2 * transformParams['workers']
+        inFlight = Semaphore(maxInFlight)
+        stopped = Event()
+
+        def chunks():
+            # runs on the task handler thread of the pool
+            for chunk in self.chunkHits(dataFetchResponse, transformParams['chunkSize']):
+                inFlight.acquire()
+                if stopped.is_set():
+                    return
+                self.countDocuments(len(chunk))
+                yield chunk
+
+        with Pool(processes=transformParams['workers'], initializer=initWorker, initargs=(self.documentTransform,)) as pool:
+            results = pool.imap(worker, chunks()) if transformParams['ordered'] else pool.imap_unordered(worker, chunks())
+            try:
+                while True:
+                    # the transform runs in the workers, so the stage records how long the consumer waits for a chunk
+                    with stageTimer(self.metrics, 'transform'):
+                        result = next(results, None)
+                    if result is None:
+                        return
+                    inFlight.release()
+                    yield from result
+            finally:
+                # unblocks the task handler, which the pool joins when it terminates
+                stopped.set()
+                for _ in range(maxInFlight):
+                    inFlight.release()
 
     def generateDocumentsParallel(self, dataFetchResponse):
         """
@@ -276,32 +602,217 @@ class ElasticsearchToNeo4jSync():
 
         Parameters
         ----------
-        dataFetchResponse : dict
-            A dictionary containing the search results from Elasticsearch.
+        dataFetchResponse : dict or iterable of list
+            A dictionary containing the search results from Elasticsearch, or an iterable of hit pages.
 
         Yields
         ------
         dict
             A dictionary containing the parsed document.
         """
-        with Pool(processes=self.n_jobs) as pool:
-            for result in pool.imap_unordered(self.processDocument, self.extractDocument(dataFetchResponse)):
-                if result is not None:
-                    yield result
+        yield from self.transformParallel(documentsChunk, dataFetchResponse)
+
+    def neo4jQueryBuilderParallel(self, dataFetchResponse) -> Generator[Dict[str, Any], None, None]:
+        """
+        This function is the multiprocessing counterpart of neo4jQueryBuilder: extraction, threshold filtering and
+        fan-out all run in the worker processes, which send back the dyads of a whole chunk at once.
 
-    def generateDocuments(self):
+        Parameters
+        ----------
+        dataFetchResponse : dict or iterable of list
+            A dictionary containing the search results from Elasticsearch, or an iterable of hit pages.
+
+        Yields
+        ------
+        dict
+            A dictionary containing the data required to create nodes and edges in Neo4j database.
         """
-        This function generates a parsed document.
+        yield from self.transformParallel(dyadsChunk, dataFetchResponse)
+
+    def generateDocuments(self, dataFetchResponse):
+        """
+        This function generates a parsed document. The thresholds are applied to a whole page of hits at a time,
+        in one vectorized pass when params['transform']['vectorized'] is set and NumPy is installed.
+
+        Parameters
+        ----------
+        dataFetchResponse : dict or iterable of list
+            A dictionary containing the search results from Elasticsearch, or an iterable of hit pages.
 
         Yields
         ------
         dict
             A dictionary containing the parsed document.
         """
-        docs = self.extractDocument()
-        for parsed_doc in map(self.processDocument, docs):
-            yield parsed_doc
+        for hits in self.iteratePages(dataFetchResponse):
+            with stageTimer(self.metrics, 'transform'):
+                docs = self.documentTransform.documents(hits)
+            self.countDocuments(len(docs))
+            yield from docs
             
+    def responseSerializer(self) -> Optional[FastJsonSerializer]:
+        """
+        Returns the serializer decoding the Elasticsearch responses for params['fetch']['decoder'], or None for the
+        client's own serializer.
+        """
+        decoder = self.params['fetch']['decoder']
+        if decoder == 'lazy':
+            # the watermark field is kept for incremental runs
+            return FastJsonSerializer(sourceFields=self.mappedSourceFields() + [self.params['incremental']['field']])
+        if decoder == 'fast':
+            return FastJsonSerializer()
+        return None
+
+    def elasticsearchHandler(self, handlerClass: type = ElasticsearchHandler) -> ElasticsearchHandler:
+        """
+        Creates the Elasticsearch handler from the environment variables of the ingress container.
+
+        Parameters
+        ----------
+        handlerClass : type
+            ElasticsearchHandler or AsyncElasticsearchHandler. Defaults to ElasticsearchHandler. Synchronous handlers
+            share their client through the process-wide client registry.
+
+        Returns
+        -------
+        ElasticsearchHandler
+            The handler used to fetch the documents.
+        """
+        return handlerClass(
+            hosts=os.getenv('ES_HOSTS'), 
+            username=os.getenv('ES_USERNAME'), 
+            password=os.getenv('ES_PASSWORD'), 
+            caCerts=os.getenv('ES_CA_CERTS'), 
+            caFingerprint=os.getenv('ES_CA_FINGERPRINT'), 
+            index=os.getenv('ES_INDEX'),
+            logger=logger,
+            clientRegistry=None if handlerClass is AsyncElasticsearchHandler else clientRegistry,
+            serializer=self.responseSerializer(),
+            resultCache=self.queryResultCache,
+            invalidateOnRefresh=self.params['cache']['invalidateOnRefresh'],
+            metrics=self.metrics,
+        )
+
+    def neo4jHandlerParams(self) -> Dict[str, Any]:
+        """
+        Returns the neo4jParameters of the Neo4j handlers.
+        """
+        return {'nodeTypes': [NodeType.parse(nodeType).schema() for nodeType in self.neo4jParams.get('types', {}).values()],
+                'chunkSize': self.params['push']['chunkSize'],
+                'writers': self.params['push']['writers'],
+                'writeStrategy': self.params['push']['writeStrategy'],
+                'groupByHub': self.params['push']['groupByHub'],
+                'reqProps': self.params['properties'],
+                'bootstrapSchema': True}
+
+    def neo4jHandler(self, handlerClass: type = Neo4jHandler) -> Neo4jHandler:
+        """
+        Creates the Neo4j handler from the environment variables of the ingress container.
+
+        Parameters
+        ----------
+        handlerClass : type
+            Neo4jHandler or AsyncNeo4jHandler. Defaults to Neo4jHandler. Synchronous handlers share their driver
+            through the process-wide client registry.
+
+        Returns
+        -------
+        Neo4jHandler
+            The handler used to push the graph data.
+        """
+        return handlerClass(
+            uri=os.getenv('NEO4J_HOST'),
+            user=os.getenv('NEO4J_USER'),
+            password=os.getenv('NEO4J_PASSWORD'),
+            neo4jParameters=self.neo4jHandlerParams(),
+            logger=logger,
+            clientRegistry=None if handlerClass is AsyncNeo4jHandler else clientRegistry,
+            dyadCache=self.dyadCache,
+            metrics=self.metrics,
+            batchSizer=self.batchSizer,
+            spool=self.spool,
+        )
+
+    @contextmanager
+    def instrumentedRun(self, runner: str, scoped: bool = False):
+        """
+        Logs the metrics summary of a run once it ended, also when it failed, and rewrites the Prometheus textfile
+        when params['metrics']['textfilePath'] is set.
+
+        Parameters
+        ----------
+        runner : str
+            The name of the runner, used in the log line.
+        scoped : bool
+            Whether the run is summarized from its own metrics, see SyncMetrics.run, rather than from the metrics
+            recorded since it started. Runs that may execute concurrently, such as startProcessAsync, must be
+            scoped, runs recording from threads must not. Defaults to False.
+        """
+        if self.metrics is None:
+            yield
+            return
+        with self.metrics.run() if scoped else nullcontext() as runMetrics:
+            since = None if scoped else self.metrics.snapshot()
+            try:
+                yield
+            finally:
+                summary = runMetrics.summary() if scoped else self.metrics.summary(since)
+                logger.info(f"{runner} metrics: {json.dumps(summary)}")
+                textfilePath = self.params['metrics']['textfilePath']
+                if textfilePath:
+                    try:
+                        with open(f"{textfilePath}.tmp", 'w') as textfile:
+                            textfile.write(self.metrics.prometheus())
+                        os.replace(f"{textfilePath}.tmp", textfilePath)
+                    except OSError as e:
+                        logger.warning(f"Failed to write the metrics textfile {textfilePath}: {e}")
+
+    def eventQuery(self, queryCloudEvent: Dict[str, Any], runner: str) -> Optional[Dict[str, Any]]:
+        """
+        Builds the Elasticsearch query of a cloud event for a runner. A query that could not be built is None, which
+        the runner must treat as a failure: streaming without a query would sync every document of the index.
+
+        Parameters
+        ----------
+        queryCloudEvent : dict
+            This cloudevent has taxonomy details required to prepare a search Query to fetch data
+        runner : str
+            The name of the runner, used in the log line.
+
+        Returns
+        -------
+        dict or None
+            The Elasticsearch query, or None when the runner has to abort.
+        """
+        query = self.elasticsearchQueryBuilder(queryCloudEvent)
+        if query is None:
+            logger.error(f"Aborting {runner}, no Elasticsearch query could be built from the cloud event {queryCloudEvent}")
+        return query
+
+    def fetchPages(self, esHandler: ElasticsearchHandler, query: Dict[str, Any]) -> Generator[List[Dict[str, Any]], None, None]:
+        """
+        Streams the hit pages matching the query with the configured fetch parameters.
+
+        Parameters
+        ----------
+        esHandler : ElasticsearchHandler
+            The handler used to fetch the documents.
+        query : dict
+            The Elasticsearch query built by eventQuery.
+
+        Returns
+        -------
+        generator
+            The stream of hit pages.
+        """
+        return esHandler.slicedStream(
+            query=query,
+            slices=self.params['fetch']['slices'],
+            pageSize=self.params['fetch']['pageSize'],
+            keepAlive=self.params['fetch']['keepAlive'],
+            source=self.sourceFields(),
+        )
+
     def startProcess(self, queryCloudEvent):
         """
         This method is a runner function 
@@ -317,28 +828,322 @@ class ElasticsearchToNeo4jSync():
             List of source entity and destination entity relationships             
         """
 
-        dataFetchResponse = \
-            ElasticsearchHandler(
-                hosts=os.getenv('ES_HOSTS'), 
-                username=os.getenv('ES_USERNAME'), 
-                password=os.getenv('ES_PASSWORD'), 
-                ca_certs=os.getenv('ES_CA_CERTS'), 
-                ca_fingerprint=os.getenv('ES_CA_FINGERPRINT'), 
-                index=os.getenv('ES_INDEX'),
-                logger=logger,
-            ).dataFetch(
-                query=self.elasticsearchQueryBuilder(queryCloudEvent)
-            )
-        dataPushResponse = \
-            Neo4jHandler(
-                host=os.getenv('NEO4J_HOST'),
-                user=os.getenv('NEO4J_USER'),
-                password=os.getenv('NEO4J_PASSWORD'),
-                neo4jParameters={'nodeTypes': [NodeType(nodeType).schema() for nodeType in self.params.get('types', []).values()],
-                                 'chunkSize':10000,
-                                 'reqProps': self.params['properties']}
-            ).dataPush(
-                queryParams=self.neo4jQueryBuilder(dataFetchResponse)
+        query = self.eventQuery(queryCloudEvent, 'startProcess')
+        if query is None:
+            return False
+        with self.instrumentedRun('startProcess'):
+            dataFetchResponse = self.fetchPages(self.elasticsearchHandler(), query)
+            queryBuilder = self.neo4jQueryBuilderParallel if self.params['transform']['workers'] > 1 else self.neo4jQueryBuilder
+            dataPushResponse = self.neo4jHandler().dataPush(
+                queriesParams=queryBuilder(dataFetchResponse)
             )
 
         return dataPushResponse
+
+    def startSearchProcess(self, queryCloudEvent):
+        """
+        This method is a runner function that syncs the top hits of a single search instead of every matching
+        document. The search goes through the query result cache, so a cloud event repeating the search queries of a
+        recent one does not run the fuzzy query again.
+
+        Parameters
+        ----------
+        queryCloudEvent: dict
+            This cloudevent has taxonomy details required to prepare a search Query to fetch data
+
+        Return
+        ------
+        bool
+            A boolean indicating whether the data insertion was successful.
+        """
+        query = self.eventQuery(queryCloudEvent, 'startSearchProcess')
+        if query is None:
+            return False
+        with self.instrumentedRun('startSearchProcess'):
+            dataFetchResponse = self.elasticsearchHandler().dataFetch(
+                query=query,
+                source=self.sourceFields(),
+                size=self.params['fetch']['searchSize'],
+            )
+            if self.queryResultCache is not None:
+                logger.info(f"Query result cache: {self.queryResultCache.stats()}")
+            return self.neo4jHandler().dataPush(queriesParams=self.neo4jQueryBuilder(dataFetchResponse))
+
+    def startReplayProcess(self):
+        """
+        This method is a runner function that commits the Neo4j batches left in the spool by failed pushes, without
+        fetching anything from Elasticsearch. Run it after a failed push and before the next one.
+
+        Return
+        ------
+        bool
+            A boolean indicating whether every spooled batch was committed.
+        """
+        if self.spool is None:
+            logger.warning("No spool is configured, set SPOOL_PATH to spool the Neo4j batches")
+            return True
+        with self.instrumentedRun('startReplayProcess'):
+            success = self.neo4jHandler().replaySpool()
+            logger.info(f"Spool: {self.spool.stats()}")
+            return success
+
+    def startBatchProcess(self, queryCloudEvents: List[Dict[str, Any]]) -> List[bool]:
+        """
+        This method is the batch counterpart of startSearchProcess. The searches of all cloud events are sent to
+        Elasticsearch in a single _msearch round trip, then every response is transformed and pushed on its own, so
+        a failed search or push only fails its cloud event. A cloud event no query can be built from fails without
+        being searched.
+
+        Parameters
+        ----------
+        queryCloudEvents: list of dict
+            The cloudevents with the taxonomy details required to prepare the search Queries
+
+        Return
+        ------
+        list of bool
+            Whether the data insertion of every cloud event was successful, in cloud event order.
+        """
+        if not queryCloudEvents:
+            return []
+        with self.instrumentedRun('startBatchProcess'):
+            dataFetchResponses = self.elasticsearchHandler().multiFetch(
+                queries=[self.elasticsearchQueryBuilder(queryCloudEvent) for queryCloudEvent in queryCloudEvents],
+                source=self.sourceFields(),
+                size=self.params['fetch']['searchSize'],
+                maxConcurrentSearches=self.params['fetch']['maxConcurrentSearches'],
+            )
+            neo4jHandler = self.neo4jHandler()
+            dataPushResponses = []
+            for dataFetchResponse in dataFetchResponses:
+                if 'error' in dataFetchResponse:
+                    dataPushResponses.append(False)
+                    continue
+                try:
+                    dataPushResponses.append(neo4jHandler.dataPush(queriesParams=self.neo4jQueryBuilder(dataFetchResponse)))
+                except Exception as e:
+                    logger.error(f"Failed to push the graph data of a batched cloud event: {e}")
+                    dataPushResponses.append(False)
+            return dataPushResponses
+
+    def watermarkQuery(self, query: Dict[str, Any], field: str, watermark: Any) -> Dict[str, Any]:
+        """
+        Restricts a query to the documents whose watermark field is at or after the last committed watermark.
+        Documents sharing the watermark value of the last committed batch are fetched again, which MERGE makes harmless.
+
+        Parameters
+        ----------
+        query : dict
+            A dictionary containing the Elasticsearch query parameters.
+        field : str
+            The watermark field, e.g. '@timestamp'.
+        watermark : any or None
+            The last committed watermark. The query is returned unchanged when None.
+
+        Returns
+        -------
+        dict
+            A dictionary containing the Elasticsearch query parameters.
+        """
+        if watermark is None:
+            return query
+        rangeQuery = {"range": {field: {"gte": watermark}}}
+        return {"bool": {"must": [query] if query else [], "filter": [rangeQuery]}}
+
+    def incrementalSourceFields(self, field: str) -> Optional[List[str]]:
+        sourceFields = self.sourceFields()
+        return None if sourceFields is None else sourceFields + [field]
+
+    def startIncrementalProcess(self, queryCloudEvent):
+        """
+        This method is a runner function that only syncs the documents changed since its last successful run. Hits
+        are streamed in watermark order and pushed one page at a time; the watermark of every page is checkpointed
+        once Neo4j committed it, so a crashed run resumes from its last committed page.
+
+        Parameters
+        ----------
+        queryCloudEvent: dict
+            This cloudevent has taxonomy details required to prepare a search Query to fetch data
+
+        Return
+        ------
+        bool
+            A boolean indicating whether the data insertion was successful.
+        """
+        field = self.params['incremental']['field']
+        query = self.eventQuery(queryCloudEvent, 'startIncrementalProcess')
+        if query is None:
+            return False
+        if self.checkpoints is None:
+            self.checkpoints = CheckpointStore(self.params['incremental']['checkpointPath'])
+
+        esHandler = self.elasticsearchHandler()
+        neo4jHandler = self.neo4jHandler()
+        watermark = self.checkpoints.load(esHandler.index, query)
+        logger.info(f"Starting incremental sync of {esHandler.index} from {field} {watermark}")
+
+        with self.instrumentedRun('startIncrementalProcess'):
+            pages = esHandler.dataStream(
+                query=self.watermarkQuery(query, field, watermark),
+                pageSize=self.params['fetch']['pageSize'],
+                keepAlive=self.params['fetch']['keepAlive'],
+                sort=[{field: 'asc'}, {'_shard_doc': 'asc'}],
+                source=self.incrementalSourceFields(field),
+            )
+            for hits in pages:
+                if not neo4jHandler.dataPush(queriesParams=self.neo4jQueryBuilder([hits])):
+                    pages.close()
+                    return False
+                lastHit = hits[-1]
+                watermark = lastHit['sort'][0] if lastHit.get('sort') else lastHit['_source'][field]
+                self.checkpoints.save(esHandler.index, query, watermark)
+            return True
+
+    def exportBulk(self, queryCloudEvent, outputDir: str) -> Dict[str, int]:
+        """
+        This method is a runner function that writes the graph data as neo4j-admin import CSV files instead of pushing
+        it to Neo4j, for the initial load of a cold graph. Later deltas go through startProcess as usual.
+
+        Parameters
+        ----------
+        queryCloudEvent: dict
+            This cloudevent has taxonomy details required to prepare a search Query to fetch data
+        outputDir: str
+            The directory the CSV files are written to.
+
+        Return
+        ------
+        dict
+            The number of nodes and relationships written, deduplicated and skipped.
+        """
+        query = self.eventQuery(queryCloudEvent, 'exportBulk')
+        if query is None:
+            raise Exception(f"No Elasticsearch query could be built from the cloud event {queryCloudEvent}")
+        propMap = self.neo4jParams.get('propMap', {})
+        nodeProps = self.neo4jParams.get('fromProps', []) + self.neo4jParams.get('toProps', [])
+        exporter = Neo4jBulkExporter(
+            outputDir=outputDir,
+            nodeProperties=sorted({propMap.get(prop, prop) for prop in nodeProps}),
+            relationshipProperties=sorted({propMap.get(prop, prop) for prop in self.neo4jParams.get('relationshipProps', [])}),
+            keyProps=self.params['properties'],
+            logger=logger,
+        )
+        try:
+            with self.instrumentedRun('exportBulk'):
+                stats = exporter.write(self.neo4jQueryBuilder(self.fetchPages(self.elasticsearchHandler(), query)))
+        finally:
+            exporter.close()
+        logger.info(f"Exported {stats['nodes']} nodes and {stats['relationships']} relationships, import with: {exporter.importCommand()}")
+        return stats
+
+    def startPipelinedProcess(self, queryCloudEvent):
+        """
+        This method is a runner function that overlaps the Elasticsearch reads, the document transform and the Neo4j
+        writes. Each stage runs on its own thread and hands its output to the next one through a bounded queue, so
+        memory is capped by params['pipeline']['queueSize'] pages and the reader is held back when Neo4j falls behind.
+
+        Parameters
+        ----------
+        queryCloudEvent: dict
+            This cloudevent has taxonomy details required to prepare a search Query to fetch data
+
+        Return
+        ------
+        bool
+            A boolean indicating whether the data insertion was successful.
+        """
+        query = self.eventQuery(queryCloudEvent, 'startPipelinedProcess')
+        if query is None:
+            return False
+        queueSize = self.params['pipeline']['queueSize']
+        with self.instrumentedRun('startPipelinedProcess'):
+            reader = BoundedStage(
+                self.fetchPages(self.elasticsearchHandler(), query),
+                maxsize=queueSize,
+                name='elasticsearch-reader',
+            )
+            transformer = BoundedStage(
+                reader,
+                transform=lambda hits: list(self.neo4jQueryBuilder([hits])),
+                maxsize=queueSize,
+                name='document-transformer',
+            )
+
+            def queriesParams():
+                for rows in transformer:
+                    self.observeQueueDepths(reader, transformer)
+                    yield from rows
+
+            try:
+                return self.neo4jHandler().dataPush(queriesParams=queriesParams())
+            finally:
+                transformer.close()
+
+    def observeQueueDepths(self, *stages: BoundedStage) -> None:
+        """
+        Records the number of items buffered by every stage. A full queue in front of a stage means the stage is
+        the bottleneck, an empty one that it is starved by the stages upstream.
+        """
+        if self.metrics is None:
+            return
+        for stage in stages:
+            depth = stage.depth()
+            self.metrics.observe('queue_depth', depth, buckets=DEPTH_BUCKETS, stage=stage.thread.name)
+            self.metrics.setGauge('queue_depth_current', depth, stage=stage.thread.name)
+
+
+    async def startProcessAsync(self, queryCloudEvent):
+        """
+        This method is the asyncio counterpart of startProcess. Both network clients are asynchronous, so a single
+        event loop can drive many syncs concurrently while each one awaits Elasticsearch or Neo4j.
+
+        Parameters
+        ----------
+        queryCloudEvent: dict
+            This cloudevent has taxonomy details required to prepare a search Query to fetch data
+
+        Return
+        ------
+        bool
+            A boolean indicating whether the data insertion was successful.
+        """
+        query = self.eventQuery(queryCloudEvent, 'startProcessAsync')
+        if query is None:
+            return False
+        esHandler = self.elasticsearchHandler(handlerClass=AsyncElasticsearchHandler)
+        neo4jHandler = self.neo4jHandler(handlerClass=AsyncNeo4jHandler)
+        try:
+            with self.instrumentedRun('startProcessAsync', scoped=True):
+                pages = self.fetchPages(esHandler, query)
+                return await neo4jHandler.dataPush(queriesParams=self.neo4jQueryBuilderAsync(pages))
+        finally:
+            await esHandler.close()
+            await neo4jHandler.close()
+
+    async def neo4jQueryBuilderAsync(self, pages) -> AsyncGenerator[Dict[str, Any], None]:
+        """
+        This function transforms an async stream of hit pages into graph data, one page at a time.
+
+        Parameters
+        ----------
+        pages : async iterable of list
+            The hit pages, such as the ones returned by AsyncElasticsearchHandler.dataStream.
+
+        Yields
+        ------
+        dict
+            A dictionary containing the data required to create nodes and edges in Neo4j database.
+        """
+        async for hits in pages:
+            for queryParams in self.neo4jQueryBuilder([hits]):
+                yield queryParams
+
+
+if __name__ == '__main__':
+    import sys
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Maintenance commands of the Elasticsearch to Neo4j sync')
+    parser.add_argument('command', choices=['replay'], help='replay: commit the Neo4j batches left in the spool by failed pushes')
+    parser.parse_args()
+    sys.exit(0 if ElasticsearchToNeo4jSync().startReplayProcess() else 1)
@@ -0,0 +1,528 @@
+import re
+import time
+import random
+import asyncio
+import itertools
+from threading import Condition
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from neo4j.exceptions import Neo4jError, TransientError
+
+NodeId = Tuple[str, Tuple[Tuple[str, Any], ...]]
+RelationshipId = Tuple[NodeId, str, NodeId]
+
+NODE_PATTERN = re.compile(r"^\((\w+):`([^`]+)`\s*\{(.*)\}\)$")
+RELATIONSHIP_PATTERN = re.compile(r"^\((\w+)\)-\[(\w+):`([^`]+)`\]->\((\w+)\)$")
+PROPERTY_PATTERN = re.compile(r"`([^`]+)`:\s*(\w+(?:\.`?[^`.,\s]+`?)*)")
+SET_PATTERN = re.compile(r"^(\w+)\s*\+=\s*(\w+(?:\.`?[^`.,\s]+`?)*)$")
+SCHEMA_PATTERN = re.compile(r"FOR \(n:`([^`]+)`\) (?:REQUIRE|ON) \((.+?)\)")
+CLAUSE_PATTERN = re.compile(r"\b(MERGE|MATCH|SET)\s+")
+
+
+def neo4jError(code: str, message: str) -> Neo4jError:
+    """
+    Creates the driver's exception for a Neo4j status code, e.g. a TransientError for a detected deadlock.
+    """
+    try:
+        return Neo4jError._hydrate_neo4j(code=code, message=message)
+    except AttributeError:
+        return TransientError(message)
+
+
+class Statement():
+    __slots__ = ('rowsParam', 'rowName', 'clauses')
+
+    def __init__(self, text: str) -> None:
+        """
+        Compiles an UNWIND statement of MERGE and MATCH clauses on node patterns keyed by row values, MERGE clauses
+        on relationships between bound nodes and SET v += row.map clauses, the statements written by Neo4jHandler.
+
+        Parameters
+        ----------
+        text : str
+            The Cypher statement.
+        """
+        unwind = re.match(r"^\s*UNWIND \$(\w+) AS (\w+)\s+(.*)$", text, re.S)
+        if unwind is None:
+            raise Exception(f"FakeNeo4jDriver only runs UNWIND statements, not: {text}")
+        self.rowsParam, self.rowName, body = unwind.groups()
+        parts = CLAUSE_PATTERN.split(body)[1:]
+        self.clauses = []
+        for keyword, clause in zip(parts[::2], parts[1::2]):
+            clause = clause.strip()
+            if keyword == 'SET':
+                match = SET_PATTERN.match(clause)
+                if match is None:
+                    raise Exception(f"FakeNeo4jDriver does not support SET {clause}")
+                self.clauses.append(('SET', match.group(1), self.path(match.group(2))))
+                continue
+            node = NODE_PATTERN.match(clause)
+            if node is not None:
+                variable, label, properties = node.groups()
+                keys = tuple((key, self.path(expression)) for key, expression in PROPERTY_PATTERN.findall(properties))
+                self.clauses.append((keyword, variable, label, keys))
+                continue
+            relationship = RELATIONSHIP_PATTERN.match(clause)
+            if relationship is not None and keyword == 'MERGE':
+                self.clauses.append(('MERGE_RELATIONSHIP',) + relationship.groups())
+                continue
+            raise Exception(f"FakeNeo4jDriver does not support {keyword} {clause}")
+
+    def path(self, expression: str) -> Tuple[str, ...]:
+        names = tuple(name.strip('`') for name in expression.split('.'))
+        if names[0] != self.rowName:
+            raise Exception(f"FakeNeo4jDriver only reads properties of {self.rowName}, not {expression}")
+        return names[1:]
+
+    @staticmethod
+    def value(row: Dict[str, Any], path: Tuple[str, ...]) -> Any:
+        for name in path:
+            row = row.get(name) if isinstance(row, dict) else None
+        return row
+
+    def nodeIds(self, rows: List[Dict[str, Any]]) -> List[NodeId]:
+        """
+        Returns the distinct nodes the rows lock, in the order the statement reaches them.
+        """
+        nodeIds = {}
+        for row in rows:
+            for clause in self.clauses:
+                if clause[0] in ('MERGE', 'MATCH'):
+                    nodeIds[self.nodeId(clause, row)] = None
+        return list(nodeIds)
+
+    def nodeId(self, clause, row: Dict[str, Any]) -> NodeId:
+        _, _, label, keys = clause
+        return label, tuple((key, self.value(row, path)) for key, path in keys)
+
+
+class FakeGraph():
+    def __init__(self) -> None:
+        """
+        The in-memory node and relationship store of a FakeNeo4jDriver, with the node locks of its transactions.
+        Nodes are identified by label and key properties, relationships by their end nodes and type.
+        """
+        self.nodes: Dict[NodeId, Dict[str, Any]] = {}
+        self.relationships: Dict[RelationshipId, Dict[str, Any]] = {}
+        self.indexes: List[Dict[str, Any]] = []
+        self.locks: Dict[NodeId, int] = {}
+        self.waiting: Dict[int, int] = {}
+        self.condition = Condition()
+
+    def tryLock(self, txId: int, nodeId: NodeId) -> Optional[int]:
+        """
+        Takes the lock of a node for a transaction, or returns the transaction holding it. Raises a DeadlockDetected
+        TransientError when waiting would close a cycle of transactions waiting on each other.
+        """
+        with self.condition:
+            holder = self.locks.setdefault(nodeId, txId)
+            if holder == txId:
+                self.waiting.pop(txId, None)
+                return None
+            waitee = holder
+            while waitee in self.waiting:
+                waitee = self.waiting[waitee]
+                if waitee == txId:
+                    self.waiting.pop(txId, None)
+                    raise neo4jError('Neo.TransientError.Transaction.DeadlockDetected', f"Transaction {txId} and transaction {holder} wait on each other's locks")
+            self.waiting[txId] = holder
+            return holder
+
+    def release(self, txId: int) -> None:
+        with self.condition:
+            self.waiting.pop(txId, None)
+            for nodeId in [nodeId for nodeId, holder in self.locks.items() if holder == txId]:
+                del self.locks[nodeId]
+            self.condition.notify_all()
+
+    def write(self, statement: Statement, rows: List[Dict[str, Any]], undo: List[Tuple]) -> Dict[str, int]:
+        """
+        Applies a compiled statement to every row, logging the previous state of every changed entity for rollback.
+        The transaction must hold the locks of the rows' nodes.
+
+        Returns
+        -------
+        dict
+            The nodes and relationships created and the properties set.
+        """
+        counters = {'nodes_created': 0, 'relationships_created': 0, 'properties_set': 0}
+        with self.condition:
+            for row in rows:
+                bound: Dict[str, Tuple[Dict, Any]] = {}
+                for clause in statement.clauses:
+                    kind = clause[0]
+                    if kind in ('MERGE', 'MATCH'):
+                        nodeId = statement.nodeId(clause, row)
+                        if nodeId not in self.nodes:
+                            if kind == 'MATCH':
+                                break
+                            undo.append((self.nodes, nodeId, None))
+                            self.nodes[nodeId] = dict(nodeId[1])
+                            counters['nodes_created'] += 1
+                            counters['properties_set'] += len(nodeId[1])
+                        bound[clause[1]] = (self.nodes, nodeId)
+                    elif kind == 'MERGE_RELATIONSHIP':
+                        _, fromVariable, variable, relationshipType, toVariable = clause
+                        relationshipId = (bound[fromVariable][1], relationshipType, bound[toVariable][1])
+                        if relationshipId not in self.relationships:
+                            undo.append((self.relationships, relationshipId, None))
+                            self.relationships[relationshipId] = {}
+                            counters['relationships_created'] += 1
+                        bound[variable] = (self.relationships, relationshipId)
+                    else:
+                        _, variable, path = clause
+                        store, entityId = bound[variable]
+                        props = statement.value(row, path) or {}
+                        undo.append((store, entityId, dict(store[entityId])))
+                        store[entityId].update(props)
+                        counters['properties_set'] += len(props)
+        return counters
+
+    def undo(self, undo: List[Tuple]) -> None:
+        with self.condition:
+            for store, entityId, previous in reversed(undo):
+                if previous is None:
+                    store.pop(entityId, None)
+                else:
+                    store[entityId] = previous
+
+    def schema(self, statement: str) -> List[Dict[str, Any]]:
+        """
+        Runs a schema statement: constraints and indexes come online at once.
+        """
+        if statement.startswith('SHOW INDEXES'):
+            return [dict(index) for index in self.indexes]
+        match = SCHEMA_PATTERN.search(statement)
+        if statement.startswith('CREATE') and match is not None:
+            label, properties = match.groups()
+            index = {'labelsOrTypes': [label], 'properties': re.findall(r"n\.`([^`]+)`", properties), 'state': 'ONLINE'}
+            with self.condition:
+                if index not in self.indexes:
+                    self.indexes.append(index)
+        return []
+
+
+class FakeNeo4jDriver():
+    def __init__(self, latency: float = 0.0, rowLatency: float = 0.0, conflictRate: float = 0.0, lockTimeout: float = 1.0,
+                 memoryLimitRows: Optional[int] = None, maxTransactionRetryTime: float = 0.0, seed: int = 0) -> None:
+        """
+        In-process stand-in for the Neo4j driver implementing the session, transaction and run surface used by
+        Neo4jHandler. Statements are applied with MERGE semantics to an in-memory graph, so batch sizes, concurrency
+        and retry policies can be benchmarked and checked for correctness without a database.
+
+        Every transaction locks the nodes its rows touch until it commits or rolls back. A transaction waiting for a
+        lock that would never be released fails with a DeadlockDetected TransientError, like Neo4j does.
+
+        Parameters
+        ----------
+        latency : float
+            The seconds of every round trip, i.e. every run and commit. Defaults to 0.
+        rowLatency : float
+            The seconds of server work per row, spent while holding the locks. Defaults to 0.
+        conflictRate : float
+            The probability of a run failing with a lock TransientError caused by other clients. Defaults to 0.
+        lockTimeout : float
+            The seconds a transaction waits for a lock before failing with a TransientError. Defaults to 1.
+        memoryLimitRows : int or None
+            The number of rows a transaction can write before failing with a MemoryPoolOutOfMemoryError, mimicking
+            dbms.memory.transaction.total.max. Defaults to no limit.
+        maxTransactionRetryTime : float
+            The seconds execute_write retries transient errors, like the driver's max_transaction_retry_time. The
+            real driver defaults to 30; 0 leaves the retries to the caller. Defaults to 0.
+        seed : int
+            The seed of the simulated conflicts. Defaults to 0.
+        """
+        self.graph = FakeGraph()
+        self.latency = latency
+        self.rowLatency = rowLatency
+        self.conflictRate = conflictRate
+        self.lockTimeout = lockTimeout
+        self.memoryLimitRows = memoryLimitRows
+        self.maxTransactionRetryTime = maxTransactionRetryTime
+        self.random = random.Random(seed)
+        self.statements: Dict[str, Statement] = {}
+        self.transactionIds = itertools.count(1)
+        self.stats = {'roundTrips': 0, 'rows': 0, 'commits': 0, 'rollbacks': 0, 'conflicts': 0, 'deadlocks': 0}
+
+    def session(self, **config) -> 'FakeSession':
+        return FakeSession(self)
+
+    def close(self) -> None:
+        pass
+
+    def verify_connectivity(self, **config) -> None:
+        pass
+
+    def count(self, stat: str, amount: int = 1) -> None:
+        with self.graph.condition:
+            self.stats[stat] += amount
+
+    def compile(self, text: str) -> Statement:
+        statement = self.statements.get(text)
+        if statement is None:
+            statement = self.statements[text] = Statement(text)
+        return statement
+
+    def conflict(self) -> bool:
+        with self.graph.condition:
+            return self.conflictRate > 0 and self.random.random() < self.conflictRate
+
+    def nodeCount(self, label: Optional[str] = None) -> int:
+        return sum(1 for nodeLabel, _ in self.graph.nodes if label is None or nodeLabel == label)
+
+    def relationshipCount(self, relationshipType: Optional[str] = None) -> int:
+        return sum(1 for _, edgeType, _ in self.graph.relationships if relationshipType is None or edgeType == relationshipType)
+
+    def node(self, label: str, **keys) -> Optional[Dict[str, Any]]:
+        """
+        Returns the properties of the node with the label and key properties, or None.
+        """
+        return self.graph.nodes.get((label, tuple(keys.items())))
+
+
+class FakeSummary():
+    def __init__(self, counters: Dict[str, int]) -> None:
+        self.counters = counters
+
+
+class FakeResult():
+    def __init__(self, records: List[Dict[str, Any]], counters: Optional[Dict[str, int]] = None) -> None:
+        self.records = records
+        self.summary = FakeSummary(counters or {})
+
+    def consume(self) -> FakeSummary:
+        return self.summary
+
+    def data(self) -> List[Dict[str, Any]]:
+        return self.records
+
+
+class FakeTransaction():
+    def __init__(self, driver: FakeNeo4jDriver) -> None:
+        self.driver = driver
+        self.id = next(driver.transactionIds)
+        self.undo: List[Tuple] = []
+        self.rows = 0
+        self.closed = False
+
+    def roundTrip(self, seconds: float = 0.0) -> None:
+        self.driver.count('roundTrips')
+        if self.driver.latency + seconds > 0:
+            time.sleep(self.driver.latency + seconds)
+
+    def lock(self, nodeIds: List[NodeId]) -> None:
+        graph = self.driver.graph
+        for nodeId in nodeIds:
+            deadline = time.monotonic() + self.driver.lockTimeout
+            with graph.condition:
+                while self.tryLock(nodeId) is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        graph.waiting.pop(self.id, None)
+                        raise neo4jError('Neo.TransientError.Transaction.LockAcquisitionTimeout', f"Transaction {self.id} timed out waiting for a lock on {nodeId}")
+                    graph.condition.wait(remaining)
+
+    def tryLock(self, nodeId: NodeId) -> Optional[int]:
+        try:
+            return self.driver.graph.tryLock(self.id, nodeId)
+        except TransientError:
+            self.driver.count('deadlocks')
+            raise
+
+    def prepare(self, text: str, parameters: Dict[str, Any]) -> Tuple[Optional[Statement], List[Dict[str, Any]]]:
+        """
+        Compiles a data statement and checks the simulated failures. Schema statements return no statement.
+        """
+        if text.startswith(('CREATE', 'SHOW', 'CALL')):
+            return None, []
+        statement = self.driver.compile(text)
+        rows = parameters.get(statement.rowsParam) or []
+        if self.driver.conflict():
+            self.driver.count('conflicts')
+            raise neo4jError('Neo.TransientError.Transaction.LockAcquisitionTimeout', f"Transaction {self.id} lost a lock to another client")
+        self.rows += len(rows)
+        if self.driver.memoryLimitRows is not None and self.rows > self.driver.memoryLimitRows:
+            raise neo4jError('Neo.TransientError.General.MemoryPoolOutOfMemoryError', f"Transaction {self.id} exceeded the memory limit with {self.rows} rows")
+        return statement, rows
+
+    def run(self, text: str, parameters: Optional[Dict[str, Any]] = None, **kwargs) -> FakeResult:
+        statement, rows = self.prepare(text, {**(parameters or {}), **kwargs})
+        if statement is None:
+            self.roundTrip()
+            return FakeResult(self.driver.graph.schema(text))
+        self.lock(statement.nodeIds(rows))
+        self.roundTrip(self.driver.rowLatency * len(rows))
+        counters = self.driver.graph.write(statement, rows, self.undo)
+        self.driver.count('rows', len(rows))
+        return FakeResult([], counters)
+
+    def commit(self) -> None:
+        if self.closed:
+            return
+        self.roundTrip()
+        self.closed = True
+        self.driver.graph.release(self.id)
+        self.driver.count('commits')
+
+    def rollback(self) -> None:
+        if self.closed:
+            return
+        self.closed = True
+        self.driver.graph.undo(self.undo)
+        self.driver.graph.release(self.id)
+        self.driver.count('rollbacks')
+
+    def close(self) -> None:
+        self.rollback()
+
+
+class FakeSession():
+    def __init__(self, driver: FakeNeo4jDriver) -> None:
+        self.driver = driver
+
+    def __enter__(self) -> 'FakeSession':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        pass
+
+    def begin_transaction(self, **config) -> FakeTransaction:
+        return FakeTransaction(self.driver)
+
+    def run(self, text: str, parameters: Optional[Dict[str, Any]] = None, **kwargs) -> FakeResult:
+        tx = FakeTransaction(self.driver)
+        try:
+            result = tx.run(text, parameters, **kwargs)
+        except Exception:
+            tx.rollback()
+            raise
+        tx.commit()
+        return result
+
+    def execute_write(self, work: Callable, *args, **kwargs) -> Any:
+        deadline = time.monotonic() + self.driver.maxTransactionRetryTime
+        delay = 0.001
+        while True:
+            tx = FakeTransaction(self.driver)
+            try:
+                result = work(tx, *args, **kwargs)
+                tx.commit()
+                return result
+            except TransientError:
+                tx.rollback()
+                if time.monotonic() + delay > deadline:
+                    raise
+                time.sleep(delay)
+                delay *= 2
+            except Exception:
+                tx.rollback()
+                raise
+
+
+class AsyncFakeNeo4jDriver(FakeNeo4jDriver):
+    """
+    Asyncio variant of FakeNeo4jDriver for AsyncNeo4jHandler. Round trips and lock waits await instead of blocking,
+    so concurrent writer tasks interleave on one event loop.
+    """
+
+    def session(self, **config) -> 'AsyncFakeSession':
+        return AsyncFakeSession(self)
+
+    async def close(self) -> None:
+        pass
+
+    async def verify_connectivity(self, **config) -> None:
+        pass
+
+
+class AsyncFakeResult(FakeResult):
+    async def consume(self) -> FakeSummary:
+        return self.summary
+
+    async def data(self) -> List[Dict[str, Any]]:
+        return self.records
+
+
+class AsyncFakeTransaction(FakeTransaction):
+    async def roundTrip(self, seconds: float = 0.0) -> None:
+        self.driver.count('roundTrips')
+        await asyncio.sleep(self.driver.latency + seconds)
+
+    async def lock(self, nodeIds: List[NodeId]) -> None:
+        for nodeId in nodeIds:
+            deadline = time.monotonic() + self.driver.lockTimeout
+            while self.tryLock(nodeId) is not None:
+                if time.monotonic() >= deadline:
+                    self.driver.graph.waiting.pop(self.id, None)
+                    raise neo4jError('Neo.TransientError.Transaction.LockAcquisitionTimeout', f"Transaction {self.id} timed out waiting for a lock on {nodeId}")
+                await asyncio.sleep(0.001)
+
+    async def run(self, text: str, parameters: Optional[Dict[str, Any]] = None, **kwargs) -> AsyncFakeResult:
+        statement, rows = self.prepare(text, {**(parameters or {}), **kwargs})
+        if statement is None:
+            await self.roundTrip()
+            return AsyncFakeResult(self.driver.graph.schema(text))
+        await self.lock(statement.nodeIds(rows))
+        await self.roundTrip(self.driver.rowLatency * len(rows))
+        counters = self.driver.graph.write(statement, rows, self.undo)
+        self.driver.count('rows', len(rows))
+        return AsyncFakeResult([], counters)
+
+    async def commit(self) -> None:
+        if self.closed:
+            return
+        await self.roundTrip()
+        self.closed = True
+        self.driver.graph.release(self.id)
+        self.driver.count('commits')
+
+    async def rollback(self) -> None:
+        FakeTransaction.rollback(self)
+
+    async def close(self) -> None:
+        await self.rollback()
+
+
+class AsyncFakeSession(FakeSession):
+    async def __aenter__(self) -> 'AsyncFakeSession':
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+    async def begin_transaction(self, **config) -> AsyncFakeTransaction:
+        return AsyncFakeTransaction(self.driver)
+
+    async def run(self, text: str, parameters: Optional[Dict[str, Any]] = None, **kwargs) -> AsyncFakeResult:
+        tx = AsyncFakeTransaction(self.driver)
+        try:
+            result = await tx.run(text, parameters, **kwargs)
+        except Exception:
+            await tx.rollback()
+            raise
+        await tx.commit()
+        return result
+
+    async def execute_write(self, work: Callable, *args, **kwargs) -> Any:
+        deadline = time.monotonic() + self.driver.maxTransactionRetryTime
+        delay = 0.001
+        while True:
+            tx = AsyncFakeTransaction(self.driver)
+            try:
+                result = await work(tx, *args, **kwargs)
+                await tx.commit()
+                return result
+            except TransientError:
+                await tx.rollback()
+                if time.monotonic() + delay > deadline:
+                    raise
+                await asyncio.sleep(delay)
+                delay *= 2
+            except Exception:
+                await tx.rollback()
+                raise
@@ -0,0 +1,148 @@
+import json
+from threading import local
+from typing import Any, Dict, Iterable, Optional, Tuple
+from elasticsearch.serializer import JsonSerializer
+from elastic_transport import SerializationError
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import simdjson
+except ImportError:
+    simdjson = None
+
+
+class FastJsonSerializer(JsonSerializer):
+    """
+    JSON serializer of the Elasticsearch transport decoding responses with orjson instead of the json module.
+
+    With source fields and pysimdjson installed, search responses are parsed lazily instead: the hits are walked on
+    the raw response bytes and only their metadata and the mapped _source fields are turned into Python objects, so
+    unmapped fields of large documents are never materialized. Every other response is decoded in full.
+    """
+
+    def __init__(self, sourceFields: Optional[Iterable[str]] = None) -> None:
+        """
+        Parameters
+        ----------
+        sourceFields : iterable of str or None
+            The _source fields to materialize, as 'field' or 'field.key' paths, e.g. ['vendor.answer', 'vendor.score'].
+            None materializes every field.
+        """
+        self.sourceFields = tuple(sorted(sourceFields)) if sourceFields is not None else None
+        self.sourceTree = self.buildSourceTree(self.sourceFields) if self.sourceFields is not None else None
+        self.parsers = local()
+
+    def __repr__(self) -> str:
+        # the client registry keys shared clients on their parameters, so equal configurations share a client
+        return f"FastJsonSerializer(sourceFields={self.sourceFields})"
+
+    @staticmethod
+    def buildSourceTree(sourceFields: Tuple[str, ...]) -> Dict[str, Optional[Tuple[str, ...]]]:
+        """
+        Groups the source fields by top-level field. A field mapped as a whole maps to None, otherwise to its keys.
+        """
+        tree: Dict[str, Optional[set]] = {}
+        for sourceField in sourceFields:
+            field, _, key = sourceField.partition('.')
+            if not key or (field in tree and tree[field] is None):
+                tree[field] = None
+            else:
+                tree.setdefault(field, set()).add(key)
+        return {field: None if keys is None else tuple(sorted(keys)) for field, keys in tree.items()}
+
+    @property
+    def lazy(self) -> bool:
+        return simdjson is not None and self.sourceTree is not None
+
+    def dumps(self, data: Any) -> bytes:
+        if orjson is None or isinstance(data, (str, bytes)):
+            return super().dumps(data)
+        try:
+            return orjson.dumps(data, default=self.default)
+        except TypeError as e:
+            raise SerializationError(message=f"Unable to serialize to JSON: {data!r} (type: {type(data).__name__})", errors=(e,))
+
+    def loads(self, data: bytes) -> Any:
+        if data == b"":
+            return None
+        try:
+            if self.lazy:
+                return self.lazyLoads(data)
+            if orjson is not None:
+                return orjson.loads(data)
+            return json.loads(data)
+        except (ValueError, TypeError) as e:
+            raise SerializationError(message=f"Unable to deserialize as JSON: {data!r}", errors=(e,))
+
+    def parser(self):
+        # a simdjson parser holds a single document at a time, so every thread gets its own
+        parser = getattr(self.parsers, 'parser', None)
+        if parser is None:
+            parser = self.parsers.parser = simdjson.Parser()
+        return parser
+
+    @staticmethod
+    def plain(value: Any) -> Any:
+        if isinstance(value, simdjson.Object):
+            return value.as_dict()
+        if isinstance(value, simdjson.Array):
+            return value.as_list()
+        return value
+
+    def lazyLoads(self, data: bytes) -> Any:
+        """
+        Decodes a response, walking the hits of search responses on the raw bytes.
+
+        Parameters
+        ----------
+        data : bytes
+            The raw response body.
+
+        Returns
+        -------
+        any
+            The decoded response, with only the mapped _source fields of every hit.
+        """
+        document = self.parser().parse(data)
+        if not isinstance(document, simdjson.Object) or not isinstance(document.get('hits'), simdjson.Object):
+            return self.plain(document)
+        # items() would materialize the skipped values, so every other key is looked up on its own
+        response = {key: self.plain(document[key]) for key in document.keys() if key != 'hits'}
+        hits = document['hits']
+        response['hits'] = {key: self.plain(hits[key]) for key in hits.keys() if key != 'hits'}
+        response['hits']['hits'] = [self.hit(hit) for hit in hits.get('hits') or []]
+        return response
+
+    def hit(self, hit) -> Dict[str, Any]:
+        materialized = {key: self.plain(hit[key]) for key in hit.keys() if key != '_source'}
+        source = hit.get('_source')
+        if source is not None:
+            materialized['_source'] = self.project(source)
+        return materialized
+
+    def project(self, source) -> Dict[str, Any]:
+        """
+        Materializes the mapped fields of a lazily parsed _source. Entity lists keep only the mapped keys of every
+        entity, which are looked up on the lazy entities so their unmapped keys are never materialized.
+        """
+        projected = {}
+        for field, keys in self.sourceTree.items():
+            value = source.get(field)
+            if value is None:
+                continue
+            if keys is None:
+                projected[field] = self.plain(value)
+            elif isinstance(value, simdjson.Array):
+                projected[field] = [self.entity(entity, keys) for entity in value]
+            else:
+                projected[field] = self.entity(value, keys)
+        return projected
+
+    def entity(self, entity: Any, keys: Tuple[str, ...]) -> Any:
+        if not isinstance(entity, simdjson.Object):
+            return self.plain(entity)
+        return {key: self.plain(entity[key]) for key in keys if key in entity}
@@ -0,0 +1,183 @@
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# the key holding the extracted value of an entity, e.g. {'answer': 'Acme', 'score': 0.95}
+ENTITY_VALUE = 'answer'
+
+
+class DyadSpec():
+    """
+    One compiled from → to mapping of the neo4j parameters. Types, relationship and property key pairs are resolved
+    once, so applying the spec to a document is a handful of tuple walks and no configuration lookups.
+    """
+    __slots__ = ('fromKey', 'fromType', 'fromProps', 'toKey', 'toType', 'toProps', 'relationshipType', 'relationshipProps')
+
+    def __init__(self, fromKey: str, fromType: str, fromProps: Tuple[Tuple[str, str], ...],
+                 toKey: str, toType: str, toProps: Tuple[Tuple[str, str], ...],
+                 relationshipType: str, relationshipProps: Tuple[Tuple[str, str], ...]) -> None:
+        self.fromKey = fromKey
+        self.fromType = fromType
+        self.fromProps = fromProps
+        self.toKey = toKey
+        self.toType = toType
+        self.toProps = toProps
+        self.relationshipType = relationshipType
+        self.relationshipProps = relationshipProps
+
+    def __getstate__(self):
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+    def __setstate__(self, state):
+        for slot, value in state.items():
+            setattr(self, slot, value)
+
+    def __repr__(self) -> str:
+        return f"DyadSpec({self.fromKey} -[{self.relationshipType}]-> {self.toKey})"
+
+    @staticmethod
+    def entityProps(entity: Dict[str, Any], pairs: Tuple[Tuple[str, str], ...]) -> Dict[str, Any]:
+        return {target: entity[source] for source, target in pairs if source in entity}
+
+    def edgeProps(self, doc: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Returns the relationship properties of a document. A property holds the value of its entity, or the list of
+        values when the document has several entities for it.
+        """
+        props = {}
+        for source, target in self.relationshipProps:
+            values = [entity.get(ENTITY_VALUE) for entity in doc.get(source) or []]
+            if values:
+                props[target] = values[0] if len(values) == 1 else values
+        return props
+
+    def dyad(self, fromEntity: Dict[str, Any], toEntity: Dict[str, Any], edgeProps: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            'fromType': self.fromType,
+            'toType': self.toType,
+            'edgeType': self.relationshipType,
+            'fromProps': self.entityProps(fromEntity, self.fromProps),
+            'toProps': self.entityProps(toEntity, self.toProps),
+            'edgeProps': edgeProps,
+        }
+
+    def apply(self, doc: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Builds the graph data of the spec from the first entities of a document.
+
+        Parameters
+        ----------
+        doc : dict
+            The document containing the data for the nodes and edges.
+
+        Returns
+        -------
+        dict or None
+            A dictionary containing the data required to create nodes and edges in Neo4j database, or None when the
+            document has no entity for the start or end node.
+        """
+        fromEntities = doc.get(self.fromKey) or []
+        toEntities = doc.get(self.toKey) or []
+        if not fromEntities or not toEntities:
+            return None
+        return self.dyad(fromEntities[0], toEntities[0], self.edgeProps(doc))
+
+    def expand(self, doc: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        """
+        Builds the graph data of the spec for every pair of start and end entities of a document.
+
+        Parameters
+        ----------
+        doc : dict
+            The document containing the data for the nodes and edges.
+
+        Yields
+        ------
+        dict
+            A dictionary containing the data required to create nodes and edges in Neo4j database.
+        """
+        fromEntities = doc.get(self.fromKey) or []
+        toEntities = doc.get(self.toKey) or []
+        if not fromEntities or not toEntities:
+            return
+        edgeProps = self.edgeProps(doc)
+        for fromEntity in fromEntities:
+            for toEntity in toEntities:
+                yield self.dyad(fromEntity, toEntity, dict(edgeProps))
+
+
+class MappingPlan():
+    """
+    The neo4j parameters compiled into one DyadSpec per configured from → to mapping.
+    """
+    __slots__ = ('specs',)
+
+    def __init__(self, specs: Tuple[DyadSpec, ...]) -> None:
+        self.specs = specs
+
+    def __getstate__(self):
+        return {'specs': self.specs}
+
+    def __setstate__(self, state):
+        self.specs = state['specs']
+
+    def expand(self, doc: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        """
+        Fans a document out into the graph data of every configured mapping and every entity pair, e.g. one dyad per
+        vendor and related person plus one per vendor and related organization.
+
+        Parameters
+        ----------
+        doc : dict
+            The document containing the data for the nodes and edges.
+
+        Yields
+        ------
+        dict
+            A dictionary containing the data required to create nodes and edges in Neo4j database.
+        """
+        for spec in self.specs:
+            yield from spec.expand(doc)
+
+    @staticmethod
+    def propPairs(props: Any, propMap: Dict[str, str]) -> Tuple[Tuple[str, str], ...]:
+        """
+        Resolves the (Elasticsearch key, Neo4j key) pairs of a property entry, which may be a key or a list of keys.
+        """
+        keys = [props] if isinstance(props, str) else list(props or [])
+        return tuple((key, propMap.get(key, key)) for key in keys)
+
+    @classmethod
+    def compile(cls, neo4jParams: Dict[str, Any]) -> 'MappingPlan':
+        """
+        Compiles the equalized neo4j parameters. Mappings configured more than once are compiled once.
+
+        Parameters
+        ----------
+        neo4jParams : dict
+            The neo4j parameters after ElasticsearchToNeo4jSync.processNeo4jParams.
+
+        Returns
+        -------
+        MappingPlan
+            The compiled plan.
+        """
+        propMap = neo4jParams.get('propMap', {})
+        types = neo4jParams.get('types', {})
+        specs: List[DyadSpec] = []
+        seen = set()
+        for idx, fromKey in enumerate(neo4jParams.get('from', [])):
+            toKey = neo4jParams['to'][idx]
+            spec = DyadSpec(
+                fromKey=fromKey,
+                fromType=types.get(fromKey, ''),
+                fromProps=cls.propPairs(neo4jParams.get('fromProps', [])[idx], propMap),
+                toKey=toKey,
+                toType=types.get(toKey, ''),
+                toProps=cls.propPairs(neo4jParams.get('toProps', [])[idx], propMap),
+                relationshipType=neo4jParams.get('relationship', [])[idx],
+                relationshipProps=cls.propPairs(neo4jParams.get('relationshipProps', [])[idx], propMap),
+            )
+            signature = tuple(spec.__getstate__().values())
+            if signature not in seen:
+                seen.add(signature)
+                specs.append(spec)
+        return cls(tuple(specs))
@@ -0,0 +1,167 @@
+import os
+import csv
+import hashlib
+from logging import Logger
+from typing import Any, Dict, Iterable, List, Tuple
+from nodeType import NodeType
+from Neo4jHandler import IDENTIFIER
+
+
+class Neo4jBulkExporter():
+    def __init__(self, outputDir: str, nodeProperties: List[str], relationshipProperties: List[str], keyProps: List[str], logger: Logger) -> None:
+        """
+        Streams dyads into the node and relationship CSV files read by `neo4j-admin database import`, so a cold
+        graph can be built offline instead of through transactional MERGE.
+
+        Every label gets a nodes_<Label>.csv file and every relationship type a relationships_<TYPE>.csv file, each
+        with a separate _header.csv file. Nodes share one ID space: a node ID is its label followed by its key
+        property values. Nodes and relationships are written once, the first time they are seen.
+
+        Parameters
+        ----------
+        outputDir : str
+            The directory the CSV files are written to. It is created if needed.
+        nodeProperties : list
+            The node property columns. Entries may carry an import type, e.g. 'name' or 'founded:int'.
+        relationshipProperties : list
+            The relationship property columns. Entries may carry an import type, e.g. 'amount:float'.
+        keyProps : list
+            The node properties identifying a node, as in Neo4jHandler.
+        logger : Logger
+            A logger object used to log events and error messages.
+        """
+        self.outputDir = outputDir
+        self.nodeProperties = list(nodeProperties)
+        self.relationshipProperties = list(relationshipProperties)
+        self.keyProps = list(keyProps)
+        self.logger = logger
+        self.writers: Dict[str, Tuple[Any, Any]] = {}
+        self.nodeIds = set()
+        self.relationshipIds = set()
+        self.stats = {'nodes': 0, 'relationships': 0, 'duplicateNodes': 0, 'duplicateRelationships': 0, 'skipped': 0}
+        os.makedirs(outputDir, exist_ok=True)
+
+    @staticmethod
+    def digest(value: str) -> int:
+        return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), 'big')
+
+    def writer(self, fileName: str, header: List[str]):
+        """
+        Returns the CSV writer of a data file, creating the file and its header file on first use.
+
+        Parameters
+        ----------
+        fileName : str
+            The name of the data file without extension, e.g. nodes_Person.
+        header : list
+            The columns of the header file.
+
+        Returns
+        -------
+        csv.writer
+            The writer of the data file.
+        """
+        if fileName not in self.writers:
+            with open(os.path.join(self.outputDir, f"{fileName}_header.csv"), 'w', newline='') as headerFile:
+                csv.writer(headerFile).writerow(header)
+            dataFile = open(os.path.join(self.outputDir, f"{fileName}.csv"), 'w', newline='')
+            self.writers[fileName] = (dataFile, csv.writer(dataFile))
+        return self.writers[fileName][1]
+
+    @staticmethod
+    def column(value: Any) -> Any:
+        if isinstance(value, (list, tuple)):
+            return ';'.join(str(item) for item in value)
+        return '' if value is None else value
+
+    def writeNode(self, nodeType: str, props: Dict[str, Any]) -> str:
+        """
+        Writes a node unless it was already written, and returns its ID.
+
+        Parameters
+        ----------
+        nodeType : str
+            The node type as it appears in the neo4j parameters.
+        props : dict
+            The node properties.
+
+        Returns
+        -------
+        nodeId : str
+            The ID of the node in the import.
+        """
+        label = NodeType.parse(nodeType).schema()
+        nodeId = '|'.join([label] + [str(props[key]) for key in self.keyProps])
+        nodeDigest = self.digest(nodeId)
+        if nodeDigest in self.nodeIds:
+            self.stats['duplicateNodes'] += 1
+            return nodeId
+        self.nodeIds.add(nodeDigest)
+        self.stats['nodes'] += 1
+        self.writer(f"nodes_{label}", [':ID'] + self.nodeProperties + [':LABEL']).writerow(
+            [nodeId] + [self.column(props.get(prop.split(':')[0])) for prop in self.nodeProperties] + [label]
+        )
+        return nodeId
+
+    def write(self, queriesParams: Iterable[Dict[str, Any]]) -> Dict[str, int]:
+        """
+        Writes the nodes and relationships of a stream of dyads.
+
+        Parameters
+        ----------
+        queriesParams : iterable
+            The dyads produced by ElasticsearchToNeo4jSync.buildGraphData.
+
+        Returns
+        -------
+        stats : dict
+            The number of nodes and relationships written, deduplicated and skipped so far.
+        """
+        for queryParams in queriesParams:
+            fromProps = queryParams.get('fromProps') or {}
+            toProps = queryParams.get('toProps') or {}
+            relationshipType = queryParams.get('edgeType')
+            if any(fromProps.get(key) is None or toProps.get(key) is None for key in self.keyProps) \
+                    or not IDENTIFIER.match(relationshipType or ''):
+                self.logger.warning(f"Skipping dyad without key properties {self.keyProps} or relationship type: {queryParams}")
+                self.stats['skipped'] += 1
+                continue
+            startId = self.writeNode(queryParams['fromType'], fromProps)
+            endId = self.writeNode(queryParams['toType'], toProps)
+            relationshipDigest = self.digest(f"{startId}\x00{relationshipType}\x00{endId}")
+            if relationshipDigest in self.relationshipIds:
+                self.stats['duplicateRelationships'] += 1
+                continue
+            self.relationshipIds.add(relationshipDigest)
+            self.stats['relationships'] += 1
+            edgeProps = queryParams.get('edgeProps') or {}
+            self.writer(f"relationships_{relationshipType}", [':START_ID', ':END_ID'] + self.relationshipProperties + [':TYPE']).writerow(
+                [startId, endId] + [self.column(edgeProps.get(prop.split(':')[0])) for prop in self.relationshipProperties] + [relationshipType]
+            )
+        return dict(self.stats)
+
+    def importCommand(self, database: str = 'neo4j') -> str:
+        """
+        Returns the neo4j-admin command importing the written files.
+
+        Parameters
+        ----------
+        database : str
+            The name of the database to create. Defaults to 'neo4j'.
+
+        Returns
+        -------
+        command : str
+            The neo4j-admin database import command.
+        """
+        arguments = []
+        for fileName in sorted(self.writers):
+            kind = 'nodes' if fileName.startswith('nodes_') else 'relationships'
+            header = os.path.join(self.outputDir, f"{fileName}_header.csv")
+            data = os.path.join(self.outputDir, f"{fileName}.csv")
+            arguments.append(f"--{kind}={header},{data}")
+        return ' '.join(['neo4j-admin database import full'] + arguments + [database])
+
+    def close(self) -> None:
+        for dataFile, _ in self.writers.values():
+            dataFile.close()
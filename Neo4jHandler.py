@@ -1,12 +1,29 @@
+import re
+import time
+import random
+import weakref
+from queue import Queue, Full
+from threading import Thread, Event
 from logging import Logger
 from neo4j import GraphDatabase
+from neo4j.exceptions import TransientError, ServiceUnavailable, SessionExpired
 from contextlib import contextmanager
 from neo4j import ResultSummary
-from typing import List, Dict, Union
+from typing import List, Dict, Union, Iterable, Tuple, Generator
+from itertools import islice
 from nodeType import NodeType
+from SyncMetrics import SIZE_BUCKETS, stageTimer
+
+IDENTIFIER = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+RETRYABLE_ERRORS = (TransientError, ServiceUnavailable, SessionExpired)
+# transaction memory errors, which retrying the same batch does not fix
+MEMORY_ERRORS = ('Neo.TransientError.General.MemoryPoolOutOfMemoryError', 'Neo.TransientError.General.TransactionMemoryLimit',
+                 'Neo.TransientError.General.OutOfMemoryError')
+# schemas already verified per (possibly shared) driver, so handlers created per event bootstrap only once
+PREPARED_SCHEMAS = weakref.WeakKeyDictionary()
 
 class Neo4jHandler():
-    def __init__(self, neo4jParameters: Dict, uri: str, user: str, password: str, logger: Logger) -> None:
+    def __init__(self, neo4jParameters: Dict, uri: str, user: str, password: str, logger: Logger, clientRegistry=None, dyadCache=None, metrics=None, batchSizer=None, spool=None) -> None:
         """
         Initializes a Neo4jHandler object.
 
@@ -22,12 +39,58 @@ class Neo4jHandler():
             The password to use when connecting to the Neo4j database.
         logger : Logger
             A logger object used to log events and error messages.
+        clientRegistry : ClientRegistry or None
+            When given, the driver is shared through the registry instead of being created for this handler.
+        dyadCache : DyadCache or None
+            When given, dyads that were already committed are skipped instead of being merged again.
+        metrics : SyncMetrics or None
+            When given, the latency and size of every batch, the written rows and the retries are recorded.
+        batchSizer : BatchSizeController or None
+            When given, the rows per batch of every shape adapt to the commit latency and transaction memory errors,
+            starting from the chunkSize parameter, instead of staying at the chunkSize parameter.
+        spool : BatchSpool or None
+            When given, every batch is written ahead to the spool before it is committed in its own transaction and
+            acknowledged after, so the batches of a failed push can be replayed with replaySpool.
         """
         self.params = neo4jParameters
-        self.driver = GraphDatabase.driver(uri=uri, auth=(user, password))
+        self.dyadCache = dyadCache
+        self.metrics = metrics
+        self.batchSizer = batchSizer
+        self.spool = spool
+        self.ownsDriver = clientRegistry is None
+        if clientRegistry is not None:
+            self.driver = clientRegistry.neo4jDriver(self.createDriver, uri=uri, user=user, password=password)
+        else:
+            self.driver = self.createDriver(uri=uri, user=user, password=password)
         self.logger = logger
         self.validTypes = {_nodeType.schema() for _nodeType in NodeType}
+        self.keyProps = tuple(self.params.get('reqProps', ['name']))
+        self.statementCache: Dict[Tuple[str, str, str, Tuple[str, ...]], str] = {}
+        # the (fromLabel, relationshipType, toLabel) shape of every cached statement, the groups of the batch sizer
+        self.statementShapes: Dict[str, Tuple[str, str, str]] = {}
+        self.schemaReady = not self.params.get('bootstrapSchema', False) or self.schemaSignature() in PREPARED_SCHEMAS.get(self.driver, set())
+
+    def createDriver(self, uri: str, user: str, password: str, **poolParams):
+        """
+        Creates the Neo4j driver used by the handler.
+
+        Parameters
+        ----------
+        uri : str
+            The URI of the Neo4j database.
+        user : str
+            The username to use when connecting to the Neo4j database.
+        password : str
+            The password to use when connecting to the Neo4j database.
+        poolParams : dict
+            Connection pool settings such as max_connection_pool_size or keep_alive.
 
+        Returns
+        -------
+        driver : neo4j.Driver
+            The Neo4j driver.
+        """
+        return GraphDatabase.driver(uri=uri, auth=(user, password), **poolParams)
 
     def formatProps(self, props: Dict) -> str:
         """
@@ -115,6 +178,7 @@ class Neo4jHandler():
             "nodeType": f"TypeError: nodeType must be an instance of class NodeType where the following values are accepted: Person, Place or Thing, not {entityType}.",
             "nodePropsType": "TypeError: from_node_props must be None or a dictionary.",
             "relationshipType": "TypeError: Both from_node_type and to_node_type must be defined to create a relationship.",
+            "identifier": f"ValueError: {entityType} is not a valid Cypher identifier.",
         }
         
         self.logger.error(errorMessages[errorType])
@@ -185,34 +249,827 @@ class Neo4jHandler():
             tx.rollback()
             raise
 
-    def dataPush(self, queriesParams: List[Dict[str, Union[str, Dict]]]) -> bool:
+    def resolveLabel(self, _nodeType: str) -> str:
         """
-        Connects to the Neo4j database and runs multiple small queries.
+        Resolves a configured node type (e.g. 'person') to the Neo4j label of its schema.
 
         Parameters
         ----------
-        queriesParams : list
-            A list of dictionaries containing data to be inserted into Neo4j.
+        _nodeType : str
+            The node type as it appears in the neo4j parameters.
+
+        Returns
+        -------
+        label : str
+            The Neo4j label of the node type.
+        """
+        try:
+            label = NodeType.parse(_nodeType).schema()
+        except ValueError:
+            label = _nodeType
+        if label not in self.validTypes:
+            self.createDyadErrorHandler(errorType='nodeType', entityType=_nodeType)
+        return label
+
+    def validateIdentifier(self, identifier: str) -> str:
+        """
+        Ensures a relationship type or property key can be safely embedded in a Cypher statement.
+
+        Parameters
+        ----------
+        identifier : str
+            The relationship type or property key.
+
+        Returns
+        -------
+        identifier : str
+            The validated identifier.
+        """
+        if not isinstance(identifier, str) or not IDENTIFIER.match(identifier):
+            self.createDyadErrorHandler(errorType='identifier', entityType=identifier)
+        return identifier
+
+    def batchStatement(self, fromLabel: str, relationshipType: str, toLabel: str) -> str:
+        """
+        Returns the parameterized UNWIND statement merging a batch of dyads of one shape. Statements are cached per
+        shape so the text sent to Neo4j is identical between batches and its query plan is compiled only once.
+
+        Parameters
+        ----------
+        fromLabel : str
+            The label of the node at the start of the relationship.
+        relationshipType : str
+            The type of relationship to merge.
+        toLabel : str
+            The label of the node at the end of the relationship.
+
+        Returns
+        -------
+        statement : str
+            A Cypher statement expecting the batch as the $rows parameter.
+        """
+        shape = (fromLabel, relationshipType, toLabel, self.keyProps)
+        statement = self.statementCache.get(shape)
+        if statement is None:
+            fromKey = ', '.join(f"`{key}`: row.fromKey.`{key}`" for key in map(self.validateIdentifier, self.keyProps))
+            toKey = ', '.join(f"`{key}`: row.toKey.`{key}`" for key in self.keyProps)
+            statement = (
+                "UNWIND $rows AS row "
+                f"MERGE (a:`{fromLabel}` {{{fromKey}}}) SET a += row.fromProps "
+                f"MERGE (b:`{toLabel}` {{{toKey}}}) SET b += row.toProps "
+                f"MERGE (a)-[r:`{self.validateIdentifier(relationshipType)}`]->(b) SET r += row.edgeProps"
+            )
+            self.statementCache[shape] = statement
+            self.statementShapes[statement] = shape[:3]
+        return statement
+
+    def keyPattern(self, rowKey: str) -> str:
+        """
+        Returns the key properties of a node pattern read from a map of the row, e.g. `name`: row.fromKey.`name`.
+        """
+        return ', '.join(f"`{key}`: row.{rowKey}.`{key}`" for key in map(self.validateIdentifier, self.keyProps))
+
+    def nodeStatement(self, label: str) -> str:
+        """
+        Returns the cached UNWIND statement merging a batch of distinct nodes of one label, the first phase of the
+        twoPhase write strategy.
+
+        Parameters
+        ----------
+        label : str
+            The label of the nodes.
+
+        Returns
+        -------
+        statement : str
+            A Cypher statement expecting rows with the key and props of a node as the $rows parameter.
+        """
+        shape = ('node', label, self.keyProps)
+        statement = self.statementCache.get(shape)
+        if statement is None:
+            statement = f"UNWIND $rows AS row MERGE (n:`{label}` {{{self.keyPattern('key')}}}) SET n += row.props"
+            self.statementCache[shape] = statement
+            self.statementShapes[statement] = (label,)
+        return statement
+
+    def relationshipStatement(self, fromLabel: str, relationshipType: str, toLabel: str) -> str:
+        """
+        Returns the cached UNWIND statement merging a batch of relationships between nodes merged beforehand, the
+        second phase of the twoPhase write strategy. Both ends are matched on their indexed key properties, so the
+        statement neither merges nor updates nodes.
+
+        Parameters
+        ----------
+        fromLabel : str
+            The label of the node at the start of the relationship.
+        relationshipType : str
+            The type of relationship to merge.
+        toLabel : str
+            The label of the node at the end of the relationship.
+
+        Returns
+        -------
+        statement : str
+            A Cypher statement expecting the batch rows of batchRow as the $rows parameter.
+        """
+        shape = ('relationship', fromLabel, relationshipType, toLabel, self.keyProps)
+        statement = self.statementCache.get(shape)
+        if statement is None:
+            statement = (
+                "UNWIND $rows AS row "
+                f"MATCH (a:`{fromLabel}` {{{self.keyPattern('fromKey')}}}) "
+                f"MATCH (b:`{toLabel}` {{{self.keyPattern('toKey')}}}) "
+                f"MERGE (a)-[r:`{self.validateIdentifier(relationshipType)}`]->(b) SET r += row.edgeProps"
+            )
+            self.statementCache[shape] = statement
+            self.statementShapes[statement] = (fromLabel, relationshipType, toLabel)
+        return statement
+
+    def batchSize(self, statement: str, chunk: int) -> int:
+        """
+        Returns the number of rows of the next batch of a statement: the adaptive size of its shape when the handler
+        has a batch sizer, otherwise the fixed chunk size.
+        """
+        if self.batchSizer is None:
+            return chunk
+        return self.batchSizer.size(self.statementShapes.get(statement, statement))
+
+    def observeBatch(self, statement: str, rows: List[Dict], seconds: float) -> None:
+        """
+        Feeds the commit latency of a batch to the batch sizer and records the resulting size of its shape.
+        """
+        if self.batchSizer is None:
+            return
+        shape = self.statementShapes.get(statement, statement)
+        size = self.batchSizer.observe(shape, len(rows), seconds)
+        if self.metrics is not None:
+            self.metrics.setGauge('batch_size', size, shape='-'.join(shape) if isinstance(shape, tuple) else shape)
+
+    def splitBatch(self, statement: str, rows: List[Dict], error: Exception) -> Union[List[List[Dict]], None]:
+        """
+        Splits a batch that ran out of transaction memory into batches of the reduced size of its shape. The driver
+        counts memory errors as transient, so executeBatch runs its batches in explicit transactions that the driver
+        does not retry, and an oversized batch is split on its first failure.
+
+        Parameters
+        ----------
+        statement : str
+            The batch statement.
+        rows : list
+            The rows of the failed batch.
+        error : Exception
+            The error the batch failed with.
+
+        Returns
+        -------
+        list or None
+            The smaller batches, or None when the error is not a memory error, the handler has no batch sizer or the
+            batch cannot be split.
+        """
+        if self.batchSizer is None or getattr(error, 'code', None) not in MEMORY_ERRORS or len(rows) < 2:
+            return None
+        size = min(self.batchSizer.overflow(self.statementShapes.get(statement, statement), len(rows)), len(rows) // 2)
+        self.logger.warning(f"Splitting batch of {len(rows)} rows into batches of {size} rows after {error.code}")
+        return [rows[start:start + size] for start in range(0, len(rows), size)]
+
+    def batchRow(self, queryParams: Dict[str, Union[str, Dict]]) -> Union[Dict[str, Dict], None]:
+        """
+        Converts a dyad produced by ElasticsearchToNeo4jSync.buildGraphData into an UNWIND row.
+
+        Parameters
+        ----------
+        queryParams : dict
+            A dictionary with the fromType, fromProps, edgeType, edgeProps, toType and toProps of a dyad.
+
+        Returns
+        -------
+        row : dict or None
+            The row parameters, or None when either node lacks one of the key properties.
+        """
+        fromProps = queryParams.get('fromProps') or {}
+        toProps = queryParams.get('toProps') or {}
+        if any(fromProps.get(key) is None or toProps.get(key) is None for key in self.keyProps):
+            self.logger.warning(f"Skipping dyad without key properties {list(self.keyProps)}: {queryParams}")
+            return None
+        return {
+            'fromKey': {key: fromProps[key] for key in self.keyProps},
+            'fromProps': fromProps,
+            'toKey': {key: toProps[key] for key in self.keyProps},
+            'toProps': toProps,
+            'edgeProps': queryParams.get('edgeProps') or {},
+        }
+
+    def claimRow(self, queryParams: Dict[str, Union[str, Dict]], row: Dict) -> bool:
+        """
+        Claims a dyad in the dyad cache and records its hash in the row, so it is committed along with the row.
+
+        Returns
+        -------
+        claimed : bool
+            False when the dyad cache already holds the dyad and the row is skipped.
+        """
+        if self.dyadCache is not None:
+            dyadHash = self.dyadCache.hash(queryParams)
+            if not self.dyadCache.claim(dyadHash):
+                return False
+            row['hash'] = dyadHash
+        return True
+
+    def batchGroup(self, queryParams: Dict[str, Union[str, Dict]], partitions: int = 1) -> Union[Tuple[int, str, Dict], None]:
+        """
+        Resolves the partition, the cached statement and the UNWIND row of a dyad.
+
+        Parameters
+        ----------
+        queryParams : dict
+            A dyad produced by ElasticsearchToNeo4jSync.buildGraphData.
+        partitions : int
+            The number of partitions to spread the start node keys over. Defaults to 1.
+
+        Returns
+        -------
+        tuple or None
+            The partition, statement and row of the dyad, or None when the dyad is skipped, either because it lacks
+            a key property or because the dyad cache already holds it.
+        """
+        row = self.batchRow(queryParams)
+        if row is None or not self.claimRow(queryParams, row):
+            return None
+        statement = self.batchStatement(
+            self.resolveLabel(queryParams.get('fromType')),
+            queryParams.get('edgeType'),
+            self.resolveLabel(queryParams.get('toType')),
+        )
+        return hash(tuple(row['fromKey'].values())) % partitions, statement, row
+
+    def batchRows(self, queriesParams: Iterable[Dict[str, Union[str, Dict]]], chunk: int, partitions: int = 1) -> Generator[Tuple[int, str, List[Dict]], None, None]:
+        """
+        Groups dyads by (fromType, edgeType, toType) and by partition of their start node key, and yields a statement
+        with a batch of rows whenever a group reaches the chunk size, then the remainder of every group once the dyads
+        are exhausted. Rows sharing a start node always land in the same partition. With a batch sizer, the chunk
+        size of every group follows the adaptive size of its shape.
+
+        Parameters
+        ----------
+        queriesParams : iterable
+            An iterable of dyads produced by ElasticsearchToNeo4jSync.buildGraphData.
+        chunk : int
+            The maximum number of rows per batch, unless the handler has a batch sizer.
+        partitions : int
+            The number of partitions to spread the start node keys over. Defaults to 1.
+
+        Yields
+        ------
+        tuple
+            The partition, the cached statement of the group and a list of its rows.
+        """
+        groups: Dict[Tuple[int, str], List[Dict]] = {}
+        for queryParams in queriesParams:
+            group = self.batchGroup(queryParams, partitions)
+            if group is None:
+                continue
+            partition, statement, row = group
+            rows = groups.setdefault((partition, statement), [])
+            rows.append(row)
+            if len(rows) >= self.batchSize(statement, chunk):
+                yield partition, statement, rows
+                groups[(partition, statement)] = []
+        for (partition, statement), rows in groups.items():
+            if rows:
+                yield partition, statement, rows
+
+    def twoPhaseRows(self, queriesParams: Iterable[Dict[str, Union[str, Dict]]], chunk: int, partitions: int = 1) -> Generator[Tuple[int, Union[str, None], List[Dict]], None, None]:
+        """
+        Batches the dyads for the twoPhase write strategy, one window of the twoPhaseWindow parameter (100000 dyads
+        by default) at a time. The distinct nodes of a window are merged first, in batches per label partitioned by
+        node key, then its relationships, matched on the key properties of their ends. A barrier, a batch without a
+        statement, separates the phases so no relationship is written before its nodes are committed.
+
+        Relationships are partitioned and ordered by their hub, the end with more relationships in the window, or by
+        their start node when the groupByHub parameter is False. The relationships of a hub then share batches and a
+        writer, so a hub is locked once per batch and never by two writers at once.
+
+        Parameters
+        ----------
+        queriesParams : iterable
+            An iterable of dyads produced by ElasticsearchToNeo4jSync.buildGraphData.
+        chunk : int
+            The maximum number of rows per batch, unless the handler has a batch sizer.
+        partitions : int
+            The number of partitions to spread the node keys over. Defaults to 1.
+
+        Yields
+        ------
+        tuple
+            The partition, statement and rows of every batch, or the partition -1, None and no rows at a barrier.
+        """
+        window = self.params.get('twoPhaseWindow', 100000)
+        groupByHub = self.params.get('groupByHub', True)
+        dyads = iter(queriesParams)
+        while True:
+            nodes: Dict[Tuple[str, Tuple], Dict] = {}
+            relationships: List[Tuple[str, Tuple, Tuple, Dict]] = []
+            for queryParams in islice(dyads, window):
+                row = self.batchRow(queryParams)
+                if row is None or not self.claimRow(queryParams, row):
+                    continue
+                fromLabel = self.resolveLabel(queryParams.get('fromType'))
+                toLabel = self.resolveLabel(queryParams.get('toType'))
+                fromNode = (fromLabel, tuple(row['fromKey'].values()))
+                toNode = (toLabel, tuple(row['toKey'].values()))
+                for node, key, props in ((fromNode, row['fromKey'], row.pop('fromProps')), (toNode, row['toKey'], row.pop('toProps'))):
+                    merged = nodes.get(node)
+                    if merged is None:
+                        nodes[node] = {'key': key, 'props': dict(props)}
+                    else:
+                        merged['props'].update(props)
+                statement = self.relationshipStatement(fromLabel, queryParams.get('edgeType'), toLabel)
+                relationships.append((statement, fromNode, toNode, row))
+            if not relationships:
+                return
+
+            groups: Dict[Tuple[int, str], List[Dict]] = {}
+            for node, nodeRow in nodes.items():
+                group = (hash(node) % partitions, self.nodeStatement(node[0]))
+                groups.setdefault(group, []).append(nodeRow)
+            yield from self.groupBatches(groups, chunk)
+            yield -1, None, []
+
+            degrees: Dict[Tuple[str, Tuple], int] = {}
+            if groupByHub:
+                for _, fromNode, toNode, _ in relationships:
+                    degrees[fromNode] = degrees.get(fromNode, 0) + 1
+                    degrees[toNode] = degrees.get(toNode, 0) + 1
+            hubs = [toNode if degrees.get(toNode, 0) > degrees.get(fromNode, 0) else fromNode
+                    for _, fromNode, toNode, _ in relationships]
+            groups = {}
+            for position in sorted(range(len(relationships)), key=lambda position: (relationships[position][0], repr(hubs[position]))):
+                statement, _, _, row = relationships[position]
+                groups.setdefault((hash(hubs[position]) % partitions, statement), []).append(row)
+            yield from self.groupBatches(groups, chunk)
+            yield -1, None, []
+
+    def groupBatches(self, groups: Dict[Tuple[int, str], List[Dict]], chunk: int) -> Generator[Tuple[int, str, List[Dict]], None, None]:
+        """
+        Cuts the rows of every (partition, statement) group into batches of the batch size of the statement.
+        """
+        for (partition, statement), rows in groups.items():
+            size = self.batchSize(statement, chunk)
+            for start in range(0, len(rows), size):
+                yield partition, statement, rows[start:start + size]
+
+    def writeBatches(self, queriesParams: Iterable[Dict[str, Union[str, Dict]]], chunk: int, partitions: int = 1) -> Generator[Tuple[int, Union[str, None], List[Dict]], None, None]:
+        """
+        Batches the dyads with the write strategy of the writeStrategy parameter: 'dyad' (the default) merges both
+        nodes and the relationship of every row in one statement with batchRows, 'twoPhase' merges the distinct
+        nodes before matching them to merge the relationships with twoPhaseRows.
+        """
+        if self.writeStrategy() == 'twoPhase':
+            return self.twoPhaseRows(queriesParams, chunk=chunk, partitions=partitions)
+        return self.batchRows(queriesParams, chunk=chunk, partitions=partitions)
+
+    def writeStrategy(self) -> str:
+        """
+        Returns the validated writeStrategy parameter, 'dyad' by default.
+        """
+        strategy = self.params.get('writeStrategy', 'dyad')
+        if strategy not in ('dyad', 'twoPhase'):
+            error = f"ValueError: writeStrategy must be 'dyad' or 'twoPhase', not {strategy}"
+            self.logger.error(error)
+            raise Exception(error)
+        return strategy
+
+    def schemaLabels(self) -> List[str]:
+        """
+        Returns the labels that need a key constraint or index: the schema labels of the configured nodeTypes, or
+        the schema labels of every NodeType when none are configured.
+
+        Returns
+        -------
+        labels : list
+            The sorted, distinct labels.
+        """
+        nodeTypes = self.params.get('nodeTypes') or [_nodeType.value for _nodeType in NodeType]
+        return sorted({self.resolveLabel(_nodeType) for _nodeType in nodeTypes})
+
+    def schemaSignature(self) -> Tuple:
+        """
+        Returns what the bootstrapped schema depends on: the labels, the key properties and the schema kind.
+        """
+        return (tuple(self.params.get('nodeTypes') or ()), self.keyProps, self.params.get('schema', 'constraint'))
+
+    def markSchemaReady(self) -> None:
+        """
+        Records that the schema of the handler is verified on its driver.
+        """
+        self.schemaReady = True
+        PREPARED_SCHEMAS.setdefault(self.driver, set()).add(self.schemaSignature())
+        self.logger.info(f"neo4j schema is ready for labels {self.schemaLabels()}")
+
+    def schemaStatements(self) -> List[str]:
+        """
+        Returns the idempotent statements creating a uniqueness constraint, or a range index when the schema
+        parameter is 'index', on the key properties of every label written by the handler.
+
+        Returns
+        -------
+        statements : list
+            The CREATE CONSTRAINT / CREATE INDEX statements.
+        """
+        keys = [self.validateIdentifier(key) for key in self.keyProps]
+        properties = ', '.join(f"n.`{key}`" for key in keys)
+        statements = []
+        for label in self.schemaLabels():
+            if self.params.get('schema', 'constraint') == 'index':
+                statements.append(f"CREATE INDEX `{label}_{'_'.join(keys)}_index` IF NOT EXISTS FOR (n:`{label}`) ON ({properties})")
+            else:
+                statements.append(f"CREATE CONSTRAINT `{label}_{'_'.join(keys)}_unique` IF NOT EXISTS FOR (n:`{label}`) REQUIRE ({properties}) IS UNIQUE")
+        return statements
+
+    def missingSchema(self, indexes: List[Dict]) -> List[str]:
+        """
+        Returns the labels whose key properties are not covered by an online index.
+
+        Parameters
+        ----------
+        indexes : list
+            The records of SHOW INDEXES YIELD labelsOrTypes, properties, state.
+
+        Returns
+        -------
+        labels : list
+            The labels missing an index on the key properties.
+        """
+        online = {
+            (tuple(index['labelsOrTypes'] or []), tuple(index['properties'] or []))
+            for index in indexes if index['state'] == 'ONLINE'
+        }
+        return [label for label in self.schemaLabels() if ((label,), self.keyProps) not in online]
+
+    def ensureSchema(self) -> None:
+        """
+        Creates the key constraints or indexes of every label, waits for them to come online and verifies them,
+        so MERGE looks nodes up through an index rather than a label scan.
+        """
+        with self.driver.session() as session:
+            for statement in self.schemaStatements():
+                session.run(statement).consume()
+            session.run("CALL db.awaitIndexes($timeout)", timeout=self.params.get('schemaTimeout', 300)).consume()
+            indexes = session.run("SHOW INDEXES YIELD labelsOrTypes, properties, state").data()
+        missing = self.missingSchema(indexes)
+        if missing:
+            error = f"Failed to create indexes on {list(self.keyProps)} for labels {missing}"
+            self.logger.error(error)
+            raise Exception(error)
+        self.markSchemaReady()
+
+    def prepareSchema(self) -> bool:
+        """
+        Bootstraps the schema once, before the first batch is written, when the bootstrapSchema parameter is set.
+
+        Returns
+        -------
+        success : bool
+            A boolean indicating whether the schema is ready.
+        """
+        if self.schemaReady:
+            return True
+        try:
+            self.ensureSchema()
+            return True
+        except Exception as e:
+            self.logger.warning(f"Couldn't prepare neo4j schema due to {e}")
+            return False
+
+    def commitRows(self, rows: List[Dict]) -> None:
+        """
+        Records the rows of a committed batch in the dyad cache.
+
+        Parameters
+        ----------
+        rows : list
+            The rows of the committed batch.
+        """
+        if self.dyadCache is not None:
+            self.dyadCache.commit(row['hash'] for row in rows if 'hash' in row)
+
+    def releaseRows(self) -> None:
+        """
+        Releases every dyad claimed but not committed after a failed push, so the next push writes them again.
+        """
+        if self.dyadCache is not None:
+            self.dyadCache.release(list(self.dyadCache.pending))
+
+    def spoolBatch(self, statement: str, rows: List[Dict]) -> Union[str, None]:
+        """
+        Writes a batch ahead to the spool before it is committed.
+
+        Returns
+        -------
+        batchId : str or None
+            The id acknowledging the batch, or None without a spool.
+        """
+        return self.spool.append(statement, rows) if self.spool is not None else None
+
+    def acknowledgeBatches(self, batchIds: List[Union[str, None]]) -> None:
+        """
+        Marks committed batches as done in the spool.
+        """
+        if self.spool is not None:
+            for batchId in batchIds:
+                self.spool.acknowledge(batchId)
+
+    def spoolRemaining(self, batches: Iterable[Tuple[int, str, List[Dict]]]) -> None:
+        """
+        Writes the batches a failed push did not send to the spool, so replaySpool commits the whole push without
+        fetching it from Elasticsearch again.
+
+        Parameters
+        ----------
+        batches : iterable
+            The remaining batches of batchRows.
+        """
+        if self.spool is None:
+            return
+        try:
+            for _, statement, rows in batches:
+                if statement is not None:
+                    self.spoolBatch(statement, rows)
+        except Exception as e:
+            self.logger.warning(f"Couldn't spool the remaining batches due to {e}")
+
+    def countBatch(self, rows: List[Dict]) -> None:
+        if self.metrics is not None:
+            self.metrics.observe('batch_rows', len(rows), buckets=SIZE_BUCKETS)
+            self.metrics.increment('rows_total', len(rows))
+
+    def countError(self, stage: str) -> None:
+        if self.metrics is not None:
+            self.metrics.increment('errors_total', stage=stage)
+
+    @staticmethod
+    def writeBatch(tx, statement: str, rows: List[Dict]) -> ResultSummary:
+        """
+        Runs a batch statement inside a transaction.
+
+        Parameters
+        ----------
+        tx : neo4j.Transaction
+            The transaction opened by executeBatch.
+        statement : str
+            The batch statement.
+        rows : list
+            The rows passed as the $rows parameter.
+
+        Returns
+        -------
+        summary : neo4j.ResultSummary
+            The summary of the statement.
+        """
+        return tx.run(statement, rows=rows).consume()
+
+    def executeBatch(self, statement: str, rows: List[Dict]) -> ResultSummary:
+        """
+        Commits a batch in its own explicit transaction, retrying transient errors such as deadlocks and lost
+        connections with exponential backoff and jitter. The driver's managed retries of session.execute_write are
+        not used, so maxRetries and retryBackoff are the only retry policy. With a batch sizer, a batch running out
+        of transaction memory is split and its parts committed one by one instead.
+
+        Parameters
+        ----------
+        statement : str
+            The batch statement.
+        rows : list
+            The rows passed as the $rows parameter.
+
+        Returns
+        -------
+        summary : neo4j.ResultSummary
+            The summary of the committed statement.
+        """
+        maxRetries = self.params.get('maxRetries', 5)
+        retryBackoff = self.params.get('retryBackoff', 0.1)
+        for attempt in range(maxRetries + 1):
+            try:
+                started = time.perf_counter()
+                with stageTimer(self.metrics, 'push'), self.driver.session() as session:
+                    tx = session.begin_transaction()
+                    try:
+                        summary = self.writeBatch(tx, statement, rows)
+                        tx.commit()
+                    finally:
+                        tx.close()
+                self.observeBatch(statement, rows, time.perf_counter() - started)
+                self.countBatch(rows)
+                return summary
+            except RETRYABLE_ERRORS as e:
+                parts = self.splitBatch(statement, rows, e)
+                if parts is not None:
+                    for part in parts:
+                        summary = self.executeBatch(statement, part)
+                    return summary
+                if attempt == maxRetries:
+                    raise
+                if self.metrics is not None:
+                    self.metrics.increment('retries_total')
+                delay = retryBackoff * 2 ** attempt * (1 + random.random())
+                self.logger.warning(f"Retrying batch of {len(rows)} rows in {delay:.2f}s after {type(e).__name__}: {e}")
+                time.sleep(delay)
+
+    def dataPushConcurrent(self, queriesParams: Iterable[Dict[str, Union[str, Dict]]], writers: int) -> bool:
+        """
+        Merges the dyads on several sessions in parallel, every writer thread committing its batches one transaction
+        at a time. The rows are partitioned by the key of their start node to reduce lock contention; the end nodes
+        are shared, so two writers can still merge the same end node and collide on its lock, which executeBatch
+        retries.
+
+        Parameters
+        ----------
+        queriesParams : iterable
+            An iterable of dictionaries containing data to be inserted into Neo4j.
+        writers : int
+            The number of writer threads and sessions.
+
+        Returns
+        -------
+        success : bool
+            A boolean indicating whether the data insertion was successful.
+        """
+        queues = [Queue(maxsize=2) for _ in range(writers)]
+        failed = Event()
+        errors = []
+
+        def write(batches):
+            while True:
+                batch = batches.get()
+                if batch is None:
+                    batches.task_done()
+                    return
+                if failed.is_set():
+                    self.spoolBatch(*batch)
+                    batches.task_done()
+                    continue
+                try:
+                    batchId = self.spoolBatch(*batch)
+                    self.executeBatch(*batch)
+                    self.commitRows(batch[1])
+                    self.acknowledgeBatches([batchId])
+                except Exception as e:
+                    errors.append(e)
+                    failed.set()
+                finally:
+                    batches.task_done()
+
+        def put(batches, batch):
+            while not failed.is_set():
+                try:
+                    batches.put(batch, timeout=0.1)
+                    return True
+                except Full:
+                    continue
+            return False
+
+        threads = [Thread(target=write, args=(queue,), daemon=True) for queue in queues]
+        for thread in threads:
+            thread.start()
+        batches = self.writeBatches(queriesParams, chunk=self.params.get('chunkSize', 1000), partitions=writers)
+        try:
+            for partition, statement, rows in batches:
+                if statement is None:
+                    # a barrier of the write strategy: wait until every queued batch is committed
+                    for pending in queues:
+                        pending.join()
+                    continue
+                if not put(queues[partition], (statement, rows)):
+                    self.spoolBatch(statement, rows)
+                    break
+        except Exception as e:
+            errors.append(e)
+            failed.set()
+        finally:
+            for queue in queues:
+                queue.put(None)
+            for thread in threads:
+                thread.join()
+
+        if errors:
+            self.logger.warning(f"Couldn't insert data due to {errors[0]}")
+            self.countError('push')
+            self.spoolRemaining(batches)
+            self.releaseRows()
+            return False
+        self.logger.info('neo4j queries have been all written successfully')
+        return True
+
+    def dataPushBatched(self, queriesParams: Iterable[Dict[str, Union[str, Dict]]]) -> bool:
+        """
+        Merges the dyads on a single session, committing every batch in its own transaction with
+        executeBatch, so its commit latency reaches the batch sizer and a batch running out of transaction memory
+        is split instead of failing the push. Every batch is acknowledged in the spool once committed, so a failed
+        push only leaves the batches from the failed one on for replaySpool.
+
+        Parameters
+        ----------
+        queriesParams : iterable
+            An iterable of dictionaries containing data to be inserted into Neo4j.
+
+        Returns
+        -------
+        success : bool
+            A boolean indicating whether the data insertion was successful.
+        """
+        batches = self.writeBatches(queriesParams, chunk=self.params.get('chunkSize', 1000))
+        try:
+            for _, statement, rows in batches:
+                # batches are committed in order, so the barriers of the write strategy always hold
+                if statement is None:
+                    continue
+                batchId = self.spoolBatch(statement, rows)
+                self.executeBatch(statement, rows)
+                self.commitRows(rows)
+                self.acknowledgeBatches([batchId])
+        except Exception as e:
+            self.logger.warning(f"Couldn't insert data due to {e}")
+            self.countError('push')
+            self.spoolRemaining(batches)
+            self.releaseRows()
+            return False
+        self.logger.info('neo4j queries have been all written successfully')
+        return True
+
+    def dataPush(self, queriesParams: Iterable[Dict[str, Union[str, Dict]]]) -> bool:
+        """
+        Connects to the Neo4j database and merges the dyads in batches of parameterized UNWIND statements. With the
+        writers parameter above 1 the batches are committed concurrently by dataPushConcurrent. Otherwise, with a
+        batch sizer or a spool they are committed one by one by dataPushBatched, and without either they are all run
+        inside a single transaction. With a spool, a failed push leaves every batch it did not commit in
+        the spool, including the batches it did not get to, for replaySpool.
+
+        Parameters
+        ----------
+        queriesParams : iterable
+            An iterable of dictionaries containing data to be inserted into Neo4j.
 
         Returns
         -------
         success : bool
             A boolean indicating whether the data insertion was successful.
         """
-        queries=[]
+        if not self.prepareSchema():
+            return False
+        writers = self.params.get('writers', 1)
+        if writers > 1:
+            return self.dataPushConcurrent(queriesParams, writers=writers)
+        if self.batchSizer is not None or self.spool is not None:
+            return self.dataPushBatched(queriesParams)
+        written = []
         try:
             with self.driver.session() as session:
                 with self.transaction(session) as tx:
-                    for idx, queryParams in enumerate(queriesParams):
-                        queries.append(self.createDyad(queryParams))
-                        if idx % self.neo4jParameters['chunk'] == 0:
-                            tx.run(f"MERGE {','.join(queries)}", params={})
-                            queries = []
-                    self.logger.info('neo4j queries have been all written successfully')
-                    return True
+                    for _, statement, rows in self.writeBatches(queriesParams, chunk=self.params.get('chunkSize', 1000)):
+                        if statement is None:
+                            continue
+                        with stageTimer(self.metrics, 'push'):
+                            tx.run(statement, rows=rows).consume()
+                        self.countBatch(rows)
+                        written.extend(rows)
         except Exception as e:
-            self.logger.warn(f"Couldn't insert data due to {e}")
+            self.logger.warning(f"Couldn't insert data due to {e}")
+            self.countError('push')
+            self.releaseRows()
+            return False
+        self.commitRows(written)
+        self.logger.info('neo4j queries have been all written successfully')
+        return True
+
+    def replaySpool(self) -> bool:
+        """
+        Commits the batches left unacknowledged in the spool by failed pushes, oldest first, each in its own
+        transaction. Replay before pushing again, so older batches do not overwrite the properties of newer ones.
+
+        Returns
+        -------
+        success : bool
+            A boolean indicating whether every spooled batch was committed.
+        """
+        if self.spool is None:
+            return True
+        if not self.prepareSchema():
+            return False
+        replayed = 0
+        try:
+            for batchId, statement, rows in self.spool.pending():
+                self.executeBatch(statement, rows)
+                self.commitRows(rows)
+                self.acknowledgeBatches([batchId])
+                replayed += 1
+        except Exception as e:
+            self.logger.warning(f"Couldn't replay spooled batches due to {e}")
+            self.countError('replay')
             return False
+        self.logger.info(f"replayed {replayed} spooled neo4j batches")
+        return True
         
     def close(self):
-        self.driver.close()
\ No newline at end of file
+        if self.ownsDriver:
+            self.driver.close()
\ No newline at end of file
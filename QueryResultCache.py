@@ -0,0 +1,128 @@
+import json
+import time
+import hashlib
+from threading import Lock
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+
+class QueryResultCache():
+    def __init__(self, maxsize: int = 256, ttl: float = 300.0, clock: Callable[[], float] = time.monotonic) -> None:
+        """
+        Keeps the responses of recent searches so a cloud event repeating the search queries of an earlier one is
+        answered without running the query again. Entries expire after a time to live and the least recently used
+        entry is evicted once the cache is full. Entries can also be tied to a generation, e.g. the refresh count of
+        the index, and are dropped once the generation changes.
+
+        Parameters
+        ----------
+        maxsize : int
+            The maximum number of cached responses. Defaults to 256.
+        ttl : float
+            The number of seconds a response stays valid. Defaults to 300.
+        clock : callable
+            The monotonic clock used for expiry. Defaults to time.monotonic.
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self.entries: OrderedDict = OrderedDict()
+        self.lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(index: str, query: Dict[str, Any], **searchParams) -> str:
+        """
+        Returns the cache key of a search. Queries are normalized so key order does not matter.
+
+        Parameters
+        ----------
+        index : str
+            The name of the Elasticsearch index.
+        query : dict
+            The Elasticsearch query.
+        searchParams : dict
+            The other search parameters shaping the response, e.g. size or source.
+
+        Returns
+        -------
+        key : str
+            The cache key.
+        """
+        normalized = json.dumps([query, searchParams], sort_keys=True, separators=(',', ':'), default=str)
+        return f"{index}:{hashlib.sha256(normalized.encode()).hexdigest()}"
+
+    def get(self, key: str, generation: Any = None) -> Optional[Any]:
+        """
+        Returns the cached response of a search, or None when it is missing, expired or from another generation.
+
+        Parameters
+        ----------
+        key : str
+            The key returned by QueryResultCache.key.
+        generation : any
+            The current generation of the index, or None when responses are not tied to one.
+
+        Returns
+        -------
+        response : any or None
+            The cached response. It is shared between callers and must not be modified.
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                expires, entryGeneration, response = entry
+                if expires > self.clock() and entryGeneration == generation:
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return response
+                del self.entries[key]
+                self.expirations += 1
+            self.misses += 1
+            return None
+
+    def put(self, key: str, response: Any, generation: Any = None) -> None:
+        """
+        Caches the response of a search.
+
+        Parameters
+        ----------
+        key : str
+            The key returned by QueryResultCache.key.
+        response : any
+            The search response.
+        generation : any
+            The generation of the index the response was read from, or None.
+        """
+        with self.lock:
+            self.entries[key] = (self.clock() + self.ttl, generation, response)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Returns the hit and miss counters of the cache.
+
+        Returns
+        -------
+        dict
+            The hits, misses, hit rate, expired and evicted entries and number of cached responses.
+        """
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hitRate': self.hits / lookups if lookups else 0.0,
+            'expirations': self.expirations,
+            'evictions': self.evictions,
+            'size': len(self.entries),
+        }
@@ -0,0 +1,244 @@
+import time
+from threading import Lock
+from contextvars import ContextVar
+from contextlib import contextmanager, nullcontext
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+# the upper bounds of the histogram buckets, in seconds, rows and queued items
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (1, 10, 100, 500, 1000, 5000, 10000, 50000)
+DEPTH_BUCKETS = (0, 1, 2, 4, 8, 16, 32, 64)
+
+MetricKey = Tuple[str, Tuple[Tuple[str, str], ...]]
+# the metrics of the runs scoped in the current context, see SyncMetrics.run
+RUNS: ContextVar[Tuple['SyncMetrics', ...]] = ContextVar('runs', default=())
+
+
+class SyncMetrics():
+    def __init__(self, namespace: str = 'es_neo4j_sync', clock=time.perf_counter) -> None:
+        """
+        Collects the counters, gauges and histograms of a synchronizer: the latency of every stage (fetch,
+        transform and push), the hits, documents and rows flowing through them, batch sizes, retries and queue
+        depths. The metrics are exported as Prometheus text and summarized per run.
+
+        Every metric is identified by its name and labels, e.g. observe('stage_seconds', 0.2, stage='fetch').
+
+        Parameters
+        ----------
+        namespace : str
+            The prefix of the Prometheus metric names. Defaults to 'es_neo4j_sync'.
+        clock : callable
+            The clock used by timers and run summaries. Defaults to time.perf_counter.
+        """
+        self.namespace = namespace
+        self.clock = clock
+        self.lock = Lock()
+        self.counters: Dict[MetricKey, float] = {}
+        self.gauges: Dict[MetricKey, float] = {}
+        # bucket bounds, per-bucket counts (the last one is +Inf), sum and count of every histogram
+        self.histograms: Dict[MetricKey, Dict[str, Any]] = {}
+        self.started = clock()
+        # the metrics a run scoped by run() records into besides its own
+        self.parent: Optional['SyncMetrics'] = None
+
+    @staticmethod
+    def metricKey(name: str, labels: Dict[str, Any]) -> MetricKey:
+        return name, tuple(sorted((label, str(value)) for label, value in labels.items()))
+
+    @staticmethod
+    def metricName(key: MetricKey) -> str:
+        name, labels = key
+        if not labels:
+            return name
+        return name + '{' + ','.join(f'{label}="{value}"' for label, value in labels) + '}'
+
+    def recorders(self) -> Tuple['SyncMetrics', ...]:
+        """
+        Returns the metrics a value is recorded in: these and the metrics of their runs scoped in the current context.
+        """
+        return (self,) + tuple(run for run in RUNS.get() if run.parent is self)
+
+    @contextmanager
+    def run(self):
+        """
+        Scopes a run. While the with block runs, and in the asyncio tasks it creates, every value recorded in these
+        metrics is also recorded in fresh metrics of the run, which are yielded. Unlike a snapshot, they keep apart
+        runs executing concurrently, e.g. several syncs on one event loop. Threads do not inherit the context, so
+        the values recorded by the threads a run starts are not part of its metrics.
+        """
+        run = SyncMetrics(self.namespace, self.clock)
+        run.parent = self
+        token = RUNS.set(RUNS.get() + (run,))
+        try:
+            yield run
+        finally:
+            RUNS.reset(token)
+
+    def increment(self, name: str, amount: float = 1, **labels) -> None:
+        key = self.metricKey(name, labels)
+        for metrics in self.recorders():
+            with metrics.lock:
+                metrics.counters[key] = metrics.counters.get(key, 0) + amount
+
+    def setGauge(self, name: str, value: float, **labels) -> None:
+        key = self.metricKey(name, labels)
+        for metrics in self.recorders():
+            with metrics.lock:
+                metrics.gauges[key] = value
+
+    def observe(self, name: str, value: float, buckets: Tuple[float, ...] = LATENCY_BUCKETS, **labels) -> None:
+        """
+        Records a value in a histogram. The buckets are fixed by the first observation of the histogram.
+
+        Parameters
+        ----------
+        name : str
+            The name of the histogram.
+        value : float
+            The observed value.
+        buckets : tuple of float
+            The upper bounds of the buckets. Defaults to LATENCY_BUCKETS.
+        labels : dict
+            The labels of the histogram.
+        """
+        key = self.metricKey(name, labels)
+        for metrics in self.recorders():
+            with metrics.lock:
+                histogram = metrics.histograms.get(key)
+                if histogram is None:
+                    histogram = metrics.histograms[key] = {'buckets': tuple(buckets), 'counts': [0] * (len(buckets) + 1), 'sum': 0.0, 'count': 0}
+                bucket = 0
+                for bound in histogram['buckets']:
+                    if value <= bound:
+                        break
+                    bucket += 1
+                histogram['counts'][bucket] += 1
+                histogram['sum'] += value
+                histogram['count'] += 1
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        """
+        Records the seconds spent inside the with block in a latency histogram, also when it raises.
+        """
+        started = self.clock()
+        try:
+            yield
+        finally:
+            self.observe(name, self.clock() - started, **labels)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Returns a copy of the counters and histograms, so a run can be summarized on its own with summary(since=...).
+        """
+        with self.lock:
+            return {
+                'time': self.clock(),
+                'counters': dict(self.counters),
+                'histograms': {key: {'counts': list(histogram['counts']), 'sum': histogram['sum'], 'count': histogram['count']}
+                               for key, histogram in self.histograms.items()},
+            }
+
+    @staticmethod
+    def quantile(buckets: Tuple[float, ...], counts: Iterable[int], count: int, q: float) -> Optional[float]:
+        """
+        Estimates a quantile as the upper bound of the bucket it falls in, or None when it falls past the last bound.
+        """
+        rank, seen = q * count, 0
+        for bound, bucketCount in zip(buckets, counts):
+            seen += bucketCount
+            if seen >= rank:
+                return bound
+        return None
+
+    def summary(self, since: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Summarizes the metrics recorded since a snapshot, or since the metrics were created.
+
+        Parameters
+        ----------
+        since : dict or None
+            A snapshot taken at the start of the run.
+
+        Returns
+        -------
+        dict
+            The elapsed seconds, the seconds, count, mean and estimated p50/p95 of every stage, the documents and rows
+            per second, the stage the run spent the most time in, and every counter and histogram.
+        """
+        since = since or {'time': self.started, 'counters': {}, 'histograms': {}}
+        with self.lock:
+            elapsed = self.clock() - since['time']
+            counters = {self.metricName(key): value - since['counters'].get(key, 0)
+                        for key, value in self.counters.items() if value != since['counters'].get(key, 0)}
+            histograms = {}
+            for key, histogram in self.histograms.items():
+                previous = since['histograms'].get(key, {'counts': [0] * len(histogram['counts']), 'sum': 0.0, 'count': 0})
+                count = histogram['count'] - previous['count']
+                if not count:
+                    continue
+                counts = [current - before for current, before in zip(histogram['counts'], previous['counts'])]
+                total = histogram['sum'] - previous['sum']
+                histograms[key] = {
+                    'count': count,
+                    'sum': total,
+                    'mean': total / count,
+                    'p50': self.quantile(histogram['buckets'], counts, count, 0.5),
+                    'p95': self.quantile(histogram['buckets'], counts, count, 0.95),
+                }
+
+        stages = {dict(labels)['stage']: histogram for (name, labels), histogram in histograms.items()
+                  if name == 'stage_seconds' and 'stage' in dict(labels)}
+        return {
+            'seconds': elapsed,
+            'stages': {stage: {'seconds': histogram['sum'], 'count': histogram['count'], 'mean': histogram['mean'],
+                               'p50': histogram['p50'], 'p95': histogram['p95']} for stage, histogram in stages.items()},
+            'boundBy': max(stages, key=lambda stage: stages[stage]['sum']) if stages else None,
+            'docsPerSecond': counters.get('documents_total', 0) / elapsed if elapsed > 0 else 0.0,
+            'rowsPerSecond': counters.get('rows_total', 0) / elapsed if elapsed > 0 else 0.0,
+            'counters': counters,
+            'histograms': {self.metricName(key): histogram for key, histogram in histograms.items()
+                           if key[0] != 'stage_seconds'},
+        }
+
+    def prometheus(self) -> str:
+        """
+        Returns every metric in the Prometheus text exposition format, e.g. for a textfile collector.
+        """
+        lines = []
+
+        def name(key, suffix='', extra=()):
+            metricName = f"{self.namespace}_{key[0]}{suffix}"
+            labels = key[1] + extra
+            if labels:
+                metricName += '{' + ','.join(f'{label}="{value}"' for label, value in labels) + '}'
+            return metricName
+
+        with self.lock:
+            for metricType, metrics in (('counter', self.counters), ('gauge', self.gauges)):
+                typed = set()
+                for key in sorted(metrics):
+                    if key[0] not in typed:
+                        typed.add(key[0])
+                        lines.append(f"# TYPE {self.namespace}_{key[0]} {metricType}")
+                    lines.append(f"{name(key)} {metrics[key]}")
+            typed = set()
+            for key in sorted(self.histograms):
+                histogram = self.histograms[key]
+                if key[0] not in typed:
+                    typed.add(key[0])
+                    lines.append(f"# TYPE {self.namespace}_{key[0]} histogram")
+                cumulative = 0
+                for bound, count in zip(histogram['buckets'] + ('+Inf',), histogram['counts']):
+                    cumulative += count
+                    lines.append(f"{name(key, '_bucket', (('le', str(bound)),))} {cumulative}")
+                lines.append(f"{name(key, '_sum')} {histogram['sum']}")
+                lines.append(f"{name(key, '_count')} {histogram['count']}")
+        return '\n'.join(lines) + '\n'
+
+
+def stageTimer(metrics: Optional[SyncMetrics], stage: str):
+    """
+    Returns a timer of the stage_seconds histogram of the stage, or a no-op context when metrics are disabled.
+    """
+    return metrics.timer('stage_seconds', stage=stage) if metrics is not None else nullcontext()
@@ -0,0 +1,98 @@
+import asyncio
+import unittest
+from unittest.mock import AsyncMock, patch
+from logging import Logger
+from elasticsearch import AsyncElasticsearch
+from AsyncElasticsearchHandler import AsyncElasticsearchHandler
+
+
+class TestAsyncElasticsearchHandler(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.es_handler = AsyncElasticsearchHandler(
+            hosts=['https://localhost:9200'],
+            username='username',
+            password='password',
+            caCerts='ca_certs',
+            caFingerprint=''.join(['a']*32),
+            index='test_index',
+            logger=Logger('test_logger')
+        )
+        self.es_handler.client = AsyncMock()
+
+    async def asyncTearDown(self):
+        await self.es_handler.close()
+
+    @patch.object(AsyncElasticsearch, '__init__', return_value=None)
+    def test_creates_async_client(self, mock_init):
+        es_handler = AsyncElasticsearchHandler(['https://localhost:9200'], 'username', 'password', None, None, 'test_index', Logger('test_logger'))
+        self.assertIsInstance(es_handler.client, AsyncElasticsearch)
+
+    async def test_data_fetch(self):
+        self.es_handler.client.search.return_value = {'hits': {'hits': []}}
+        self.assertEqual(await self.es_handler.dataFetch({'match_all': {}}), {'hits': {'hits': []}})
+
+        self.es_handler.client.search.side_effect = Exception('test error')
+        with self.assertRaises(Exception) as context:
+            await self.es_handler.dataFetch({'match_all': {}})
+        self.assertEqual(str(context.exception), 'Failed to retrieve data from Elasticsearch: test error')
+
+    async def test_data_stream_pit(self):
+        self.es_handler.client.open_point_in_time.return_value = {'id': 'pit-1'}
+        self.es_handler.client.search.side_effect = [
+            {'hits': {'hits': [{'_id': '1', 'sort': [1]}, {'_id': '2', 'sort': [2]}]}},
+            {'pit_id': 'pit-2', 'hits': {'hits': []}},
+        ]
+        pages = [page async for page in self.es_handler.dataStream({'match_all': {}}, pageSize=2)]
+        self.assertEqual([[hit['_id'] for hit in page] for page in pages], [['1', '2']])
+        self.assertEqual(self.es_handler.client.search.call_args.kwargs['pit']['id'], 'pit-1')
+        # the last search rotated the point in time id, so the latest one is closed
+        self.es_handler.client.close_point_in_time.assert_awaited_once_with(id='pit-2')
+
+    async def test_data_stream_scroll_fallback(self):
+        self.es_handler.client.open_point_in_time.side_effect = Exception('pit unsupported')
+        self.es_handler.client.search.return_value = {'_scroll_id': 'scroll-1', 'hits': {'hits': [{'_id': '1'}]}}
+        self.es_handler.client.scroll.return_value = {'_scroll_id': 'scroll-1', 'hits': {'hits': []}}
+        pages = [page async for page in self.es_handler.dataStream({'match_all': {}})]
+        self.assertEqual(pages, [[{'_id': '1'}]])
+        self.es_handler.client.clear_scroll.assert_awaited_once_with(scroll_id='scroll-1')
+
+    async def test_sliced_stream(self):
+        self.es_handler.client.open_point_in_time.return_value = {'id': 'pit-1'}
+
+        async def search(**kwargs):
+            sliceId = kwargs['slice']['id']
+            return {'hits': {'hits': [{'_id': str(sliceId), 'sort': [0]}]}}
+        self.es_handler.client.search.side_effect = search
+
+        pages = [page async for page in self.es_handler.slicedStream({'match_all': {}}, slices=3, pageSize=10)]
+        self.assertEqual(sorted(hit['_id'] for page in pages for hit in page), ['0', '1', '2'])
+        self.es_handler.client.close_point_in_time.assert_awaited_once_with(id='pit-1')
+
+    async def test_sliced_stream_closed_early(self):
+        self.es_handler.client.open_point_in_time.return_value = {'id': 'pit-1'}
+
+        async def search(**kwargs):
+            # every slice keeps returning full pages
+            return {'hits': {'hits': [{'_id': str(kwargs['slice']['id']), 'sort': [0]}]}}
+        self.es_handler.client.search.side_effect = search
+
+        for queueSize in (1, None):
+            with self.subTest(queueSize=queueSize):
+                self.es_handler.client.close_point_in_time.reset_mock()
+                stream = self.es_handler.slicedStream({'match_all': {}}, slices=4, pageSize=1, queueSize=queueSize)
+                self.assertEqual(len(await stream.__anext__()), 1)
+                await asyncio.wait_for(stream.aclose(), timeout=5)
+                self.es_handler.client.close_point_in_time.assert_awaited_once_with(id='pit-1')
+
+    async def test_multi_fetch(self):
+        self.es_handler.client.msearch.return_value = {'responses': [{'hits': {'hits': []}}, {'hits': {'hits': [{'_id': '1'}]}}]}
+
+        responses = await self.es_handler.multiFetch([{'match_all': {}}, {'ids': {'values': ['1']}}], size=10)
+
+        self.assertEqual(responses, self.es_handler.client.msearch.return_value['responses'])
+        self.assertEqual(self.es_handler.client.msearch.await_args.kwargs['searches'][1::2],
+                         [{'query': {'match_all': {}}, 'size': 10}, {'query': {'ids': {'values': ['1']}}, 'size': 10}])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+from logging import Logger
+from neo4j.exceptions import TransientError
+from AsyncNeo4jHandler import AsyncNeo4jHandler
+
+
+class TestAsyncNeo4jHandler(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.params = {"reqProps": ["name"], "chunkSize": 2}
+        self.logger = Logger("TestAsyncNeo4jHandler")
+        with patch('AsyncNeo4jHandler.AsyncGraphDatabase') as mock_graph_db:
+            self.neo4j_handler = AsyncNeo4jHandler(self.params, "bolt://localhost:7687", "neo4j", "password", self.logger)
+        mock_graph_db.driver.assert_called_once_with(uri="bolt://localhost:7687", auth=("neo4j", "password"))
+        self.session = AsyncMock()
+        self.tx = self.session.begin_transaction.return_value
+        self.neo4j_handler.driver = MagicMock()
+        self.neo4j_handler.driver.session.return_value.__aenter__.return_value = self.session
+
+    def dyad(self, fromName, toName):
+        return {"fromType": "person", "fromProps": {"name": fromName},
+                "toType": "organization", "toProps": {"name": toName},
+                "edgeType": "HAS_PROVIDED_BUSINESS_TO", "edgeProps": {}}
+
+    async def test_dataPush_from_async_iterable(self):
+        async def dyads():
+            for n in range(5):
+                yield self.dyad(f"Vendor{n}", f"Org{n}")
+
+        self.assertTrue(await self.neo4j_handler.dataPush(dyads()))
+        self.assertEqual([len(call.kwargs["rows"]) for call in self.tx.run.await_args_list], [2, 2, 1])
+        self.assertEqual(self.tx.commit.await_count, 3)
+
+    async def test_dataPush_concurrent_writers(self):
+        self.neo4j_handler.params = dict(self.params, writers=3)
+        self.assertTrue(await self.neo4j_handler.dataPush([self.dyad(f"Vendor{n}", f"Org{n}") for n in range(20)]))
+        self.assertEqual(sum(len(call.kwargs["rows"]) for call in self.tx.run.await_args_list), 20)
+
+    @patch('AsyncNeo4jHandler.asyncio.sleep', new_callable=AsyncMock)
+    async def test_executeBatch_retries_transient_errors(self, mock_sleep):
+        self.tx.run.return_value.consume.return_value = "summary"
+        self.tx.run.side_effect = [TransientError("deadlock"), self.tx.run.return_value]
+        self.assertEqual(await self.neo4j_handler.executeBatch("statement", [{}]), "summary")
+        mock_sleep.assert_awaited_once()
+        self.tx.commit.assert_awaited_once()
+        self.assertEqual(self.tx.close.await_count, 2)
+
+    async def test_dataPush_reports_failure(self):
+        self.tx.run.side_effect = Exception("test error")
+        self.assertFalse(await self.neo4j_handler.dataPush([self.dyad("Acme", "Initech")]))
+
+
+if __name__ == '__main__':
+    unittest.main()
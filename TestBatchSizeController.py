@@ -0,0 +1,43 @@
+import unittest
+from BatchSizeController import BatchSizeController
+
+
+class TestBatchSizeController(unittest.TestCase):
+
+    def setUp(self):
+        self.controller = BatchSizeController(initialSize=1000, targetLatency=1.0, minSize=10, maxSize=10000, smoothing=1.0)
+
+    def test_grows_while_under_target(self):
+        self.assertEqual(self.controller.observe("group", 1000, 0.1), 1500)
+        self.assertEqual(self.controller.observe("group", 1500, 0.15), 2250)
+        self.assertEqual(self.controller.size("other"), 1000)
+
+    def test_growth_stops_at_target(self):
+        self.assertEqual(self.controller.observe("group", 1000, 0.8), 1000)
+        self.assertEqual(self.controller.observe("group", 1000, 0.6), 1500)
+        self.assertEqual(self.controller.observe("group", 1500, 0.9), 1500)
+
+    def test_shrinks_to_target(self):
+        self.assertEqual(self.controller.observe("group", 1000, 4.0), 250)
+        self.assertEqual(self.controller.observe("group", 250, 50.0), 10)
+
+    def test_ignores_remainders(self):
+        self.assertEqual(self.controller.observe("group", 100, 0.01), 1000)
+        self.assertEqual(self.controller.observe("group", 1000, 0.1), 1500)
+
+    def test_reverts_growth_losing_throughput(self):
+        self.controller.observe("group", 1000, 0.1)
+        self.assertEqual(self.controller.observe("group", 1500, 0.5), 1000)
+
+    def test_overflow_caps_group(self):
+        self.assertEqual(self.controller.overflow("group", 1000), 500)
+        self.assertEqual(self.controller.observe("group", 500, 0.01), 500)
+        self.assertEqual(self.controller.stats()["group"]["overflows"], 1)
+
+    def test_rejects_invalid_bounds(self):
+        with self.assertRaises(ValueError):
+            BatchSizeController(minSize=100, maxSize=10)
+
+
+if __name__ == '__main__':
+    unittest.main()
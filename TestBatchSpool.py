@@ -0,0 +1,90 @@
+import os
+import tempfile
+import unittest
+from BatchSpool import BatchSpool
+
+
+class TestBatchSpool(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = self.directory.name
+        self.rows = [{'fromKey': {'name': 'Acme'}, 'toKey': {'name': 'Initech'}}]
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_pending_until_acknowledged(self):
+        spool = BatchSpool(self.path, fsync=False)
+        first = spool.append('statement', self.rows)
+        second = spool.append('other', [])
+        spool.acknowledge(first)
+        self.assertEqual(list(spool.pending()), [(second, 'other', [])])
+        spool.acknowledge(second)
+        spool.acknowledge(second)
+        self.assertEqual(list(spool.pending()), [])
+        spool.close()
+        self.assertEqual(os.listdir(self.path), [])
+
+    def test_pending_survives_reopening(self):
+        spool = BatchSpool(self.path, fsync=False)
+        acknowledged = spool.append('statement', self.rows)
+        pending = spool.append('statement', self.rows)
+        spool.acknowledge(acknowledged)
+        spool.close()
+
+        reopened = BatchSpool(self.path)
+        self.assertEqual(list(reopened.pending()), [(pending, 'statement', self.rows)])
+        reopened.acknowledge(pending)
+        reopened.close()
+        self.assertEqual(BatchSpool(self.path).stats()['pending'], 0)
+
+    def test_skips_torn_records(self):
+        spool = BatchSpool(self.path, fsync=False)
+        pending = spool.append('statement', self.rows)
+        spool.append('torn', self.rows)
+        segmentFile = spool.files[spool.segment]
+        segmentFile.truncate(segmentFile.tell() - 3)
+        spool.close()
+
+        reopened = BatchSpool(self.path)
+        self.assertEqual([batchId for batchId, _, _ in reopened.pending()], [pending])
+        reopened.acknowledge(pending)
+        reopened.close()
+        self.assertEqual(os.listdir(self.path), [])
+
+    def test_deletes_acknowledged_segments(self):
+        spool = BatchSpool(self.path, segmentBytes=1, fsync=False)
+        batchIds = [spool.append('statement', self.rows) for _ in range(3)]
+        self.assertEqual(spool.stats()['segments'], 3)
+        spool.acknowledge(batchIds[1])
+        self.assertEqual(spool.stats()['segments'], 2)
+        spool.acknowledge(batchIds[2])
+        self.assertEqual(spool.stats()['segments'], 2)
+        spool.close()
+
+        reopened = BatchSpool(self.path)
+        self.assertEqual([batchId for batchId, _, _ in reopened.pending()], [batchIds[0]])
+
+    def test_spools_sharing_a_directory(self):
+        running = BatchSpool(self.path, fsync=False)
+        inFlight = running.append('statement', self.rows)
+
+        replay = BatchSpool(self.path, fsync=False)
+        self.assertEqual(list(replay.pending()), [])
+        replay.close()
+
+        appended = running.append('statement', self.rows)
+        self.assertEqual([batchId for batchId, _, _ in running.pending()], [inFlight, appended])
+        running.acknowledge(inFlight)
+        running.close()
+
+        adopted = BatchSpool(self.path, fsync=False)
+        self.assertEqual([batchId for batchId, _, _ in adopted.pending()], [appended])
+        adopted.acknowledge(appended)
+        adopted.close()
+        self.assertEqual(os.listdir(self.path), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import unittest
+from Benchmark import SyntheticSearch, RecordingDriver, BenchmarkSync, benchmarkEndToEnd, benchmarkWrites, compareResults
+
+
+class TestBenchmark(unittest.TestCase):
+
+    def test_synthetic_search_pages(self):
+        search = SyntheticSearch(250, pageSize=100)
+        positions, searchAfter = [], None
+        while True:
+            hits = search.search(size=100, search_after=searchAfter)['hits']['hits']
+            positions += [hit['sort'][0] for hit in hits]
+            if len(hits) < 100:
+                break
+            searchAfter = hits[-1]['sort']
+        self.assertEqual(positions, list(range(250)))
+        self.assertEqual(len(search.pages), 3)
+
+    def test_synthetic_search_slices(self):
+        search = SyntheticSearch(250, pageSize=100)
+        ids = [hit['_id'] for sliceId in range(3) for hit in search.search(size=1000, slice={'id': sliceId, 'max': 3})['hits']['hits']]
+        self.assertEqual(sorted(ids, key=int), [str(position) for position in range(250)])
+
+    def test_end_to_end(self):
+        # neither building the query nor the stand-in handlers may fail
+        with self.assertNoLogs(level='ERROR'):
+            results = benchmarkEndToEnd(250, pageSize=100, scores='high')
+        self.assertTrue(results['success'])
+        self.assertEqual(results['searches'], 3)
+        self.assertGreater(results['rows'], 0)
+        self.assertEqual(set(results['stages']), {'fetch', 'transform', 'push'})
+
+    def test_end_to_end_rows_match_transform(self):
+        sync = BenchmarkSync()
+        sync.params['fetch']['pageSize'] = 100
+        sync.search = SyntheticSearch(250, pageSize=100, scores='high')
+        sync.driver = RecordingDriver()
+        self.assertTrue(sync.startPipelinedProcess({'searchQueries': []}))
+
+        pages = [SyntheticSearch(250, pageSize=100, scores='high').search(size=100, search_after=[offset - 1] if offset else None)['hits']['hits'] for offset in (0, 100, 200)]
+        self.assertEqual(sync.driver.rows, len(list(sync.neo4jQueryBuilder(pages))))
+        self.assertEqual(len(sync.driver.indexes), 2)
+
+    def test_writes(self):
+        results = benchmarkWrites(300, names=20, writers=4, chunkSize=50, latency=0.0, conflictRate=0.2)
+        self.assertTrue(results['success'])
+        self.assertTrue(results['correct'])
+        self.assertGreater(results['driver']['conflicts'], 0)
+        self.assertGreaterEqual(results['retries'], results['driver']['conflicts'])
+
+    def test_adaptive_writes_recover_from_memory_errors(self):
+        fixed = benchmarkWrites(300, names=50, writers=2, chunkSize=200, latency=0.0, memoryLimitRows=60)
+        self.assertFalse(fixed['success'])
+        adaptive = benchmarkWrites(300, names=50, writers=2, chunkSize=200, latency=0.0, memoryLimitRows=60, targetLatency=0.1)
+        self.assertTrue(adaptive['success'])
+        self.assertTrue(adaptive['correct'])
+        self.assertTrue(all(size <= 60 for size in adaptive['batchSizes'].values()))
+
+    def test_compare_results(self):
+        self.assertEqual(compareResults({'docsPerSecond': 100, 'rowsPerSecond': 0}, {'docsPerSecond': 50, 'rowsPerSecond': 10}), {'docsPerSecond': 0.5})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+import time
+import unittest
+from BoundedStage import BoundedStage
+
+
+class TestBoundedStage(unittest.TestCase):
+
+    def test_transforms_items_in_order(self):
+        stage = BoundedStage(range(10), transform=lambda item: item * 2, maxsize=2)
+        self.assertEqual(list(stage), [item * 2 for item in range(10)])
+
+    def test_chained_stages(self):
+        reader = BoundedStage(iter(range(5)), maxsize=1)
+        transformer = BoundedStage(reader, transform=str, maxsize=1)
+        self.assertEqual(list(transformer), ['0', '1', '2', '3', '4'])
+
+    def test_backpressure_caps_buffered_items(self):
+        produced = []
+
+        def source():
+            for item in range(100):
+                produced.append(item)
+                yield item
+
+        stage = BoundedStage(source(), maxsize=3)
+        time.sleep(0.3)
+        # the queue holds 3 items and the stage thread blocks on the 4th
+        self.assertLessEqual(len(produced), 4)
+        self.assertEqual(stage.depth(), 3)
+        stage.close()
+
+    def test_forwards_exceptions(self):
+        def source():
+            yield 1
+            raise Exception('test error')
+
+        stage = BoundedStage(source())
+        iterator = iter(stage)
+        self.assertEqual(next(iterator), 1)
+        with self.assertRaises(Exception) as context:
+            next(iterator)
+        self.assertEqual(str(context.exception), 'test error')
+
+    def test_close_stops_the_source(self):
+        closed = []
+
+        def source():
+            try:
+                while True:
+                    yield 1
+            finally:
+                closed.append(True)
+
+        stage = BoundedStage(source(), maxsize=1)
+        self.assertEqual(next(iter(stage)), 1)
+        stage.close()
+        self.assertEqual(closed, [True])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,39 @@
+import os
+import tempfile
+import unittest
+from CheckpointStore import CheckpointStore
+
+
+class TestCheckpointStore(unittest.TestCase):
+
+    def setUp(self):
+        self.query = {'bool': {'must': [{'multi_match': {'query': 'acme', 'fields': ['vendor']}}]}}
+
+    def test_key_ignores_dict_order(self):
+        reordered = {'bool': {'must': [{'multi_match': {'fields': ['vendor'], 'query': 'acme'}}]}}
+        self.assertEqual(CheckpointStore.key('index', self.query), CheckpointStore.key('index', reordered))
+        self.assertNotEqual(CheckpointStore.key('index', self.query), CheckpointStore.key('other', self.query))
+
+    def test_save_load_and_clear(self):
+        store = CheckpointStore(':memory:')
+        self.assertIsNone(store.load('index', self.query))
+        store.save('index', self.query, '2023-01-01T00:00:00Z')
+        store.save('index', self.query, '2023-02-01T00:00:00Z')
+        self.assertEqual(store.load('index', self.query), '2023-02-01T00:00:00Z')
+        store.clear('index', self.query)
+        self.assertIsNone(store.load('index', self.query))
+        store.close()
+
+    def test_checkpoints_survive_reopening(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'checkpoints.sqlite')
+            store = CheckpointStore(path)
+            store.save('index', self.query, 1675209600000)
+            store.close()
+            store = CheckpointStore(path)
+            self.assertEqual(store.load('index', self.query), 1675209600000)
+            store.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
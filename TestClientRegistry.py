@@ -0,0 +1,56 @@
+import unittest
+from unittest.mock import MagicMock, patch
+from logging import Logger
+from elasticsearch import Elasticsearch
+from ClientRegistry import ClientRegistry
+from ElasticsearchHandler import ElasticsearchHandler
+from Neo4jHandler import Neo4jHandler
+
+
+class TestClientRegistry(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = ClientRegistry(elasticsearchParams={'connections_per_node': 4},
+                                       neo4jParams={'max_connection_pool_size': 8, 'keep_alive': True})
+        self.logger = Logger('test_logger')
+
+    def esHandler(self, index='test_index', password='password'):
+        return ElasticsearchHandler(hosts=['https://localhost:9200'], username='username', password=password,
+                                    caCerts=None, caFingerprint=None, index=index, logger=self.logger,
+                                    clientRegistry=self.registry)
+
+    @patch.object(Elasticsearch, '__init__', return_value=None)
+    def test_elasticsearch_client_is_shared(self, mock_init):
+        first = self.esHandler()
+        second = self.esHandler(index='other_index')
+        self.assertIs(first.client, second.client)
+        mock_init.assert_called_once()
+        self.assertEqual(mock_init.call_args.kwargs['connections_per_node'], 4)
+
+        third = self.esHandler(password='other')
+        self.assertIsNot(first.client, third.client)
+
+    @patch('Neo4jHandler.GraphDatabase')
+    def test_neo4j_driver_is_shared_and_not_closed_by_handlers(self, mock_graph_db):
+        first = Neo4jHandler({}, 'bolt://localhost:7687', 'neo4j', 'password', self.logger, clientRegistry=self.registry)
+        second = Neo4jHandler({}, 'bolt://localhost:7687', 'neo4j', 'password', self.logger, clientRegistry=self.registry)
+        self.assertIs(first.driver, second.driver)
+        mock_graph_db.driver.assert_called_once_with(uri='bolt://localhost:7687', auth=('neo4j', 'password'),
+                                                     max_connection_pool_size=8, keep_alive=True)
+
+        first.close()
+        first.driver.close.assert_not_called()
+        self.registry.close()
+        first.driver.close.assert_called_once()
+
+    def test_close_logs_failures_and_resets(self):
+        client = MagicMock()
+        client.close.side_effect = Exception('test error')
+        self.registry.get('elasticsearch:key', lambda: client)
+        self.registry.close()
+        self.assertEqual(self.registry.clients, {})
+        self.assertIsNot(self.registry.get('elasticsearch:key', MagicMock), client)
+
+
+if __name__ == '__main__':
+    unittest.main()
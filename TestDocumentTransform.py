@@ -0,0 +1,111 @@
+import pickle
+import unittest
+from unittest.mock import patch
+import DocumentTransform
+from DocumentTransform import ThresholdFilter, initWorker, dyadsChunk
+from ElasticsearchToNeo4jSync import ElasticsearchToNeo4jSync
+
+
+class TestThresholdFilter(unittest.TestCase):
+
+    def setUp(self):
+        self.doc = {'vendor': [{'answer': 'Acme', 'score': 0.95}, {'answer': 'Globex', 'score': 0.5}, {'answer': 'Hooli'}]}
+
+    def test_operator_condition(self):
+        thresholdFilter, = ThresholdFilter.compile({'thresholds': {'args': {'vendor': 0.9}, 'condition': '>='}})
+
+        self.assertEqual(thresholdFilter.apply(self.doc)['vendor'], [{'answer': 'Acme', 'score': 0.95}])
+
+    def test_callable_condition(self):
+        thresholdFilter, = ThresholdFilter.compile({'thresholds': {
+            'args': {'vendor': 0.9}, 'condition': lambda threshold, entity: entity.get('score', 0) < threshold}})
+
+        self.assertEqual([entity['answer'] for entity in thresholdFilter.apply(self.doc)['vendor']], ['Globex', 'Hooli'])
+
+    def test_unknown_condition(self):
+        with self.assertRaises(ValueError):
+            ThresholdFilter((('vendor', 0.9),), '~=')
+
+    def test_applyBatch_matches_apply(self):
+        import random
+        rng = random.Random(0)
+        docs = [{
+            'vendor': [{'answer': str(idx), 'score': rng.random()} for idx in range(rng.randint(0, 3))],
+            'relatedPersons': [{'answer': str(idx), 'score': rng.choice([0.9, 0.5, 1.0])} for idx in range(rng.randint(0, 3))] + [{'answer': 'unscored'}],
+        } for _ in range(200)]
+        thresholdFilter = ThresholdFilter((('vendor', 0.7), ('relatedPersons', 0.9), ('missing', 0.1)), '>=')
+
+        expected = [thresholdFilter.apply({key: list(value) for key, value in doc.items()}) for doc in docs]
+        self.assertEqual(thresholdFilter.applyBatch(docs), expected)
+
+    @patch.object(DocumentTransform, 'np', None)
+    def test_applyBatch_without_numpy(self):
+        thresholdFilter = ThresholdFilter((('vendor', 0.9),), '>=')
+
+        self.assertEqual(thresholdFilter.applyBatch([self.doc])[0]['vendor'], [{'answer': 'Acme', 'score': 0.95}])
+
+    def test_pickle(self):
+        thresholdFilter = ThresholdFilter((('vendor', 0.9),), '>', 'confidence')
+
+        restored = pickle.loads(pickle.dumps(thresholdFilter))
+        self.assertEqual((restored.args, restored.condition, restored.scoreKey), ((('vendor', 0.9),), '>', 'confidence'))
+
+
+class TestDocumentTransform(unittest.TestCase):
+
+    def setUp(self):
+        self.sync = ElasticsearchToNeo4jSync()
+        self.hits = [
+            {'_id': str(idx), '_source': {'vendor': [{'answer': f"vendor{idx}", 'score': 0.95}],
+                                          'relatedPersons': [{'answer': f"person{idx}", 'score': 0.91}],
+                                          'relatedOrganizations': [{'answer': f"organization{idx}", 'score': 0.3 + idx % 2}]}}
+            for idx in range(25)
+        ]
+
+    def tearDown(self):
+        DocumentTransform.workerTransform = None
+
+    def test_worker_uses_initialized_transform(self):
+        initWorker(pickle.loads(pickle.dumps(self.sync.documentTransform)))
+
+        self.assertEqual(dyadsChunk(self.hits), list(self.sync.neo4jQueryBuilder([self.hits])))
+
+    def test_neo4jQueryBuilderParallel_matches_serial_order(self):
+        self.sync.params['transform'].update({'workers': 2, 'chunkSize': 4, 'ordered': True})
+
+        rows = list(self.sync.neo4jQueryBuilderParallel(iter([self.hits[:10], self.hits[10:]])))
+        self.assertEqual(rows, list(self.sync.neo4jQueryBuilder([self.hits])))
+
+    def test_vectorized_generateDocuments_matches_serial(self):
+        expected = list(self.sync.generateDocuments([self.hits]))
+        self.sync.documentTransform.vectorized = True
+
+        self.assertEqual(list(self.sync.generateDocuments([self.hits])), expected)
+
+    def test_generateDocumentsParallel_unordered(self):
+        self.sync.params['transform'].update({'workers': 2, 'chunkSize': 3, 'ordered': False})
+
+        docs = list(self.sync.generateDocumentsParallel({'hits': {'hits': self.hits}}))
+        expected = list(self.sync.generateDocuments({'hits': {'hits': self.hits}}))
+        self.assertCountEqual([doc['vendor'][0]['answer'] for doc in docs], [doc['vendor'][0]['answer'] for doc in expected])
+
+    def test_transformParallel_bounds_chunks_in_flight(self):
+        import time
+        self.sync.params['transform'].update({'workers': 2, 'chunkSize': 2, 'maxInFlight': 2})
+        pulled = []
+
+        def pages():
+            for idx in range(1000):
+                pulled.append(idx)
+                yield self.hits[:2]
+
+        docs = self.sync.generateDocumentsParallel(pages())
+        next(docs)
+        time.sleep(0.5)
+        # two chunks in flight, the one being consumed and the page read ahead by chunkHits
+        self.assertLessEqual(len(pulled), 4)
+        docs.close()
+        self.assertLess(len(pulled), 1000)
+
+if __name__ == '__main__':
+    unittest.main()
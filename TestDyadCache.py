@@ -0,0 +1,52 @@
+import os
+import tempfile
+import unittest
+from DyadCache import DyadCache
+
+
+class TestDyadCache(unittest.TestCase):
+
+    def setUp(self):
+        self.dyad = {"fromType": "person", "fromProps": {"name": "Acme"},
+                     "toType": "organization", "toProps": {"name": "Initech"},
+                     "edgeType": "HAS_PROVIDED_BUSINESS_TO", "edgeProps": {"amount": 10}}
+
+    def test_hash_is_normalized(self):
+        reordered = dict(reversed(list(self.dyad.items())), fromType="Person")
+        self.assertEqual(DyadCache.hash(self.dyad), DyadCache.hash(reordered))
+        self.assertNotEqual(DyadCache.hash(self.dyad), DyadCache.hash(dict(self.dyad, edgeProps={"amount": 11})))
+
+    def test_claim_commit_and_release(self):
+        cache = DyadCache()
+        dyadHash = DyadCache.hash(self.dyad)
+        self.assertTrue(cache.claim(dyadHash))
+        self.assertFalse(cache.claim(dyadHash))
+        cache.release([dyadHash])
+        self.assertTrue(cache.claim(dyadHash))
+        cache.commit([dyadHash])
+        self.assertFalse(cache.claim(dyadHash))
+        self.assertEqual(cache.stats(), {'hits': 2, 'misses': 2, 'hitRate': 0.5, 'size': 1})
+
+    def test_lru_evicts_oldest(self):
+        cache = DyadCache(maxsize=2)
+        cache.commit(['a', 'b'])
+        self.assertFalse(cache.claim('a'))
+        cache.commit(['c'])
+        self.assertEqual(list(cache.committed), ['a', 'c'])
+        self.assertTrue(cache.claim('b'))
+
+    def test_disk_store_backs_the_lru(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'dyads.sqlite')
+            cache = DyadCache(maxsize=1, path=path)
+            cache.commit(['a', 'b'])
+            self.assertFalse(cache.claim('a'))
+            cache.close()
+            cache = DyadCache(path=path)
+            self.assertFalse(cache.claim('b'))
+            self.assertTrue(cache.claim('c'))
+            cache.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
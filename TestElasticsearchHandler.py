@@ -104,5 +104,224 @@ class TestElasticsearchHandler(unittest.TestCase):
             self.assertIn('test error', result['error'])
             self.assertTrue(mock_search.called)
 
+    @patch.object(Elasticsearch, 'close_point_in_time')
+    @patch.object(Elasticsearch, 'search')
+    @patch.object(Elasticsearch, 'open_point_in_time')
+    def test_data_stream_pit(self, mock_open_pit, mock_search, mock_close_pit):
+        es_handler = ElasticsearchHandler(
+            hosts=self.hosts,
+            username=self.username,
+            password=self.password,
+            caCerts=self.caCerts,
+            caFingerprint=self.caFingerprint,
+            index=self.index,
+            logger=self.logger
+        )
+        mock_open_pit.return_value = {'id': 'pit-1'}
+        mock_search.side_effect = [
+            {'pit_id': 'pit-2', 'hits': {'hits': [{'_id': '1', 'sort': [1]}, {'_id': '2', 'sort': [2]}]}},
+            {'pit_id': 'pit-2', 'hits': {'hits': [{'_id': '3', 'sort': [3]}]}},
+        ]
+
+        pages = list(es_handler.dataStream({'match_all': {}}, pageSize=2, source=['vendor.answer']))
+
+        self.assertEqual([[hit['_id'] for hit in page] for page in pages], [['1', '2'], ['3']])
+        self.assertEqual(mock_search.call_count, 2)
+        self.assertEqual(mock_search.call_args.kwargs['source'], ['vendor.answer'])
+        self.assertEqual(mock_search.call_args.kwargs['search_after'], [2])
+        self.assertEqual(mock_search.call_args.kwargs['pit']['id'], 'pit-2')
+        # Elasticsearch rotated the point in time id, so the latest one is closed
+        mock_close_pit.assert_called_once_with(id='pit-2')
+
+    @patch.object(Elasticsearch, 'clear_scroll')
+    @patch.object(Elasticsearch, 'scroll')
+    @patch.object(Elasticsearch, 'search')
+    @patch.object(Elasticsearch, 'open_point_in_time')
+    def test_data_stream_scroll_fallback(self, mock_open_pit, mock_search, mock_scroll, mock_clear_scroll):
+        es_handler = ElasticsearchHandler(
+            hosts=self.hosts,
+            username=self.username,
+            password=self.password,
+            caCerts=self.caCerts,
+            caFingerprint=self.caFingerprint,
+            index=self.index,
+            logger=self.logger
+        )
+        mock_open_pit.side_effect = Exception('pit unsupported')
+        mock_search.return_value = {'_scroll_id': 'scroll-1', 'hits': {'hits': [{'_id': '1'}]}}
+        mock_scroll.side_effect = [
+            {'_scroll_id': 'scroll-1', 'hits': {'hits': [{'_id': '2'}]}},
+            {'_scroll_id': 'scroll-1', 'hits': {'hits': []}},
+        ]
+
+        pages = list(es_handler.dataStream({'match_all': {}}, pageSize=1))
+
+        self.assertEqual([[hit['_id'] for hit in page] for page in pages], [['1'], ['2']])
+        self.assertEqual(mock_search.call_args.kwargs['scroll'], '1m')
+        mock_clear_scroll.assert_called_once_with(scroll_id='scroll-1')
+
+    @patch.object(Elasticsearch, 'close_point_in_time')
+    @patch.object(Elasticsearch, 'search')
+    @patch.object(Elasticsearch, 'open_point_in_time')
+    def test_data_stream_requires_query(self, mock_open_pit, mock_search, mock_close_pit):
+        es_handler = ElasticsearchHandler(
+            hosts=self.hosts,
+            username=self.username,
+            password=self.password,
+            caCerts=self.caCerts,
+            caFingerprint=self.caFingerprint,
+            index=self.index,
+            logger=self.logger
+        )
+        mock_open_pit.return_value = {'id': 'pit-1'}
+        mock_search.return_value = {'hits': {'hits': []}}
+
+        # an empty query matches every document, a missing one is an error
+        list(es_handler.dataStream({}))
+        self.assertEqual(mock_search.call_args.kwargs['query'], {'match_all': {}})
+
+        mock_open_pit.reset_mock()
+        mock_search.reset_mock()
+        for stream in (es_handler.dataStream(None), es_handler.slicedStream(None, slices=2)):
+            with self.assertRaises(Exception) as context:
+                list(stream)
+            self.assertEqual(str(context.exception), 'No query was given to stream test_index')
+        mock_open_pit.assert_not_called()
+        mock_search.assert_not_called()
+
+    @patch.object(Elasticsearch, 'close_point_in_time')
+    @patch.object(Elasticsearch, 'search')
+    @patch.object(Elasticsearch, 'open_point_in_time')
+    def test_sliced_stream(self, mock_open_pit, mock_search, mock_close_pit):
+        es_handler = ElasticsearchHandler(
+            hosts=self.hosts,
+            username=self.username,
+            password=self.password,
+            caCerts=self.caCerts,
+            caFingerprint=self.caFingerprint,
+            index=self.index,
+            logger=self.logger
+        )
+        mock_open_pit.return_value = {'id': 'pit-1'}
+
+        def search(**kwargs):
+            sliceId = kwargs['slice']['id']
+            return {'hits': {'hits': [{'_id': f'{sliceId}-{n}', 'sort': [n]} for n in range(sliceId + 1)]}}
+        mock_search.side_effect = search
+
+        pages = list(es_handler.slicedStream({'match_all': {}}, slices=3, pageSize=10))
+
+        ids = sorted(hit['_id'] for page in pages for hit in page)
+        self.assertEqual(ids, ['0-0', '1-0', '1-1', '2-0', '2-1', '2-2'])
+        self.assertEqual({call.kwargs['slice']['max'] for call in mock_search.call_args_list}, {3})
+        mock_open_pit.assert_called_once()
+        mock_close_pit.assert_called_once_with(id='pit-1')
+
+    @patch.object(Elasticsearch, 'close_point_in_time')
+    @patch.object(Elasticsearch, 'search')
+    @patch.object(Elasticsearch, 'open_point_in_time')
+    def test_sliced_stream_propagates_errors(self, mock_open_pit, mock_search, mock_close_pit):
+        es_handler = ElasticsearchHandler(
+            hosts=self.hosts,
+            username=self.username,
+            password=self.password,
+            caCerts=self.caCerts,
+            caFingerprint=self.caFingerprint,
+            index=self.index,
+            logger=self.logger
+        )
+        mock_open_pit.return_value = {'id': 'pit-1'}
+        mock_search.side_effect = Exception('test error')
+
+        with self.assertRaises(Exception) as context:
+            list(es_handler.slicedStream({'match_all': {}}, slices=2))
+        self.assertEqual(str(context.exception), 'Failed to retrieve data from Elasticsearch: test error')
+        mock_close_pit.assert_called_once_with(id='pit-1')
+
+    @patch.object(Elasticsearch, 'msearch')
+    def test_multi_fetch(self, mock_msearch):
+        es_handler = ElasticsearchHandler(
+            hosts=self.hosts,
+            username=self.username,
+            password=self.password,
+            caCerts=self.caCerts,
+            caFingerprint=self.caFingerprint,
+            index=self.index,
+            logger=self.logger
+        )
+        mock_msearch.return_value = {'responses': [{'hits': {'hits': [{'_id': '1'}]}}, {'error': {'type': 'query_shard_exception'}, 'status': 400}]}
+
+        responses = es_handler.multiFetch([{'match': {'vendor': 'acme'}}, {'match': {'vendor': '['}}], source=['vendor'], size=100)
+
+        self.assertEqual(responses, mock_msearch.return_value['responses'])
+        mock_msearch.assert_called_once_with(index=self.index, max_concurrent_searches=None, searches=[
+            {}, {'query': {'match': {'vendor': 'acme'}}, '_source': ['vendor'], 'size': 100},
+            {}, {'query': {'match': {'vendor': '['}}, '_source': ['vendor'], 'size': 100},
+        ])
+
+    @patch.object(Elasticsearch, 'msearch')
+    def test_multi_fetch_skips_missing_queries(self, mock_msearch):
+        es_handler = ElasticsearchHandler(
+            hosts=self.hosts,
+            username=self.username,
+            password=self.password,
+            caCerts=self.caCerts,
+            caFingerprint=self.caFingerprint,
+            index=self.index,
+            logger=self.logger
+        )
+        mock_msearch.return_value = {'responses': [{'hits': {'hits': [{'_id': '1'}]}}]}
+
+        responses = es_handler.multiFetch([None, {'match': {'vendor': 'acme'}}])
+
+        self.assertEqual(responses[0]['error']['type'], 'missing_query')
+        self.assertEqual(responses[1], {'hits': {'hits': [{'_id': '1'}]}})
+        mock_msearch.assert_called_once_with(index=self.index, max_concurrent_searches=None, searches=[
+            {}, {'query': {'match': {'vendor': 'acme'}}},
+        ])
+
+        mock_msearch.reset_mock()
+        self.assertEqual(es_handler.multiFetch([None])[0]['error']['type'], 'missing_query')
+        mock_msearch.assert_not_called()
+
+    @patch.object(Elasticsearch, 'msearch')
+    def test_multi_fetch_with_result_cache(self, mock_msearch):
+        from QueryResultCache import QueryResultCache
+        es_handler = ElasticsearchHandler(
+            hosts=self.hosts,
+            username=self.username,
+            password=self.password,
+            caCerts=self.caCerts,
+            caFingerprint=self.caFingerprint,
+            index=self.index,
+            logger=self.logger,
+            resultCache=QueryResultCache(),
+        )
+        acme, globex = {'match': {'vendor': 'acme'}}, {'match': {'vendor': 'globex'}}
+        mock_msearch.side_effect = [{'responses': [{'hits': {'hits': [{'_id': 'acme'}]}}]}, {'responses': [{'hits': {'hits': [{'_id': 'globex'}]}}]}]
+
+        first = es_handler.multiFetch([acme, acme])
+        second = es_handler.multiFetch([globex, acme])
+
+        self.assertEqual([response['hits']['hits'][0]['_id'] for response in first + second], ['acme', 'acme', 'globex', 'acme'])
+        self.assertEqual([len(call.kwargs['searches']) for call in mock_msearch.call_args_list], [2, 2])
+
+    @patch.object(Elasticsearch, 'msearch')
+    def test_multi_fetch_error(self, mock_msearch):
+        es_handler = ElasticsearchHandler(
+            hosts=self.hosts,
+            username=self.username,
+            password=self.password,
+            caCerts=self.caCerts,
+            caFingerprint=self.caFingerprint,
+            index=self.index,
+            logger=self.logger
+        )
+        mock_msearch.side_effect = Exception('test error')
+
+        with self.assertRaises(Exception) as context:
+            es_handler.multiFetch([{'match_all': {}}])
+        self.assertEqual(str(context.exception), 'Failed to retrieve data from Elasticsearch: test error')
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -1 +1,325 @@
-
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+from elasticsearch import Elasticsearch
+from ElasticsearchHandler import ElasticsearchHandler
+from ElasticsearchToNeo4jSync import ElasticsearchToNeo4jSync
+from Neo4jHandler import Neo4jHandler
+from CheckpointStore import CheckpointStore
+
+
+class TestElasticsearchToNeo4jSync(unittest.TestCase):
+
+    def setUp(self):
+        self.sync = ElasticsearchToNeo4jSync()
+        self.hits = [
+            {'_id': '1', '_source': {'vendor': [{'answer': 'Acme', 'score': 0.95}],
+                                     'relatedPersons': [{'answer': 'Jane', 'score': 0.91}, {'answer': 'John', 'score': 0.2}],
+                                     'unmapped': 'ignored'}},
+            {'_id': '2', '_source': {'vendor': [{'answer': 'Globex', 'score': 0.5}],
+                                     'relatedOrganizations': [{'answer': 'Initech', 'score': 0.99}]}},
+        ]
+
+    def test_extractDocument_from_response(self):
+        docs = list(self.sync.extractDocument({'hits': {'hits': self.hits}}))
+        self.assertEqual(len(docs), 2)
+        self.assertNotIn('unmapped', docs[0])
+        self.assertEqual(docs[1]['relatedOrganizations'], [{'answer': 'Initech', 'score': 0.99}])
+
+    def test_extractDocument_from_page_stream(self):
+        pages = (page for page in [self.hits[:1], self.hits[1:]])
+        docs = list(self.sync.extractDocument(pages))
+        self.assertEqual([doc['vendor'][0]['answer'] for doc in docs], ['Acme', 'Globex'])
+
+    def test_generateDocuments_applies_thresholds(self):
+        docs = list(self.sync.generateDocuments(iter([self.hits])))
+        self.assertEqual(docs[0]['relatedPersons'], [{'answer': 'Jane', 'score': 0.91}])
+        self.assertEqual(docs[1]['vendor'], [])
+
+    def test_equalizeListValues_ignores_dicts(self):
+        self.assertEqual(self.sync.neo4jParams['to'], ['relatedPersons', 'relatedOrganizations'])
+        self.assertEqual(self.sync.neo4jParams['from'], ['vendor', 'vendor'])
+
+    def test_mappingPlan_matches_buildGraphData(self):
+        neo4jParams = self.sync.neo4jParams
+        doc = next(self.sync.generateDocuments(iter([self.hits[:1]])))
+        for idx, spec in enumerate(self.sync.mappingPlan.specs):
+            self.assertEqual(spec.apply(doc), self.sync.buildGraphData(
+                from_type_key=neo4jParams['from'][idx], to_type_key=neo4jParams['to'][idx],
+                relationship_type=neo4jParams['relationship'][idx], from_props_keys=neo4jParams['fromProps'][idx],
+                to_props_keys=neo4jParams['toProps'][idx], relationship_props=neo4jParams['relationshipProps'][idx],
+                doc=doc, neo4jPropConvert=neo4jParams['propMap'], types=neo4jParams['types'],
+            ))
+
+    def test_neo4jQueryBuilder_fans_out_every_mapping(self):
+        hits = [
+            {'_id': '1', '_source': {'vendor': [{'answer': 'Acme', 'score': 0.95}],
+                                     'relatedPersons': [{'answer': 'Jane', 'score': 0.91}, {'answer': 'John', 'score': 0.92}],
+                                     'relatedOrganizations': [{'answer': 'Initech', 'score': 0.99}],
+                                     'amount': [{'answer': '100', 'score': 0.97}]}},
+            {'_id': '2', '_source': {'vendor': [{'answer': 'Globex', 'score': 0.93}],
+                                     'relatedOrganizations': [{'answer': 'Umbrella', 'score': 0.99}]}},
+            {'_id': '3', '_source': {'vendor': [{'answer': 'Hooli', 'score': 0.97}],
+                                     'relatedPersons': [{'answer': 'Gavin', 'score': 0.95}]}},
+        ]
+        rows = list(self.sync.neo4jQueryBuilder(iter([hits[:2], hits[2:]])))
+
+        self.assertEqual([(row['fromProps']['name'], row['toType'], row['toProps']['name']) for row in rows], [
+            ('Acme', 'person', 'Jane'), ('Acme', 'person', 'John'), ('Acme', 'organization', 'Initech'),
+            ('Globex', 'organization', 'Umbrella'), ('Hooli', 'person', 'Gavin'),
+        ])
+        self.assertEqual(rows[0]['edgeProps'], {'amount': '100'})
+        self.assertEqual(rows[3]['edgeProps'], {})
+
+    def test_neo4jQueryBuilder_raises_fetch_errors(self):
+        def pages():
+            yield self.hits
+            raise ConnectionError('point in time expired')
+        rows = self.sync.neo4jQueryBuilder(pages())
+        self.assertEqual(next(rows)['fromProps']['name'], 'Acme')
+        with self.assertRaises(ConnectionError):
+            list(rows)
+
+    def test_neo4jQueryBuilder_skips_malformed_hits(self):
+        malformed = {'_id': 'bad', '_source': {'vendor': 5}}
+        with self.assertLogs('DocumentTransform', level='ERROR'):
+            rows = list(self.sync.neo4jQueryBuilder(iter([[self.hits[0], malformed]])))
+        self.assertEqual([row['toProps']['name'] for row in rows], ['Jane'])
+
+    def test_sourceFields(self):
+        self.assertEqual(self.sync.sourceFields(), [
+            'amount.answer', 'amount.score', 'relatedOrganizations.answer', 'relatedOrganizations.score',
+            'relatedPersons.answer', 'relatedPersons.score', 'vendor.answer', 'vendor.score',
+        ])
+        self.sync.params['pushdown']['source'] = False
+        self.assertIsNone(self.sync.sourceFields())
+
+    def test_elasticsearchQueryBuilder_pushes_thresholds_down(self):
+        self.sync.params['pushdown']['thresholds'] = True
+        query = self.sync.elasticsearchQueryBuilder({'searchQueries': []})['bool']
+
+        self.assertEqual(query['must'], [])
+        self.assertEqual(query['minimum_should_match'], 0)
+        self.assertEqual([clause['nested']['path'] for clause in query['should']],
+                         ['amount', 'relatedOrganizations', 'relatedPersons', 'vendor'])
+        self.assertEqual(query['should'][3]['nested']['query'], {'range': {'vendor.score': {'gte': 0.9}}})
+        self.assertEqual(query['should'][3]['nested']['inner_hits']['name'], 'vendor')
+        self.assertEqual(query['filter'][0]['bool']['should'][0]['nested']['path'], 'vendor')
+        self.assertEqual(self.sync.sourceFields(), [])
+
+    def test_elasticsearchHandler_serializer(self):
+        handlerClass = MagicMock()
+        self.sync.elasticsearchHandler(handlerClass=handlerClass)
+        self.assertIsNone(handlerClass.call_args.kwargs['serializer'].sourceFields)
+
+        self.sync.params['fetch']['decoder'] = 'lazy'
+        self.sync.elasticsearchHandler(handlerClass=handlerClass)
+        self.assertIn('@timestamp', handlerClass.call_args.kwargs['serializer'].sourceFields)
+        self.assertIn('vendor.answer', handlerClass.call_args.kwargs['serializer'].sourceFields)
+
+        self.sync.params['fetch']['decoder'] = 'default'
+        self.sync.elasticsearchHandler(handlerClass=handlerClass)
+        self.assertIsNone(handlerClass.call_args.kwargs['serializer'])
+
+    def test_extractDocument_reads_inner_hits(self):
+        hit = {'_id': '1', '_source': {},
+               'inner_hits': {'vendor': {'hits': {'hits': [{'_source': {'answer': 'Acme', 'score': 0.95}}]}},
+                              'relatedPersons': {'hits': {'hits': []}}}}
+        docs = list(self.sync.extractDocument({'hits': {'hits': [hit]}}))
+
+        self.assertEqual(docs, [{'vendor': [{'answer': 'Acme', 'score': 0.95}], 'relatedPersons': []}])
+
+    @patch.object(ElasticsearchToNeo4jSync, 'neo4jHandler')
+    @patch.object(ElasticsearchToNeo4jSync, 'elasticsearchHandler')
+    @patch.object(ElasticsearchToNeo4jSync, 'fetchPages')
+    def test_startPipelinedProcess_streams_every_page(self, mock_fetch_pages, mock_es_handler, mock_neo4j_handler):
+        mock_fetch_pages.return_value = iter([self.hits[:1], self.hits[1:]])
+        self.sync.neo4jQueryBuilder = lambda pages: ({'hitId': hit['_id']} for hits in pages for hit in hits)
+        pushed = []
+        mock_neo4j_handler.return_value.dataPush.side_effect = lambda queriesParams: pushed.extend(queriesParams) or True
+
+        self.assertTrue(self.sync.startPipelinedProcess({'searchQueries': []}))
+        self.assertEqual(pushed, [{'hitId': '1'}, {'hitId': '2'}])
+
+    @patch.object(ElasticsearchToNeo4jSync, 'neo4jHandler')
+    @patch.object(ElasticsearchToNeo4jSync, 'elasticsearchHandler')
+    @patch.object(ElasticsearchToNeo4jSync, 'fetchPages')
+    def test_startPipelinedProcess_surfaces_reader_errors(self, mock_fetch_pages, mock_es_handler, mock_neo4j_handler):
+        def pages():
+            yield self.hits
+            raise Exception('test error')
+        mock_fetch_pages.return_value = pages()
+        self.sync.neo4jQueryBuilder = lambda pages: iter([{}])
+
+        def dataPush(queriesParams):
+            try:
+                list(queriesParams)
+            except Exception:
+                return False
+            return True
+        mock_neo4j_handler.return_value.dataPush.side_effect = dataPush
+
+        self.assertFalse(self.sync.startPipelinedProcess({'searchQueries': []}))
+
+    @patch.object(ElasticsearchToNeo4jSync, 'neo4jHandler')
+    @patch.object(ElasticsearchToNeo4jSync, 'elasticsearchHandler')
+    @patch.object(ElasticsearchToNeo4jSync, 'fetchPages')
+    def test_startProcessAsync(self, mock_fetch_pages, mock_es_handler, mock_neo4j_handler):
+        import asyncio
+
+        async def pages():
+            yield self.hits[:1]
+            yield self.hits[1:]
+        mock_fetch_pages.return_value = pages()
+        mock_es_handler.return_value.close = AsyncMock()
+        mock_neo4j_handler.return_value.close = AsyncMock()
+        self.sync.neo4jQueryBuilder = lambda pages: ({'hitId': hit['_id']} for hits in pages for hit in hits)
+        pushed = []
+
+        async def dataPush(queriesParams):
+            pushed.extend([queryParams async for queryParams in queriesParams])
+            return True
+        mock_neo4j_handler.return_value.dataPush = dataPush
+
+        self.assertTrue(asyncio.run(self.sync.startProcessAsync({'searchQueries': []})))
+        self.assertEqual(pushed, [{'hitId': '1'}, {'hitId': '2'}])
+        mock_es_handler.return_value.close.assert_awaited_once()
+        mock_neo4j_handler.return_value.close.assert_awaited_once()
+
+    @patch.object(ElasticsearchToNeo4jSync, 'neo4jHandler')
+    @patch.object(ElasticsearchToNeo4jSync, 'elasticsearchHandler')
+    @patch.object(ElasticsearchToNeo4jSync, 'fetchPages')
+    def test_startProcessAsync_summarizes_concurrent_runs_apart(self, mock_fetch_pages, mock_es_handler, mock_neo4j_handler):
+        import asyncio
+        import json
+
+        def fetchPages(esHandler, query):
+            async def pages():
+                for hits in [self.hits] * (1 if esHandler is first else 3):
+                    yield hits
+            return pages()
+        mock_fetch_pages.side_effect = fetchPages
+        first, second = MagicMock(close=AsyncMock()), MagicMock(close=AsyncMock())
+        mock_es_handler.side_effect = [first, second]
+        mock_neo4j_handler.return_value.close = AsyncMock()
+
+        async def dataPush(queriesParams):
+            async for _ in queriesParams:
+                await asyncio.sleep(0)
+            return True
+        mock_neo4j_handler.return_value.dataPush = dataPush
+
+        async def runs():
+            return await asyncio.gather(self.sync.startProcessAsync({'searchQueries': []}), self.sync.startProcessAsync({'searchQueries': []}))
+
+        with self.assertLogs('ElasticsearchToNeo4jSync', level='INFO') as logs:
+            self.assertEqual(asyncio.run(runs()), [True, True])
+        summaries = [json.loads(line.split('startProcessAsync metrics: ', 1)[1]) for line in logs.output if 'startProcessAsync metrics' in line]
+        self.assertCountEqual([summary['counters']['documents_total'] for summary in summaries], [2, 6])
+        self.assertEqual(self.sync.metrics.summary()['counters']['documents_total'], 8)
+
+    @patch.object(ElasticsearchToNeo4jSync, 'neo4jHandler')
+    @patch.object(ElasticsearchToNeo4jSync, 'elasticsearchHandler')
+    @patch.object(ElasticsearchToNeo4jSync, 'fetchPages')
+    def test_runners_abort_when_the_query_cannot_be_built(self, mock_fetch_pages, mock_es_handler, mock_neo4j_handler):
+        import asyncio
+        # the properties of a search query must be a dict, so no query can be built from this event
+        event = {'searchQueries': [{'properties': [{'subject': 'vendor', 'value': 'Acme'}]}]}
+
+        with self.assertLogs('ElasticsearchToNeo4jSync', level='ERROR'):
+            self.assertFalse(self.sync.startProcess(event))
+            self.assertFalse(self.sync.startSearchProcess(event))
+            self.assertFalse(self.sync.startIncrementalProcess(event))
+            self.assertFalse(self.sync.startPipelinedProcess(event))
+            self.assertFalse(asyncio.run(self.sync.startProcessAsync(event)))
+            with self.assertRaises(Exception):
+                self.sync.exportBulk(event, 'unused')
+        mock_fetch_pages.assert_not_called()
+        mock_es_handler.assert_not_called()
+        mock_neo4j_handler.assert_not_called()
+
+    @patch.object(ElasticsearchToNeo4jSync, 'neo4jHandler')
+    @patch.object(ElasticsearchToNeo4jSync, 'elasticsearchHandler')
+    def test_startIncrementalProcess_checkpoints_committed_pages(self, mock_es_handler, mock_neo4j_handler):
+        self.sync.checkpoints = CheckpointStore(':memory:')
+        self.sync.neo4jQueryBuilder = lambda pages: iter([])
+        esHandler = mock_es_handler.return_value
+        esHandler.index = 'test_index'
+        pages = [[{'_id': '1', 'sort': [100, 0]}], [{'_id': '2', 'sort': [200, 1]}]]
+        esHandler.dataStream.return_value = (page for page in pages)
+        mock_neo4j_handler.return_value.dataPush.side_effect = [True, False]
+
+        self.assertFalse(self.sync.startIncrementalProcess({'searchQueries': []}))
+        self.assertNotIn('filter', str(esHandler.dataStream.call_args.kwargs['query']))
+        self.assertEqual(esHandler.dataStream.call_args.kwargs['sort'][0], {'@timestamp': 'asc'})
+        # the second page failed, so the run resumes after the first one
+        self.assertEqual(self.sync.checkpoints.load('test_index', {}), 100)
+
+        esHandler.dataStream.return_value = (page for page in pages[1:])
+        mock_neo4j_handler.return_value.dataPush.side_effect = [True]
+        self.assertTrue(self.sync.startIncrementalProcess({'searchQueries': []}))
+        self.assertEqual(esHandler.dataStream.call_args.kwargs['query'],
+                         {'bool': {'must': [], 'filter': [{'range': {'@timestamp': {'gte': 100}}}]}})
+        self.assertEqual(self.sync.checkpoints.load('test_index', {}), 200)
+
+    @patch.dict('os.environ', {'NEO4J_WRITERS': '3'})
+    def test_startProcess_pushes_on_NEO4J_WRITERS_sessions(self):
+        from Benchmark import BenchmarkSync, SyntheticSearch, RecordingDriver
+        sync = BenchmarkSync()
+        sync.params['fetch']['pageSize'] = 100
+        sync.search = SyntheticSearch(250, pageSize=100, scores='high')
+        sync.driver = RecordingDriver()
+        self.assertEqual(sync.neo4jHandlerParams()['writers'], 3)
+
+        with patch.object(Neo4jHandler, 'dataPushConcurrent', autospec=True, side_effect=Neo4jHandler.dataPushConcurrent) as mock_push:
+            self.assertTrue(sync.startProcess({'searchQueries': []}))
+        self.assertEqual(mock_push.call_args.kwargs['writers'], 3)
+        pages = [SyntheticSearch(250, pageSize=100, scores='high').search(size=100, search_after=[offset - 1] if offset else None)['hits']['hits'] for offset in (0, 100, 200)]
+        self.assertEqual(sync.driver.rows, len(list(sync.neo4jQueryBuilder(pages))))
+
+    @patch.object(Elasticsearch, 'msearch')
+    @patch.object(ElasticsearchToNeo4jSync, 'neo4jHandler')
+    @patch.object(ElasticsearchToNeo4jSync, 'elasticsearchHandler')
+    def test_startBatchProcess(self, mock_es_handler, mock_neo4j_handler, mock_msearch):
+        from logging import Logger
+        mock_es_handler.return_value = ElasticsearchHandler(hosts=['https://localhost:9200'], username='username', password='password',
+                                                            caCerts=None, caFingerprint=None, index='test_index', logger=Logger('test_logger'))
+        # the second event is malformed, its properties must be a dict, so it has no query and is never sent
+        events = [{'searchQueries': [{'properties': {'subject': 'name', 'value': 'Acme'}}]},
+                  {'searchQueries': [{'properties': [{'subject': 'name', 'value': 'Initech'}]}]},
+                  {'searchQueries': [{'properties': {'subject': 'name', 'value': 'Globex'}}]},
+                  {'searchQueries': [{'properties': {'subject': 'name', 'value': 'Hooli'}}]}]
+        mock_msearch.return_value = {'responses': [
+            {'hits': {'hits': self.hits[:1]}}, {'error': {'type': 'query_shard_exception'}, 'status': 400}, {'hits': {'hits': self.hits[1:]}},
+        ]}
+        pushed = []
+
+        def dataPush(queriesParams):
+            pushed.append(list(queriesParams))
+            return True
+        mock_neo4j_handler.return_value.dataPush.side_effect = dataPush
+
+        with self.assertLogs('ElasticsearchToNeo4jSync', level='ERROR'):
+            self.assertEqual(self.sync.startBatchProcess(events), [True, False, False, True])
+        queries = [body['query'] for body in mock_msearch.call_args.kwargs['searches'][1::2]]
+        self.assertEqual(queries, [self.sync.elasticsearchQueryBuilder(event) for event in (events[0], events[2], events[3])])
+        self.assertEqual([query['bool']['must'][0]['multi_match']['query'] for query in queries], ['acme', 'globex', 'hooli'])
+        self.assertEqual(pushed, [list(self.sync.neo4jQueryBuilder([self.hits[:1]])), list(self.sync.neo4jQueryBuilder([self.hits[1:]]))])
+        self.assertEqual(self.sync.startBatchProcess([]), [])
+
+    @patch.object(ElasticsearchToNeo4jSync, 'neo4jHandler')
+    @patch.object(ElasticsearchToNeo4jSync, 'elasticsearchHandler')
+    @patch.object(ElasticsearchToNeo4jSync, 'fetchPages')
+    def test_startProcess_logs_metrics_summary(self, mock_fetch_pages, mock_es_handler, mock_neo4j_handler):
+        import json
+        mock_fetch_pages.return_value = iter([self.hits[:1], self.hits[1:]])
+        mock_neo4j_handler.return_value.dataPush.side_effect = lambda queriesParams: bool(list(queriesParams))
+
+        with self.assertLogs('ElasticsearchToNeo4jSync', level='INFO') as logs:
+            self.assertTrue(self.sync.startProcess({'searchQueries': []}))
+
+        summary = json.loads(logs.output[-1].split('startProcess metrics: ', 1)[1])
+        self.assertEqual(summary['counters']['documents_total'], 2)
+        self.assertEqual(summary['stages']['transform']['count'], 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,144 @@
+import time
+import asyncio
+import unittest
+from threading import Thread
+from logging import Logger
+from neo4j.exceptions import TransientError
+from FakeNeo4jDriver import FakeNeo4jDriver, AsyncFakeNeo4jDriver
+from Neo4jHandler import Neo4jHandler
+from AsyncNeo4jHandler import AsyncNeo4jHandler
+
+
+class FakeNeo4jHandler(Neo4jHandler):
+    def __init__(self, driver, **handlerParams):
+        self.fakeDriver = driver
+        super().__init__(**handlerParams)
+
+    def createDriver(self, uri, user, password, **poolParams):
+        return self.fakeDriver
+
+
+class AsyncFakeNeo4jHandler(AsyncNeo4jHandler):
+    def __init__(self, driver, **handlerParams):
+        self.fakeDriver = driver
+        super().__init__(**handlerParams)
+
+    def createDriver(self, uri, user, password, **poolParams):
+        return self.fakeDriver
+
+
+class TestFakeNeo4jDriver(unittest.TestCase):
+
+    def setUp(self):
+        self.params = {'nodeTypes': ['Person', 'Organization'], 'reqProps': ['name'], 'bootstrapSchema': True, 'chunkSize': 3, 'retryBackoff': 0.001}
+        self.dyads = [self.dyad(f"Vendor{n % 3}", f"Org{n % 7}", n) for n in range(30)]
+
+    def dyad(self, vendor, organization, amount):
+        return {'fromType': 'person', 'fromProps': {'name': vendor}, 'edgeType': 'HAS_PROVIDED_BUSINESS_TO', 'edgeProps': {'amount': amount},
+                'toType': 'organization', 'toProps': {'name': organization}}
+
+    def handler(self, driver, handlerClass=FakeNeo4jHandler, **params):
+        return handlerClass(driver=driver, neo4jParameters=dict(self.params, **params), uri=None, user=None, password=None, logger=Logger('test_logger'))
+
+    def test_merge_semantics(self):
+        driver = FakeNeo4jDriver()
+        handler = self.handler(driver)
+
+        self.assertTrue(handler.dataPush(iter(self.dyads)))
+        self.assertTrue(handler.dataPush(iter(self.dyads)))
+
+        self.assertEqual((driver.nodeCount('Person'), driver.nodeCount('Organization')), (3, 7))
+        self.assertEqual(driver.relationshipCount('HAS_PROVIDED_BUSINESS_TO'), 21)
+        self.assertEqual(driver.node('Person', name='Vendor1'), {'name': 'Vendor1'})
+        self.assertEqual(driver.graph.relationships[(('Person', (('name', 'Vendor2'),)), 'HAS_PROVIDED_BUSINESS_TO', ('Organization', (('name', 'Org1'),)))], {'amount': 29})
+        self.assertEqual(len(driver.graph.indexes), 2)
+
+    def test_concurrent_writers(self):
+        driver = FakeNeo4jDriver(latency=0.0005)
+        self.assertTrue(self.handler(driver, writers=4, maxRetries=20).dataPush(iter(self.dyads)))
+        self.assertEqual((driver.nodeCount(), driver.relationshipCount()), (10, 21))
+        self.assertEqual(driver.graph.locks, {})
+
+    def test_rollback_on_memory_limit(self):
+        driver = FakeNeo4jDriver(memoryLimitRows=10)
+        self.assertFalse(self.handler(driver).dataPush(iter(self.dyads)))
+        self.assertEqual((driver.nodeCount(), driver.relationshipCount(), driver.stats['rollbacks']), (0, 0, 1))
+
+    def test_conflicts_are_retried(self):
+        driver = FakeNeo4jDriver(conflictRate=1.0)
+        handler = self.handler(driver, maxRetries=2)
+        handler.prepareSchema()
+        with self.assertRaises(TransientError):
+            handler.executeBatch(*next(iter(handler.batchRows(self.dyads, chunk=3)))[1:])
+        self.assertEqual(driver.stats['conflicts'], 3)
+
+    def test_deadlock_detection(self):
+        driver = FakeNeo4jDriver(lockTimeout=5)
+        statement = "UNWIND $rows AS row MERGE (a:`Person` {`name`: row.name})"
+        first, second = driver.session().begin_transaction(), driver.session().begin_transaction()
+        first.run(statement, rows=[{'name': 'A'}])
+        second.run(statement, rows=[{'name': 'B'}])
+        waiter = Thread(target=lambda: first.run(statement, rows=[{'name': 'B'}]))
+        waiter.start()
+        while first.id not in driver.graph.waiting:
+            time.sleep(0.001)
+
+        with self.assertRaises(TransientError) as context:
+            second.run(statement, rows=[{'name': 'A'}])
+        self.assertEqual(context.exception.code, 'Neo.TransientError.Transaction.DeadlockDetected')
+        second.rollback()
+        waiter.join()
+        first.commit()
+        self.assertEqual(driver.nodeCount('Person'), 2)
+
+    def test_lock_timeout(self):
+        driver = FakeNeo4jDriver(lockTimeout=0.01)
+        statement = "UNWIND $rows AS row MERGE (a:`Person` {`name`: row.name})"
+        driver.session().begin_transaction().run(statement, rows=[{'name': 'A'}])
+        with self.assertRaises(TransientError):
+            driver.session().begin_transaction().run(statement, rows=[{'name': 'A'}])
+
+    def test_match_skips_missing_nodes(self):
+        driver = FakeNeo4jDriver()
+        session = driver.session()
+        session.run("UNWIND $rows AS row MERGE (n:`Person` {`name`: row.name})", rows=[{'name': 'A'}, {'name': 'B'}])
+        summary = session.run(
+            "UNWIND $rows AS row MATCH (a:`Person` {`name`: row.from}) MATCH (b:`Person` {`name`: row.to}) MERGE (a)-[r:`KNOWS`]->(b) SET r += row.props",
+            rows=[{'from': 'A', 'to': 'B', 'props': {'since': 2020}}, {'from': 'A', 'to': 'C', 'props': {}}],
+        ).consume()
+        self.assertEqual(summary.counters['relationships_created'], 1)
+        self.assertEqual(driver.nodeCount(), 2)
+
+    def test_unsupported_statement(self):
+        with self.assertRaises(Exception):
+            FakeNeo4jDriver().session().run("MATCH (n) DETACH DELETE n")
+
+    def test_async_writers(self):
+        driver = AsyncFakeNeo4jDriver(latency=0.0005)
+        handler = self.handler(driver, handlerClass=AsyncFakeNeo4jHandler, writers=4, maxRetries=20)
+        self.assertTrue(asyncio.run(handler.dataPush(iter(self.dyads))))
+        self.assertEqual((driver.nodeCount(), driver.relationshipCount()), (10, 21))
+    def test_two_phase_strategy(self):
+        expected = FakeNeo4jDriver()
+        self.assertTrue(self.handler(expected).dataPush(iter(self.dyads)))
+        for writers in (1, 4):
+            with self.subTest(writers=writers):
+                driver = FakeNeo4jDriver(latency=0.0005)
+                handler = self.handler(driver, writers=writers, maxRetries=20, writeStrategy='twoPhase', twoPhaseWindow=12)
+                self.assertTrue(handler.dataPush(iter(self.dyads)))
+                self.assertEqual(driver.graph.nodes, expected.graph.nodes)
+                self.assertEqual(driver.graph.relationships, expected.graph.relationships)
+
+    def test_async_two_phase_strategy(self):
+        async def dyads():
+            for dyad in self.dyads:
+                yield dyad
+
+        driver = AsyncFakeNeo4jDriver(latency=0.0005)
+        handler = self.handler(driver, handlerClass=AsyncFakeNeo4jHandler, writers=4, maxRetries=20, writeStrategy='twoPhase', twoPhaseWindow=12)
+        self.assertTrue(asyncio.run(handler.dataPush(dyads())))
+        self.assertEqual((driver.nodeCount(), driver.relationshipCount()), (10, 21))
+
+
+if __name__ == '__main__':
+    unittest.main()
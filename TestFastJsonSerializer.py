@@ -0,0 +1,76 @@
+import json
+import unittest
+from unittest.mock import patch
+from logging import Logger
+import FastJsonSerializer as fastJsonSerializerModule
+from FastJsonSerializer import FastJsonSerializer
+from ElasticsearchHandler import ElasticsearchHandler
+
+
+class TestFastJsonSerializer(unittest.TestCase):
+
+    def setUp(self):
+        self.response = {
+            'took': 3,
+            'pit_id': 'pit-1',
+            'hits': {'total': {'value': 1, 'relation': 'eq'}, 'hits': [{
+                '_id': '1', 'sort': [100, 0],
+                '_source': {'vendor': [{'answer': 'Acme', 'score': 0.95, 'context': 'long passage'}],
+                            'amount': {'answer': '100', 'score': 0.97},
+                            'body': 'unmapped text', '@timestamp': 100},
+                'inner_hits': {'relatedPersons': {'hits': {'hits': [{'_source': {'answer': 'Jane', 'score': 0.91}}]}}},
+            }]},
+        }
+        self.data = json.dumps(self.response).encode()
+
+    def test_round_trip(self):
+        serializer = FastJsonSerializer()
+
+        self.assertEqual(serializer.loads(serializer.dumps(self.response)), self.response)
+        self.assertIsNone(serializer.loads(b''))
+
+    def test_lazy_loads_only_mapped_fields(self):
+        serializer = FastJsonSerializer(sourceFields=['vendor.answer', 'vendor.score', 'amount.answer', '@timestamp'])
+
+        response = serializer.loads(self.data)
+        hit = response['hits']['hits'][0]
+        self.assertEqual(hit['_source'], {'vendor': [{'answer': 'Acme', 'score': 0.95}], 'amount': {'answer': '100'}, '@timestamp': 100})
+        self.assertEqual(hit['sort'], [100, 0])
+        self.assertEqual(hit['inner_hits'], self.response['hits']['hits'][0]['inner_hits'])
+        self.assertEqual((response['pit_id'], response['hits']['total']['value']), ('pit-1', 1))
+
+    def test_lazy_project_skips_unmapped_entity_keys(self):
+        serializer = FastJsonSerializer(sourceFields=['vendor.answer', 'vendor.score', 'amount.answer'])
+        self.response['hits']['hits'][0]['_source']['vendor'].append('Globex')
+
+        with patch.object(FastJsonSerializer, 'plain', side_effect=FastJsonSerializer.plain) as plain:
+            hit = serializer.loads(json.dumps(self.response).encode())['hits']['hits'][0]
+        self.assertEqual(hit['_source'], {'vendor': [{'answer': 'Acme', 'score': 0.95}, 'Globex'], 'amount': {'answer': '100'}})
+        # only the mapped keys are pulled out of the entities, never the entities or the entity lists as a whole
+        simdjson = fastJsonSerializerModule.simdjson
+        materialized = [call.args[0] for call in plain.call_args_list if isinstance(call.args[0], (simdjson.Object, simdjson.Array))]
+        self.assertFalse([value for value in materialized if 'answer' in value or 'Globex' in value])
+
+    def test_lazy_loads_other_responses_in_full(self):
+        serializer = FastJsonSerializer(sourceFields=['vendor.answer'])
+
+        self.assertEqual(serializer.loads(b'{"id": "pit-1", "shards": {"total": 1}}'), {'id': 'pit-1', 'shards': {'total': 1}})
+
+    @patch.object(fastJsonSerializerModule, 'simdjson', None)
+    def test_without_simdjson(self):
+        serializer = FastJsonSerializer(sourceFields=['vendor.answer'])
+
+        self.assertFalse(serializer.lazy)
+        self.assertEqual(serializer.loads(self.data), self.response)
+
+    def test_handler_client_uses_serializer(self):
+        serializer = FastJsonSerializer(sourceFields=['vendor.answer'])
+        handler = ElasticsearchHandler(
+            hosts=['https://localhost:9200'], username='username', password='password', caCerts=None,
+            caFingerprint=None, index='test_index', logger=Logger('test_logger'), serializer=serializer,
+        )
+
+        self.assertIs(handler.client.transport.serializers.get_serializer('application/vnd.elasticsearch+json; compatible-with=8'), serializer)
+
+if __name__ == '__main__':
+    unittest.main()
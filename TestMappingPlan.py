@@ -0,0 +1,66 @@
+import pickle
+import unittest
+from MappingPlan import MappingPlan, DyadSpec
+
+
+class TestMappingPlan(unittest.TestCase):
+
+    def setUp(self):
+        self.neo4jParams = {
+            'from': ['vendor', 'vendor', 'vendor'],
+            'fromProps': ['answer', 'answer', 'answer'],
+            'to': ['relatedPersons', 'relatedOrganizations', 'relatedPersons'],
+            'toProps': ['answer', ['answer', 'score'], 'answer'],
+            'relationship': ['HAS_PROVIDED_BUSINESS_TO'] * 3,
+            'relationshipProps': ['amount'] * 3,
+            'propMap': {'answer': 'name'},
+            'types': {'vendor': 'person', 'relatedPersons': 'person', 'relatedOrganizations': 'organization'},
+        }
+        self.doc = {
+            'vendor': [{'answer': 'Acme', 'score': 0.95}],
+            'relatedPersons': [{'answer': 'Jane', 'score': 0.91}],
+            'relatedOrganizations': [{'answer': 'Initech', 'score': 0.99}],
+            'amount': [{'answer': '100', 'score': 0.97}],
+        }
+
+    def test_compile_resolves_types_and_props(self):
+        plan = MappingPlan.compile(self.neo4jParams)
+
+        self.assertEqual(len(plan.specs), 2)
+        spec = plan.specs[1]
+        self.assertEqual((spec.fromType, spec.toType, spec.relationshipType), ('person', 'organization', 'HAS_PROVIDED_BUSINESS_TO'))
+        self.assertEqual(spec.toProps, (('answer', 'name'), ('score', 'score')))
+        self.assertEqual(spec.relationshipProps, (('amount', 'amount'),))
+
+    def test_apply(self):
+        spec = MappingPlan.compile(self.neo4jParams).specs[0]
+
+        self.assertEqual(spec.apply(self.doc), {
+            'fromType': 'person', 'toType': 'person', 'edgeType': 'HAS_PROVIDED_BUSINESS_TO',
+            'fromProps': {'name': 'Acme'}, 'toProps': {'name': 'Jane'}, 'edgeProps': {'amount': '100'},
+        })
+
+    def test_apply_without_end_node(self):
+        spec = MappingPlan.compile(self.neo4jParams).specs[0]
+
+        self.assertIsNone(spec.apply({'vendor': self.doc['vendor'], 'relatedPersons': []}))
+
+    def test_expand_every_entity_pair(self):
+        plan = MappingPlan.compile(self.neo4jParams)
+        self.doc['relatedPersons'].append({'answer': 'John', 'score': 0.92})
+
+        rows = list(plan.expand(self.doc))
+        self.assertEqual([row['toProps']['name'] for row in rows], ['Jane', 'John', 'Initech'])
+        self.assertTrue(all(row['edgeProps'] == {'amount': '100'} for row in rows))
+
+    def test_slots_and_pickle(self):
+        plan = MappingPlan.compile(self.neo4jParams)
+
+        with self.assertRaises(AttributeError):
+            plan.specs[0].extra = True
+        restored = pickle.loads(pickle.dumps(plan))
+        self.assertIsInstance(restored.specs[0], DyadSpec)
+        self.assertEqual(restored.specs[0].apply(self.doc), plan.specs[0].apply(self.doc))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+import os
+import tempfile
+import unittest
+from logging import Logger
+from Neo4jBulkExporter import Neo4jBulkExporter
+
+
+class TestNeo4jBulkExporter(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.exporter = Neo4jBulkExporter(self.directory.name, nodeProperties=['name'], relationshipProperties=['amount:float'],
+                                          keyProps=['name'], logger=Logger('test_logger'))
+
+    def tearDown(self):
+        self.exporter.close()
+        self.directory.cleanup()
+
+    def dyad(self, fromName, toName, toType='organization', amount=10):
+        return {"fromType": "person", "fromProps": {"name": fromName},
+                "toType": toType, "toProps": {"name": toName},
+                "edgeType": "HAS_PROVIDED_BUSINESS_TO", "edgeProps": {"amount": amount}}
+
+    def read(self, fileName):
+        with open(os.path.join(self.directory.name, fileName)) as csvFile:
+            return csvFile.read().splitlines()
+
+    def test_writes_deduplicated_nodes_and_relationships(self):
+        stats = self.exporter.write([self.dyad("Acme", "Initech"), self.dyad("Acme", "Initech"),
+                                     self.dyad("Acme", "Jane", toType="person"), self.dyad("Acme", None)])
+        self.exporter.close()
+        self.assertEqual(stats, {'nodes': 3, 'relationships': 2, 'duplicateNodes': 3, 'duplicateRelationships': 1, 'skipped': 1})
+        self.assertEqual(self.read('nodes_Person_header.csv'), [':ID,name,:LABEL'])
+        self.assertEqual(self.read('nodes_Person.csv'), ['Person|Acme,Acme,Person', 'Person|Jane,Jane,Person'])
+        self.assertEqual(self.read('nodes_Organization.csv'), ['Organization|Initech,Initech,Organization'])
+        self.assertEqual(self.read('relationships_HAS_PROVIDED_BUSINESS_TO_header.csv'), [':START_ID,:END_ID,amount:float,:TYPE'])
+        self.assertEqual(self.read('relationships_HAS_PROVIDED_BUSINESS_TO.csv')[0],
+                         'Person|Acme,Organization|Initech,10,HAS_PROVIDED_BUSINESS_TO')
+
+    def test_importCommand(self):
+        self.exporter.write([self.dyad("Acme", "Initech")])
+        command = self.exporter.importCommand()
+        self.assertTrue(command.startswith('neo4j-admin database import full --nodes='))
+        self.assertIn('relationships_HAS_PROVIDED_BUSINESS_TO_header.csv', command)
+        self.assertTrue(command.endswith(' neo4j'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,6 +2,7 @@ import unittest
 from unittest.mock import MagicMock, patch
 from logging import Logger
 from Neo4jHandler import Neo4jHandler
+from DyadCache import DyadCache
 
 
 class TestNeo4jHandler(unittest.TestCase):
@@ -227,6 +228,305 @@ class TestNeo4jHandler(unittest.TestCase):
         with self.assertRaises(Exception):
             self.neo4j_handler.createDyad(from_nodeType, from_nodeProps, relationship_type, relationship_props, to_nodeType, to_nodeProps)
 
+    def dyad(self, fromName, toName, toType="organization", edgeType="HAS_PROVIDED_BUSINESS_TO"):
+        return {"fromType": "person", "fromProps": {"name": fromName},
+                "toType": toType, "toProps": {"name": toName},
+                "edgeType": edgeType, "edgeProps": {"amount": 10}}
+
+    def test_batchStatement_is_cached_per_shape(self):
+        statement = self.neo4j_handler.batchStatement("Person", "HAS_PROVIDED_BUSINESS_TO", "Organization")
+        self.assertIs(statement, self.neo4j_handler.batchStatement("Person", "HAS_PROVIDED_BUSINESS_TO", "Organization"))
+        self.assertTrue(statement.startswith("UNWIND $rows AS row"))
+        self.assertIn("MERGE (a:`Person` {`name`: row.fromKey.`name`})", statement)
+        self.assertIn("MERGE (a)-[r:`HAS_PROVIDED_BUSINESS_TO`]->(b)", statement)
+
+    def test_batchStatement_rejects_injection(self):
+        with self.assertRaises(Exception):
+            self.neo4j_handler.batchStatement("Person", "KNOWS`]->(b) DETACH DELETE b //", "Person")
+
+    def test_batchRows_groups_by_shape(self):
+        dyads = [self.dyad("Acme", "Initech"), self.dyad("Acme", "Jane", toType="person"),
+                 self.dyad("Globex", "Initech"), self.dyad("Umbrella", "Hooli")]
+        batches = list(self.neo4j_handler.batchRows(dyads, chunk=2))
+        self.assertEqual([len(rows) for _, _, rows in batches], [2, 1, 1])
+        self.assertEqual(len({statement for _, statement, _ in batches}), 2)
+        self.assertEqual(batches[0][2][0], {"fromKey": {"name": "Acme"}, "fromProps": {"name": "Acme"},
+                                            "toKey": {"name": "Initech"}, "toProps": {"name": "Initech"},
+                                            "edgeProps": {"amount": 10}})
+
+    def test_batchRows_skips_dyads_without_key_props(self):
+        dyad = self.dyad("Acme", "Initech")
+        dyad["toProps"] = {}
+        self.assertEqual(list(self.neo4j_handler.batchRows([dyad], chunk=10)), [])
+
+    def test_dataPush_runs_parameterized_batches(self):
+        self.neo4j_handler.driver = MagicMock()
+        tx = self.neo4j_handler.driver.session.return_value.__enter__.return_value.begin_transaction.return_value
+        self.assertTrue(self.neo4j_handler.dataPush(iter([self.dyad("Acme", "Initech"), self.dyad("Globex", "Hooli")])))
+        tx.run.assert_called_once()
+        self.assertEqual(len(tx.run.call_args.kwargs["rows"]), 2)
+        tx.commit.assert_called_once()
+
+    def test_dataPush_rolls_back_on_error(self):
+        self.neo4j_handler.driver = MagicMock()
+        tx = self.neo4j_handler.driver.session.return_value.__enter__.return_value.begin_transaction.return_value
+        tx.run.side_effect = Exception("test error")
+        self.assertFalse(self.neo4j_handler.dataPush([self.dyad("Acme", "Initech")]))
+        tx.rollback.assert_called_once()
+
+    def test_twoPhaseRows_merges_distinct_nodes_first(self):
+        self.neo4j_handler.params = dict(self.params, writeStrategy="twoPhase")
+        dyads = [self.dyad("Acme", "Initech"), self.dyad("Acme", "Hooli"), self.dyad("Globex", "Initech")]
+        dyads[1]["fromProps"] = {"name": "Acme", "country": "US"}
+        batches = list(self.neo4j_handler.writeBatches(dyads, chunk=10))
+
+        statements = [statement for _, statement, _ in batches]
+        self.assertEqual([statement is None for statement in statements], [False, False, True, False, True])
+        self.assertIn("MERGE (n:`Person`", statements[0])
+        self.assertEqual(batches[0][2], [{"key": {"name": "Acme"}, "props": {"name": "Acme", "country": "US"}},
+                                         {"key": {"name": "Globex"}, "props": {"name": "Globex"}}])
+        self.assertEqual(len(batches[1][2]), 2)
+        self.assertTrue(statements[3].startswith("UNWIND $rows AS row MATCH (a:`Person`"))
+        self.assertEqual(len(batches[3][2]), 3)
+        self.assertNotIn("fromProps", batches[3][2][0])
+
+    def test_twoPhaseRows_partitions_relationships_by_hub(self):
+        self.neo4j_handler.params = dict(self.params, writeStrategy="twoPhase")
+        dyads = [self.dyad(f"Vendor{n}", "Hub") for n in range(12)] + [self.dyad("Vendor0", "Other")]
+        relationships = [(partition, rows) for partition, statement, rows in self.neo4j_handler.writeBatches(dyads, chunk=100, partitions=4)
+                         if statement is not None and "MATCH" in statement]
+        hubRows = [[row for row in rows if row["toKey"]["name"] == "Hub"] for _, rows in relationships]
+        hubRows = [rows for rows in hubRows if rows]
+        # the relationship of Vendor0 to Other may share the partition, and so the batch, of the hub
+        self.assertEqual(len(hubRows), 1)
+        self.assertEqual(len(hubRows[0]), 12)
+
+    def test_writeStrategy_rejects_unknown_strategies(self):
+        self.neo4j_handler.params = dict(self.params, writeStrategy="nodesOnly")
+        with self.assertRaises(Exception):
+            self.neo4j_handler.writeBatches([], chunk=10)
+
+    def test_batchRows_partitions_by_start_node(self):
+        dyads = [self.dyad(f"Vendor{n % 5}", f"Org{n}") for n in range(50)]
+        partitionsByVendor = {}
+        for partition, _, rows in self.neo4j_handler.batchRows(dyads, chunk=3, partitions=4):
+            for row in rows:
+                partitionsByVendor.setdefault(row["fromKey"]["name"], set()).add(partition)
+        self.assertTrue(all(len(partitions) == 1 for partitions in partitionsByVendor.values()))
+
+    def test_dataPushConcurrent_commits_every_batch(self):
+        self.neo4j_handler.params = dict(self.params, writers=3, chunkSize=4)
+        self.neo4j_handler.driver = MagicMock()
+        tx = self.neo4j_handler.driver.session.return_value.__enter__.return_value.begin_transaction.return_value
+        self.assertTrue(self.neo4j_handler.dataPush(self.dyad(f"Vendor{n}", f"Org{n}") for n in range(20)))
+        committed = sum(len(call.kwargs["rows"]) for call in tx.run.call_args_list)
+        self.assertEqual(committed, 20)
+        self.assertEqual(tx.commit.call_count, tx.run.call_count)
+
+    @patch('Neo4jHandler.time.sleep')
+    def test_executeBatch_retries_transient_errors(self, mock_sleep):
+        from neo4j.exceptions import TransientError
+        self.neo4j_handler.params = dict(self.params, maxRetries=2)
+        self.neo4j_handler.driver = MagicMock()
+        tx = self.neo4j_handler.driver.session.return_value.__enter__.return_value.begin_transaction.return_value
+        tx.run.return_value.consume.return_value = "summary"
+        tx.run.side_effect = [TransientError("deadlock"), tx.run.return_value]
+        self.assertEqual(self.neo4j_handler.executeBatch("statement", [{}]), "summary")
+        self.assertEqual(mock_sleep.call_count, 1)
+        tx.commit.assert_called_once()
+        self.assertEqual(tx.close.call_count, 2)
+
+        tx.run.side_effect = TransientError("deadlock")
+        with self.assertRaises(TransientError):
+            self.neo4j_handler.executeBatch("statement", [{}])
+        self.assertEqual(tx.run.call_count, 2 + 3)
+
+    @patch('Neo4jHandler.time.sleep')
+    def test_executeBatch_records_metrics(self, mock_sleep):
+        from neo4j.exceptions import TransientError
+        from SyncMetrics import SyncMetrics
+        self.neo4j_handler.metrics = SyncMetrics()
+        self.neo4j_handler.driver = MagicMock()
+        tx = self.neo4j_handler.driver.session.return_value.__enter__.return_value.begin_transaction.return_value
+        tx.run.side_effect = [TransientError("deadlock"), tx.run.return_value]
+        self.neo4j_handler.executeBatch("statement", [{}, {}])
+
+        summary = self.neo4j_handler.metrics.summary()
+        self.assertEqual(summary['counters'], {'retries_total': 1, 'rows_total': 2})
+        self.assertEqual(summary['stages']['push']['count'], 2)
+        self.assertEqual(summary['histograms']['batch_rows']['count'], 1)
+
+    def test_executeBatch_splits_batches_out_of_memory(self):
+        from neo4j.exceptions import Neo4jError
+        from BatchSizeController import BatchSizeController
+        self.neo4j_handler.batchSizer = BatchSizeController(initialSize=8, minSize=1)
+        self.neo4j_handler.driver = MagicMock()
+        tx = self.neo4j_handler.driver.session.return_value.__enter__.return_value.begin_transaction.return_value
+        tx.run.return_value.consume.return_value = "summary"
+
+        def run(statement, rows):
+            if len(rows) > 2:
+                raise Neo4jError._hydrate_neo4j(code="Neo.TransientError.General.MemoryPoolOutOfMemoryError", message="out of memory")
+            return tx.run.return_value
+
+        tx.run.side_effect = run
+        statement = self.neo4j_handler.batchStatement("Person", "HAS_PROVIDED_BUSINESS_TO", "Organization")
+
+        self.assertEqual(self.neo4j_handler.executeBatch(statement, [{}] * 8), "summary")
+        committed = [len(call.kwargs["rows"]) for call in tx.run.call_args_list if len(call.kwargs["rows"]) <= 2]
+        self.assertEqual(committed, [2, 2, 2, 2])
+        self.assertEqual(tx.commit.call_count, 4)
+        self.assertEqual(self.neo4j_handler.batchSize(statement, 1000), 2)
+
+    def test_executeBatch_splits_on_first_memory_error(self):
+        import time
+        from BatchSizeController import BatchSizeController
+        from FakeNeo4jDriver import FakeNeo4jDriver
+        self.neo4j_handler.batchSizer = BatchSizeController(initialSize=8, minSize=1)
+        # execute_write would resend the oversized batch for the whole retry time before it could be split
+        self.neo4j_handler.driver = FakeNeo4jDriver(latency=0.0, memoryLimitRows=2, maxTransactionRetryTime=30.0)
+        _, statement, rows = next(self.neo4j_handler.batchRows((self.dyad(f"Vendor{n}", f"Org{n}") for n in range(8)), chunk=8))
+
+        started = time.perf_counter()
+        self.neo4j_handler.executeBatch(statement, rows)
+        self.assertLess(time.perf_counter() - started, 5)
+        # the batch of 8 fails once, then both halves of 4 once, before the batches of 2 commit
+        self.assertEqual(self.neo4j_handler.driver.stats['rollbacks'], 3)
+        self.assertEqual(self.neo4j_handler.driver.stats['commits'], 4)
+        self.assertEqual(self.neo4j_handler.driver.relationshipCount(), 8)
+
+    def test_dataPush_commits_every_batch_with_batch_sizer(self):
+        from neo4j.exceptions import Neo4jError
+        from BatchSizeController import BatchSizeController
+        self.neo4j_handler.batchSizer = BatchSizeController(initialSize=8, minSize=1)
+        self.neo4j_handler.driver = MagicMock()
+        tx = self.neo4j_handler.driver.session.return_value.__enter__.return_value.begin_transaction.return_value
+        tx.run.return_value.consume.return_value = "summary"
+
+        def run(statement, rows):
+            if len(rows) > 2:
+                raise Neo4jError._hydrate_neo4j(code="Neo.TransientError.General.MemoryPoolOutOfMemoryError", message="out of memory")
+            return tx.run.return_value
+
+        tx.run.side_effect = run
+        # the default single writer commits batch by batch instead of in one transaction, so memory errors split
+        self.assertTrue(self.neo4j_handler.dataPush(self.dyad(f"Vendor{n}", f"Org{n}") for n in range(12)))
+        committed = [len(call.kwargs["rows"]) for call in tx.run.call_args_list if len(call.kwargs["rows"]) <= 2]
+        self.assertEqual(tx.commit.call_count, len(committed))
+        self.assertEqual(sum(committed), 12)
+        self.assertEqual(max(committed), 2)
+
+    def test_batchRows_follows_batch_sizer(self):
+        from BatchSizeController import BatchSizeController
+        self.neo4j_handler.batchSizer = BatchSizeController(initialSize=3, minSize=1)
+        batches = list(self.neo4j_handler.batchRows([self.dyad(f"Vendor{n}", "Org") for n in range(7)], chunk=1000))
+        self.assertEqual([len(rows) for _, _, rows in batches], [3, 3, 1])
+
+    def test_replaySpool_commits_failed_batches(self):
+        import tempfile
+        from BatchSpool import BatchSpool
+        from FakeNeo4jDriver import FakeNeo4jDriver
+        for writers in (1, 2):
+            with self.subTest(writers=writers), tempfile.TemporaryDirectory() as directory:
+                # far more batches than the writer queues hold, so most of them are never sent
+                self.neo4j_handler.params = dict(self.params, writers=writers, chunkSize=1, maxRetries=0)
+                self.neo4j_handler.spool = BatchSpool(directory, fsync=False)
+                self.neo4j_handler.driver = FakeNeo4jDriver(latency=0.0, conflictRate=1.0)
+                self.assertFalse(self.neo4j_handler.dataPush(self.dyad(f"Vendor{n}", f"Org{n}") for n in range(200)))
+                self.assertEqual(self.neo4j_handler.spool.stats()['pending'], 200)
+
+                self.neo4j_handler.driver.conflictRate = 0.0
+                self.assertTrue(self.neo4j_handler.replaySpool())
+                self.assertEqual(self.neo4j_handler.spool.stats()['pending'], 0)
+                self.assertEqual(self.neo4j_handler.driver.relationshipCount(), 200)
+                self.neo4j_handler.spool.close()
+
+    def test_dataPush_acknowledges_every_committed_batch_with_spool(self):
+        import tempfile
+        from BatchSpool import BatchSpool
+        self.neo4j_handler.params = dict(self.params, chunkSize=5, maxRetries=0)
+        self.neo4j_handler.driver = MagicMock()
+        tx = self.neo4j_handler.driver.session.return_value.__enter__.return_value.begin_transaction.return_value
+        tx.run.side_effect = [tx.run.return_value, tx.run.return_value, Exception("test error")]
+        with tempfile.TemporaryDirectory() as directory:
+            self.neo4j_handler.spool = BatchSpool(directory, fsync=False)
+            self.assertFalse(self.neo4j_handler.dataPush(self.dyad(f"Vendor{n}", f"Org{n}") for n in range(20)))
+            self.assertEqual(tx.commit.call_count, 2)
+            # the two committed batches stay committed, the failed one and the last are left for replay
+            pending = list(self.neo4j_handler.spool.pending())
+            self.assertEqual([len(rows) for _, _, rows in pending], [5, 5])
+            self.assertEqual([row["fromKey"]["name"] for _, _, rows in pending for row in rows], [f"Vendor{n}" for n in range(10, 20)])
+            self.neo4j_handler.spool.close()
+
+    def test_dataPushConcurrent_reports_failure(self):
+        self.neo4j_handler.params = dict(self.params, writers=2, maxRetries=0)
+        self.neo4j_handler.driver = MagicMock()
+        tx = self.neo4j_handler.driver.session.return_value.__enter__.return_value.begin_transaction.return_value
+        tx.run.side_effect = Exception("test error")
+        self.assertFalse(self.neo4j_handler.dataPush(self.dyad(f"Vendor{n}", f"Org{n}") for n in range(20)))
+        tx.commit.assert_not_called()
+
+    def test_dataPush_skips_cached_dyads(self):
+        self.neo4j_handler.dyadCache = DyadCache()
+        self.neo4j_handler.driver = MagicMock()
+        tx = self.neo4j_handler.driver.session.return_value.__enter__.return_value.begin_transaction.return_value
+        dyads = [self.dyad("Acme", "Initech"), self.dyad("Acme", "Initech"), self.dyad("Globex", "Hooli")]
+
+        self.assertTrue(self.neo4j_handler.dataPush(dyads))
+        self.assertEqual(len(tx.run.call_args.kwargs["rows"]), 2)
+        self.assertEqual(self.neo4j_handler.dyadCache.stats()["size"], 2)
+
+        tx.run.reset_mock()
+        self.assertTrue(self.neo4j_handler.dataPush(dyads + [self.dyad("Umbrella", "Hooli")]))
+        self.assertEqual([row["fromKey"]["name"] for row in tx.run.call_args.kwargs["rows"]], ["Umbrella"])
+
+    def test_dataPush_releases_dyads_on_failure(self):
+        self.neo4j_handler.dyadCache = DyadCache()
+        self.neo4j_handler.driver = MagicMock()
+        tx = self.neo4j_handler.driver.session.return_value.__enter__.return_value.begin_transaction.return_value
+        tx.run.side_effect = Exception("test error")
+        self.assertFalse(self.neo4j_handler.dataPush([self.dyad("Acme", "Initech")]))
+        self.assertEqual(self.neo4j_handler.dyadCache.pending, set())
+        self.assertTrue(self.neo4j_handler.dyadCache.claim(DyadCache.hash(self.dyad("Acme", "Initech"))))
+
+    def schemaHandler(self):
+        handler = Neo4jHandler({"nodeTypes": ["Person", "Organization", "School"], "bootstrapSchema": True},
+                               self.uri, self.user, self.password, self.logger)
+        handler.driver = MagicMock()
+        handler.schemaReady = False
+        return handler, handler.driver.session.return_value.__enter__.return_value
+
+    def test_schemaStatements(self):
+        handler, _ = self.schemaHandler()
+        self.assertEqual(handler.schemaLabels(), ["Organization", "Person"])
+        self.assertEqual(handler.schemaStatements()[1],
+                         "CREATE CONSTRAINT `Person_name_unique` IF NOT EXISTS FOR (n:`Person`) REQUIRE (n.`name`) IS UNIQUE")
+        handler.params["schema"] = "index"
+        self.assertEqual(handler.schemaStatements()[0],
+                         "CREATE INDEX `Organization_name_index` IF NOT EXISTS FOR (n:`Organization`) ON (n.`name`)")
+
+    def test_ensureSchema_verifies_indexes_once_per_driver(self):
+        handler, session = self.schemaHandler()
+        session.run.return_value.data.return_value = [
+            {"labelsOrTypes": ["Person"], "properties": ["name"], "state": "ONLINE"},
+            {"labelsOrTypes": ["Organization"], "properties": ["name"], "state": "ONLINE"},
+        ]
+        self.assertTrue(handler.dataPush([]))
+        statements = [call.args[0] for call in session.run.call_args_list]
+        self.assertEqual(len([statement for statement in statements if statement.startswith("CREATE CONSTRAINT")]), 2)
+
+        with patch.object(Neo4jHandler, "createDriver", return_value=handler.driver):
+            second = Neo4jHandler(handler.params, self.uri, self.user, self.password, self.logger)
+        self.assertTrue(second.schemaReady)
+
+    def test_dataPush_aborts_when_schema_is_missing(self):
+        handler, session = self.schemaHandler()
+        session.run.return_value.data.return_value = [
+            {"labelsOrTypes": ["Person"], "properties": ["name"], "state": "POPULATING"},
+        ]
+        self.assertFalse(handler.dataPush([self.dyad("Acme", "Initech")]))
+        session.begin_transaction.assert_not_called()
+
     # def test_create_node_with_empty_node_props(self):
     #     with self.assertRaises(ValueError):
     #         self.neo4j_handler.createNode("Person", {})
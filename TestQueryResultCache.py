@@ -0,0 +1,101 @@
+import unittest
+from unittest.mock import patch
+from logging import Logger
+from elasticsearch import Elasticsearch
+from elasticsearch.client import IndicesClient
+from QueryResultCache import QueryResultCache
+from ElasticsearchHandler import ElasticsearchHandler
+
+
+class Clock():
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestQueryResultCache(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = Clock()
+        self.cache = QueryResultCache(maxsize=2, ttl=10, clock=self.clock)
+
+    def test_key_is_normalized(self):
+        self.assertEqual(QueryResultCache.key('index', {'a': 1, 'b': 2}, size=10), QueryResultCache.key('index', {'b': 2, 'a': 1}, size=10))
+        self.assertNotEqual(QueryResultCache.key('index', {'a': 1}), QueryResultCache.key('other', {'a': 1}))
+        self.assertNotEqual(QueryResultCache.key('index', {'a': 1}, size=10), QueryResultCache.key('index', {'a': 1}, size=20))
+
+    def test_ttl(self):
+        self.cache.put('key', 'response')
+        self.clock.now = 9
+        self.assertEqual(self.cache.get('key'), 'response')
+        self.clock.now = 10
+        self.assertIsNone(self.cache.get('key'))
+        self.assertEqual(self.cache.stats()['expirations'], 1)
+
+    def test_lru_eviction(self):
+        self.cache.put('a', 1)
+        self.cache.put('b', 2)
+        self.cache.get('a')
+        self.cache.put('c', 3)
+
+        self.assertIsNone(self.cache.get('b'))
+        self.assertEqual((self.cache.get('a'), self.cache.get('c')), (1, 3))
+        self.assertEqual(self.cache.stats()['evictions'], 1)
+
+    def test_generation(self):
+        self.cache.put('key', 'response', generation=1)
+
+        self.assertEqual(self.cache.get('key', generation=1), 'response')
+        self.assertIsNone(self.cache.get('key', generation=2))
+        self.assertEqual(self.cache.stats(), {'hits': 1, 'misses': 1, 'hitRate': 0.5, 'expirations': 1, 'evictions': 0, 'size': 0})
+
+
+class TestElasticsearchHandlerResultCache(unittest.TestCase):
+
+    def handler(self, **kwargs):
+        return ElasticsearchHandler(
+            hosts=['https://localhost:9200'], username='username', password='password', caCerts=None,
+            caFingerprint=None, index='test_index', logger=Logger('test_logger'), **kwargs,
+        )
+
+    @patch.object(Elasticsearch, 'search')
+    def test_repeated_search_is_cached(self, mock_search):
+        handler = self.handler(resultCache=QueryResultCache())
+        mock_search.return_value = {'hits': {'hits': []}}
+
+        handler.dataFetch({'match': {'vendor': 'acme'}}, size=100)
+        handler.dataFetch({'match': {'vendor': 'acme'}}, size=100)
+        handler.dataFetch({'match': {'vendor': 'globex'}}, size=100)
+
+        self.assertEqual(mock_search.call_count, 2)
+        self.assertEqual(handler.resultCache.stats()['hits'], 1)
+
+    @patch.object(IndicesClient, 'stats')
+    @patch.object(Elasticsearch, 'search')
+    def test_refresh_invalidates(self, mock_search, mock_stats):
+        handler = self.handler(resultCache=QueryResultCache(), invalidateOnRefresh=True)
+        mock_search.return_value = {'hits': {'hits': []}}
+        mock_stats.side_effect = [{'_all': {'total': {'refresh': {'total': count}}}} for count in (1, 1, 2)]
+
+        for _ in range(3):
+            handler.dataFetch({'match_all': {}})
+
+        self.assertEqual(mock_search.call_count, 2)
+
+    @patch.object(IndicesClient, 'stats')
+    @patch.object(Elasticsearch, 'search')
+    def test_unknown_refresh_bypasses_cache(self, mock_search, mock_stats):
+        handler = self.handler(resultCache=QueryResultCache(), invalidateOnRefresh=True)
+        mock_search.return_value = {'hits': {'hits': []}}
+        mock_stats.side_effect = Exception('test error')
+
+        handler.dataFetch({'match_all': {}})
+        handler.dataFetch({'match_all': {}})
+
+        self.assertEqual(mock_search.call_count, 2)
+        self.assertEqual(handler.resultCache.stats()['size'], 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+import unittest
+from SyncMetrics import SyncMetrics, SIZE_BUCKETS, stageTimer
+
+
+class Clock():
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestSyncMetrics(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = Clock()
+        self.metrics = SyncMetrics(clock=self.clock)
+
+    def test_timer(self):
+        with self.metrics.timer('stage_seconds', stage='fetch'):
+            self.clock.now += 0.2
+        with self.assertRaises(ValueError):
+            with stageTimer(self.metrics, 'fetch'):
+                self.clock.now += 3
+                raise ValueError()
+
+        stage = self.metrics.summary()['stages']['fetch']
+        self.assertEqual((stage['count'], stage['seconds'], stage['p50'], stage['p95']), (2, 3.2, 0.25, 5.0))
+
+    def test_stageTimer_without_metrics(self):
+        with stageTimer(None, 'fetch'):
+            pass
+
+    def test_summary_since_snapshot(self):
+        self.metrics.increment('documents_total', 50)
+        self.metrics.observe('stage_seconds', 1.0, stage='push')
+        since = self.metrics.snapshot()
+        self.clock.now = 10
+        self.metrics.increment('documents_total', 100)
+        self.metrics.increment('rows_total', 400)
+        self.metrics.observe('stage_seconds', 2.0, stage='fetch')
+        self.metrics.observe('stage_seconds', 0.5, stage='transform')
+        self.metrics.observe('batch_rows', 400, buckets=SIZE_BUCKETS)
+
+        summary = self.metrics.summary(since)
+        self.assertEqual(summary['seconds'], 10)
+        self.assertEqual(set(summary['stages']), {'fetch', 'transform'})
+        self.assertEqual(summary['boundBy'], 'fetch')
+        self.assertEqual((summary['docsPerSecond'], summary['rowsPerSecond']), (10, 40))
+        self.assertEqual(summary['counters'], {'documents_total': 100, 'rows_total': 400})
+        self.assertEqual(summary['histograms']['batch_rows']['p95'], 500)
+
+    def test_run_keeps_concurrent_runs_apart(self):
+        import asyncio
+
+        async def push():
+            self.metrics.observe('stage_seconds', 1.0, stage='push')
+
+        async def run(documents):
+            with self.metrics.run() as runMetrics:
+                for _ in range(documents):
+                    self.metrics.increment('documents_total')
+                    await asyncio.sleep(0)
+                # tasks created by the run record into it too
+                await asyncio.create_task(push())
+                return runMetrics.summary()
+
+        async def runs():
+            return await asyncio.gather(run(3), run(5))
+
+        first, second = asyncio.run(runs())
+        self.assertEqual(first['counters'], {'documents_total': 3})
+        self.assertEqual(second['counters'], {'documents_total': 5})
+        self.assertEqual(first['stages']['push']['count'], 1)
+        self.assertEqual(self.metrics.summary()['counters'], {'documents_total': 8})
+        self.assertEqual(self.metrics.summary()['stages']['push']['count'], 2)
+
+    def test_prometheus(self):
+        self.metrics.increment('errors_total', stage='push')
+        self.metrics.setGauge('queue_depth_current', 3, stage='reader')
+        self.metrics.observe('stage_seconds', 0.02, stage='fetch')
+        self.metrics.observe('stage_seconds', 60, stage='fetch')
+
+        lines = self.metrics.prometheus().splitlines()
+        self.assertIn('# TYPE es_neo4j_sync_errors_total counter', lines)
+        self.assertIn('es_neo4j_sync_errors_total{stage="push"} 1', lines)
+        self.assertIn('es_neo4j_sync_queue_depth_current{stage="reader"} 3', lines)
+        self.assertIn('# TYPE es_neo4j_sync_stage_seconds histogram', lines)
+        self.assertIn('es_neo4j_sync_stage_seconds_bucket{stage="fetch",le="0.01"} 0', lines)
+        self.assertIn('es_neo4j_sync_stage_seconds_bucket{stage="fetch",le="0.025"} 1', lines)
+        self.assertIn('es_neo4j_sync_stage_seconds_bucket{stage="fetch",le="+Inf"} 2', lines)
+        self.assertIn('es_neo4j_sync_stage_seconds_count{stage="fetch"} 2', lines)
+
+if __name__ == '__main__':
+    unittest.main()
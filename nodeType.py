@@ -46,6 +46,14 @@ class NodeType(Enum): # look into schema.org and open-meta
   
   def schema(self):
     return self.__schemaMap__[self._value_]
+
+  @classmethod
+  def parse(cls, value):
+    # accepts the value ("Person"), the member name ("PERSON") or either in lower case ("person")
+    for _nodeType in cls:
+      if str(value).lower() in (_nodeType.value.lower(), _nodeType.name.lower()):
+        return _nodeType
+    raise ValueError(f"{value} is not a valid NodeType")
   
 
 